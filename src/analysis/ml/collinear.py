@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import hashlib
+from collections import defaultdict
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+import scipy.sparse as sp
+
+HASH_DECIMALS = 6      # до скольких знаков округляется стандартизованная колонка перед хэшем
+CORR_TOL = 0.0         # |corr| >= 1 - CORR_TOL; по умолчанию ровно 1, как corr == 1 в models.ipynb
+COLUMN_BLOCK = 256     # сколько колонок одновременно переводится в плотный вид
+
+
+def _column_blocks(X, block: int) -> Iterator[Tuple[int, np.ndarray]]:
+    """(номер первой колонки, плотный блок n x b в float64); sparse переводится в плотный по блокам."""
+    if sp.issparse(X):
+        X = X.tocsc()
+    for start in range(0, X.shape[1], block):
+        part = X[:, start:start + block]
+        part = part.toarray() if sp.issparse(part) else part
+        yield start, np.asarray(part, dtype=np.float64)
+
+
+def _standardize(B: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """(z-нормированный блок, маска неконстантных колонок); константные колонки обнуляются."""
+    if np.isnan(B).any():
+        raise ValueError("columns with NaN are not supported, fill them first")
+    Z = B - B.mean(axis=0)
+    norm = np.sqrt((Z * Z).sum(axis=0))
+    ok = norm > 0
+    Z[:, ok] /= norm[ok]
+    Z[:, ~ok] = 0.0
+    return Z, ok
+
+
+def _canonical_sign(Z: np.ndarray) -> np.ndarray:
+    """Знак каждой колонки выбирается так, чтобы первое ненулевое значение было положительным: x и -x совпадут."""
+    nz = np.abs(Z) > 10.0 ** -HASH_DECIMALS
+    first = nz.argmax(axis=0)
+    sign = np.sign(Z[first, np.arange(Z.shape[1])])
+    sign[sign == 0] = 1.0
+    return Z * sign
+
+
+def column_buckets(X, block: int = COLUMN_BLOCK) -> List[List[int]]:
+    """
+    Кандидаты в идеально коррелирующие колонки за один проход: каждая колонка нормируется
+    (вычесть среднее, поделить на норму), знак приводится к каноническому и округлённые
+    значения хэшируются. Колонки, связанные как a * x + b, дают одинаковый хэш, поэтому
+    искать пары нужно только внутри корзин. Константные колонки (corr с ними NaN) пропускаются.
+    Возвращаются корзины из двух и более колонок.
+    """
+    buckets: Dict[bytes, List[int]] = defaultdict(list)
+    for start, B in _column_blocks(X, block):
+        Z, ok = _standardize(B)
+        Z = np.round(_canonical_sign(Z * np.sqrt(len(Z))), HASH_DECIMALS) + 0.0   # + 0.0 убирает -0.0
+        Zt = np.ascontiguousarray(Z.T)
+        for j in np.flatnonzero(ok):
+            buckets[hashlib.blake2b(Zt[j].tobytes(), digest_size=16).digest()].append(start + int(j))
+    return [cols for cols in buckets.values() if len(cols) > 1]
+
+
+def _dense_columns(X, cols: List[int]) -> np.ndarray:
+    part = X[:, cols]
+    return np.asarray(part.toarray() if sp.issparse(part) else part, dtype=np.float64)
+
+
+def perfectly_correlated_pairs(
+    X, tol: float = CORR_TOL, block: int = COLUMN_BLOCK
+) -> List[Tuple[int, int]]:
+    """
+    Пары (i, j), i < j, с |corr(X[:, i], X[:, j])| >= 1 - tol. X - np.ndarray или scipy.sparse.
+    Хэш отбирает кандидатов (column_buckets), и корреляция считается только внутри корзин,
+    блоками по block колонок - вместо полной матрицы d x d и цикла по всем парам.
+    """
+    if sp.issparse(X):
+        X = X.tocsc()
+    else:
+        X = np.asarray(X)
+    pairs: List[Tuple[int, int]] = []
+    for cols in column_buckets(X, block):
+        for a in range(0, len(cols), block):
+            ca = cols[a:a + block]
+            Za, _ = _standardize(_dense_columns(X, ca))
+            for b in range(a, len(cols), block):
+                cb = cols[b:b + block]
+                Zb = Za if b == a else _standardize(_dense_columns(X, cb))[0]
+                corr = np.abs(Za.T @ Zb)
+                for i, j in zip(*np.nonzero(corr >= 1.0 - tol)):
+                    ci, cj = ca[i], cb[j]
+                    if ci < cj:
+                        pairs.append((ci, cj))
+    return sorted(pairs)
@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from ml.collinear import column_buckets
+
+CACHE_VERSION = 3
+DEFAULT_CACHE_DIR = Path("../data/cache")    # относительно notebooks, как и пути к TSV
+INTERCEPT = "intercept"
+
+
+def _exact_correlated_pairs(df: pd.DataFrame) -> List[Tuple[int, int]]:
+    """
+    Пары (i, j), i < j, с df.corr().abs() == 1 ровно - результат тот же, что у прежнего цикла
+    по полной матрице: кандидатов отбирает хэш (ml.collinear.column_buckets), а корреляция
+    считается тем же df.corr(), но только внутри каждой корзины.
+    """
+    X = df.to_numpy(dtype=np.float64)
+    # с пропусками df.corr() считает по парам строк, хэш так не умеет - тогда полная матрица
+    buckets = column_buckets(X) if not np.isnan(X).any() else [list(range(X.shape[1]))]
+    pairs: List[Tuple[int, int]] = []
+    for cols in buckets:
+        corr = df.iloc[:, cols].corr().abs().to_numpy()
+        for a, b in zip(*np.nonzero(np.triu(corr == 1, k=1))):
+            pairs.append((cols[a], cols[b]))
+    return sorted(pairs)
+
+
+def perfectly_correlated_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """Пары колонок с |corr| = 1 (в обоих порядках, как раньше в models.ipynb)."""
+    cols = list(df.columns)
+    pairs = _exact_correlated_pairs(df)
+    rows = [(cols[i], cols[j]) for i, j in pairs] + [(cols[j], cols[i]) for i, j in pairs]
+    return pd.DataFrame(rows, columns=["col1", "col2"]).drop_duplicates()
+
+
+def drop_perfectly_correlated(df: pd.DataFrame) -> pd.DataFrame:
+    """Как в models.ipynb: убираются все колонки, у которых есть идеально коррелирующая пара."""
+    cols = list(df.columns)
+    to_drop = {cols[k] for pair in _exact_correlated_pairs(df) for k in pair}
+    return df.drop(columns=[c for c in cols if c in to_drop])
+
+
+def file_sha1(path: Path, chunk: int = 1 << 20) -> str:
+    h = hashlib.sha1()
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(chunk), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+@dataclass
+class Design:
+    """X (n x d, np.memmap только для чтения), y, имена столбцов X и ключ кэша."""
+    X: np.ndarray
+    y: np.ndarray
+    columns: List[str]
+    key: str
+    target: str = "score"
+
+    def frame(self) -> pd.DataFrame:
+        """DataFrame признаков (без intercept) и целевой колонки - для кода, работающего с df."""
+        cols = [c for c in self.columns if c != INTERCEPT]
+        start = len(self.columns) - len(cols)
+        df = pd.DataFrame(self.X[:, start:], columns=cols)
+        df[self.target] = self.y
+        return df
+
+
+def load_design(
+    path: Union[str, Path],
+    target: str = "score",
+    intercept: bool = True,
+    drop_correlated: bool = False,
+    drop_constant: bool = False,
+    cache_dir: Optional[Union[str, Path]] = None,
+) -> Design:
+    """
+    X и y из TSV, как read_csv + (drop_perfectly_correlated, удаление константных колонок) +
+    from_df_to_X_y в ноутбуках, но один раз: результат ложится в cache_dir как .npy и дальше
+    открывается через np.load(mmap_mode="r") без разбора TSV и без копий. Ключ кэша - sha1
+    содержимого TSV и настроек, так что изменившийся файл или другие флаги дают новую запись.
+    intercept=True - первый столбец из единиц записывается сразу в файл, без np.column_stack.
+    """
+    path = Path(path)
+    cache = Path(cache_dir) if cache_dir is not None else DEFAULT_CACHE_DIR
+    settings = {
+        "v": CACHE_VERSION, "target": target, "intercept": intercept,
+        "drop_correlated": drop_correlated, "drop_constant": drop_constant,
+    }
+    key = hashlib.sha1((file_sha1(path) + json.dumps(settings, sort_keys=True)).encode("utf-8")).hexdigest()[:16]
+    x_path, y_path, meta_path = (cache / f"{path.stem}.{key}.{s}" for s in ("X.npy", "y.npy", "json"))
+
+    if not meta_path.exists():
+        df = pd.read_csv(path, sep="\t")
+        if drop_correlated:
+            df = drop_perfectly_correlated(df)
+        if drop_constant:
+            df = df.loc[:, df.nunique() != 1]
+        features = df.drop(columns=[target])
+        columns = ([INTERCEPT] if intercept else []) + list(features.columns)
+
+        cache.mkdir(parents=True, exist_ok=True)
+        tmp_x = x_path.with_name(f".{x_path.name}.tmp")
+        X = np.lib.format.open_memmap(tmp_x, mode="w+", dtype=np.float64, shape=(len(df), len(columns)))
+        start = 1 if intercept else 0
+        if intercept:
+            X[:, 0] = 1.0
+        X[:, start:] = features.to_numpy(dtype=np.float64)
+        X.flush()
+        del X
+        os.replace(tmp_x, x_path)
+        np.save(y_path, df[target].to_numpy())
+        # meta пишется последним: есть meta - значит X и y дописаны целиком
+        meta_path.write_text(json.dumps({"columns": columns, "source": str(path), **settings},
+                                        ensure_ascii=False), encoding="utf-8")
+
+    meta = json.loads(meta_path.read_text(encoding="utf-8"))
+    return Design(
+        X=np.load(x_path, mmap_mode="r"),
+        y=np.load(y_path, mmap_mode="r"),
+        columns=meta["columns"],
+        key=key,
+        target=target,
+    )
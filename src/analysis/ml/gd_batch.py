@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+import itertools
+import json
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import scipy.sparse as sp
+
+ArrayLike = Union[np.ndarray, sp.spmatrix]
+
+LN2 = np.log(2.0)
+
+
+def margin_loss_and_grad(M: np.ndarray, loss: str) -> Tuple[np.ndarray, np.ndarray]:
+    """(L, dL/dM) поэлементно для матрицы отступов M - те же формулы, что в gd_linear_clf_fit."""
+    if loss == "svm":
+        return np.maximum(0.0, 1.0 - M), -(M < 1.0).astype(float)
+    if loss == "logistic":
+        eM = np.exp(-np.clip(M, -50.0, 50.0))
+        return np.log1p(eM) / LN2, -(eM / (1.0 + eM)) / LN2
+    if loss == "exponential":
+        e = np.exp(-np.clip(M, -50.0, 50.0))
+        return e, -e
+    if loss == "square":
+        M_clip = np.clip(M, -2.0, 2.0)
+        return (M_clip - 1.0) ** 2, 2.0 * (M_clip - 1.0)
+    raise ValueError(f"Unknown loss: {loss}")
+
+
+def _as_design(X: ArrayLike) -> ArrayLike:
+    return X.tocsr().astype(float) if sp.issparse(X) else np.asarray(X, dtype=float)
+
+
+def _n_configs(*params: Any) -> int:
+    sizes = {len(v) for v in params if v is not None and not np.isscalar(v)}
+    if len(sizes) > 1:
+        raise ValueError(f"per-config parameters have different lengths: {sorted(sizes)}")
+    return sizes.pop() if sizes else 1
+
+
+def _per_config(v: Any, k: int, default: float) -> np.ndarray:
+    if v is None or np.isscalar(v):
+        v = [v] * k
+    return np.array([default if x is None else x for x in v], dtype=float)
+
+
+def gd_linear_clf_fit_batch(
+    X: ArrayLike,
+    y: np.ndarray,
+    loss: str = "svm",
+    lr: Union[float, Sequence[float]] = 0.1,
+    alpha: Union[float, Sequence[float]] = 0.0,
+    l1_ratio: Union[float, Sequence[float]] = 0.0,
+    n_iter: Union[int, Sequence[int]] = 1000,
+    tol: Union[None, float, Sequence[Optional[float]]] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    gd_linear_clf_fit из models.ipynb сразу для k конфигураций одной функции потерь.
+    lr, alpha, l1_ratio, n_iter, tol - скаляры или последовательности длины k; веса всех
+    конфигураций лежат столбцами матрицы Theta (d x k), и шаг делается двумя матричными
+    произведениями X @ Theta и X.T @ G вместо k отдельных циклов.
+
+    Каждая конфигурация останавливается сама - по своему n_iter или когда норма шага
+    <= tol, - и дальше в вычислениях не участвует. X может быть scipy.sparse.
+    Возвращает (Theta d x k, число сделанных итераций по конфигурациям).
+    """
+    X = _as_design(X)
+    y = np.asarray(y, dtype=float).ravel()
+    n, d = X.shape
+    k = _n_configs(lr, alpha, l1_ratio, n_iter, tol)
+
+    lr_ = _per_config(lr, k, 0.1)
+    alpha_ = _per_config(alpha, k, 0.0)
+    l1r_ = _per_config(l1_ratio, k, 0.0)
+    n_iter_ = _per_config(n_iter, k, 1000).astype(int)
+    tol_ = _per_config(tol, k, -1.0)  # -1: tol не задан, ранней остановки нет
+    l1 = alpha_ * l1r_
+    l2 = alpha_ * (1.0 - l1r_)
+
+    Theta = np.zeros((d, k), dtype=float)
+    done_iter = np.zeros(k, dtype=int)
+    active = np.flatnonzero(n_iter_ > 0)
+    yc = y[:, None]
+    Xt = X.T.tocsr() if sp.issparse(X) else X.T
+
+    while active.size:
+        T = Theta[:, active]
+        M = yc * np.asarray(X @ T)
+        _, dL_dM = margin_loss_and_grad(M, loss)
+        grad = np.asarray(Xt @ (dL_dM * yc)) / n + l2[active] * T + l1[active] * np.sign(T)
+        step = lr_[active] * grad
+        Theta[:, active] = T - step
+        done_iter[active] += 1
+
+        converged = np.linalg.norm(step, axis=0) <= tol_[active]
+        finished = done_iter[active] >= n_iter_[active]
+        active = active[~(converged | finished)]
+
+    return Theta, done_iter
+
+
+def linear_clf_predict_batch(X: ArrayLike, Theta: np.ndarray) -> np.ndarray:
+    """Метки ±1 для каждой конфигурации (n x k); 0 считается классом 1, как в linear_clf_predict."""
+    F = np.asarray(_as_design(X) @ Theta)
+    P = np.sign(F)
+    P[P == 0] = 1
+    return P.astype(int)
+
+
+def confusion_batch(y_true: np.ndarray, P: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """tp, tn, fp, fn по столбцам P - векторный confusion_from_preds."""
+    t = np.asarray(y_true, dtype=int).ravel()[:, None]
+    tp = np.sum((t == 1) & (P == 1), axis=0)
+    tn = np.sum((t == -1) & (P == -1), axis=0)
+    fp = np.sum((t == -1) & (P == 1), axis=0)
+    fn = np.sum((t == 1) & (P == -1), axis=0)
+    return tp, tn, fp, fn
+
+
+def grid_configs(grid: Dict[str, Sequence[Any]]) -> List[Dict[str, Any]]:
+    keys = list(grid.keys())
+    return [dict(zip(keys, values)) for values in itertools.product(*[grid[k] for k in keys])]
+
+
+def grid_search_gd_linear_clf(
+    X_train: ArrayLike,
+    y_train: np.ndarray,
+    X_val: ArrayLike,
+    y_val: np.ndarray,
+    loss_list: Sequence[str],
+    param_grid_by_loss: Dict[str, Dict[str, Sequence[Any]]],
+    metric_fn: Optional[Callable[[int, int, int, int], float]] = None,
+    save_path: Optional[str] = None,
+    feature_names: Optional[Sequence[str]] = None,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Замена grid_search_gd_linear_clf из models.ipynb с тем же результатом (и тем же best_gd.json):
+    вся сетка одной функции потерь обучается одним вызовом gd_linear_clf_fit_batch.
+    При равных метриках побеждает конфигурация, идущая раньше в itertools.product.
+    feature_names (имена столбцов X, включая intercept) сохраняются рядом с theta - по ним
+    src/parser/scoring.py сопоставляет веса с колонками новых данных.
+    """
+    results: Dict[str, Dict[str, Any]] = {}
+    for loss in loss_list:
+        configs = grid_configs(param_grid_by_loss[loss])
+        Theta, _ = gd_linear_clf_fit_batch(
+            X_train, y_train,
+            loss=loss,
+            lr=[p.get("lr", 0.1) for p in configs],
+            alpha=[p.get("alpha", 0.0) for p in configs],
+            l1_ratio=[p.get("l1_ratio", 0.0) for p in configs],
+            n_iter=[p.get("n_iter", 1000) for p in configs],
+            tol=[p.get("tol", None) for p in configs],
+        )
+        P = linear_clf_predict_batch(X_val, Theta)
+        if metric_fn is None:
+            y_val_pm1 = np.asarray(y_val, dtype=int).ravel()
+            if np.all(np.isin(np.unique(y_val_pm1), [0, 1])):
+                y_val_pm1 = 2 * y_val_pm1 - 1
+            scores = (P == y_val_pm1[:, None]).mean(axis=0)
+        else:
+            tp, tn, fp, fn = confusion_batch(y_val, P)
+            scores = np.array([metric_fn(int(a), int(b), int(c), int(e)) for a, b, c, e in zip(tp, tn, fp, fn)])
+        best = int(np.argmax(scores))
+        results[loss] = {
+            "best_score": float(scores[best]),
+            "best_params": configs[best],
+            "theta": Theta[:, best].tolist(),
+        }
+        if feature_names is not None:
+            results[loss]["columns"] = list(feature_names)
+    if save_path is not None:
+        with open(save_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    return results
@@ -0,0 +1,273 @@
+from __future__ import annotations
+
+import hashlib
+import warnings
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed, dump, hash as joblib_hash, load
+from sklearn.base import clone
+from sklearn.metrics import accuracy_score, f1_score
+from sklearn.model_selection import StratifiedKFold
+
+MetricFn = Callable[[np.ndarray, np.ndarray], float]
+
+DEFAULT_METRICS: Dict[str, MetricFn] = {
+    "accuracy": accuracy_score,
+    "f1": lambda y, p: f1_score(y, p, pos_label=1),
+}
+
+
+def get_scores(model, kind: str, X) -> np.ndarray:
+    """Непрерывные оценки модели - как get_scores в compare_models.ipynb."""
+    if kind == "reg":
+        return model.predict(X)
+    if hasattr(model, "predict_proba"):
+        return model.predict_proba(X)[:, 1]
+    if hasattr(model, "decision_function"):
+        s = model.decision_function(X)
+        return s if s.ndim == 1 else s[:, 1]
+    y = model.predict(X)
+    return np.where(y == 1, 1.0, -1.0)
+
+
+def pred(model, kind: str, X) -> np.ndarray:
+    if kind == "reg":
+        return np.where(model.predict(X) >= 0.0, 1, -1)
+    return model.predict(X)
+
+
+def compute_threshold_for_top_frac(scores, frac: float) -> float:
+    scores = np.asarray(scores)
+    k = max(1, int(round(frac * len(scores))))
+    return np.sort(scores)[::-1][k - 1]
+
+
+# --- кэш обученных фолдов ---
+
+def data_fingerprint(X, y) -> str:
+    h = hashlib.sha1()
+    h.update(np.ascontiguousarray(X).tobytes())
+    h.update(np.ascontiguousarray(y).tobytes())
+    return h.hexdigest()
+
+
+def model_fingerprint(model) -> str:
+    """Хэш необученной модели с параметрами; если модель не пиклится (lambda внутри) - по repr параметров."""
+    try:
+        return joblib_hash(clone(model))
+    except Exception:
+        return hashlib.sha1(repr(sorted(model.get_params(deep=True).items())).encode("utf-8")).hexdigest()
+
+
+class FoldCache:
+    """
+    Обученные модели фолдов на диске (joblib): ключ - имя модели, её параметры, данные,
+    схема разбиения и номер фолда. Добавили в models одну модель - при повторном запуске
+    обучается только она, остальные фолды читаются из кэша.
+    """
+
+    def __init__(self, root: Union[str, Path]):
+        self.root = Path(root)
+
+    def path(self, name: str, key: str) -> Path:
+        return self.root / name / f"{key}.joblib"
+
+    def get(self, name: str, key: str) -> Optional[Any]:
+        p = self.path(name, key)
+        if not p.exists():
+            return None
+        try:
+            return load(p)
+        except Exception:
+            return None
+
+    def put(self, name: str, key: str, model: Any) -> None:
+        p = self.path(name, key)
+        p.parent.mkdir(parents=True, exist_ok=True)
+        tmp = p.with_name(p.name + ".tmp")
+        try:
+            dump(model, tmp)
+            tmp.replace(p)
+        except Exception as e:
+            tmp.unlink(missing_ok=True)
+            warnings.warn(f"fold model {name} is not cached: {e}")
+
+
+# --- CV ---
+
+def _fit_fold(model, X, y, train_idx: np.ndarray):
+    m = clone(model)
+    m.fit(X[train_idx], y[train_idx])
+    return m
+
+
+def _fold_scores(kind: str, model, X, y, test_idx: np.ndarray, metrics: Dict[str, MetricFn]) -> Dict[str, float]:
+    p = pred(model, kind, X[test_idx])
+    return {k: float(fn(y[test_idx], p)) for k, fn in metrics.items()}
+
+
+def cross_validate_models(
+    models: Dict[str, Tuple],
+    X,
+    y,
+    n_splits: int = 5,
+    random_state: int = 42,
+    n_jobs: int = -1,
+    cache_dir: Optional[Union[str, Path]] = None,
+    metrics: Optional[Dict[str, MetricFn]] = None,
+) -> pd.DataFrame:
+    """
+    Стратифицированная k-fold CV всех моделей из словаря models (name -> (kind, model[, thr]),
+    как в compare_models.ipynb). Пары (модель, фолд) обучаются параллельно в процессах loky;
+    обученные фолды складываются в cache_dir и при повторном запуске не переобучаются.
+    Возвращает таблицу: строка - модель, колонки - среднее и std каждой метрики.
+    """
+    metrics = metrics or DEFAULT_METRICS
+    X = np.asarray(X)
+    y = np.asarray(y)
+    folds = list(StratifiedKFold(n_splits=n_splits, shuffle=True, random_state=random_state).split(X, y))
+    cache = FoldCache(cache_dir) if cache_dir is not None else None
+    split_key = f"{data_fingerprint(X, y)}-{n_splits}-{random_state}"
+
+    fitted: Dict[Tuple[str, int], Any] = {}
+    todo: List[Tuple[str, int, str]] = []
+    for name, spec in models.items():
+        kind, model = spec[0], spec[1]
+        mkey = model_fingerprint(model)
+        for i in range(n_splits):
+            key = hashlib.sha1(f"{mkey}-{split_key}-{i}".encode("utf-8")).hexdigest()
+            cached = cache.get(name, key) if cache is not None else None
+            if cached is not None:
+                fitted[(name, i)] = cached
+            else:
+                todo.append((name, i, key))
+
+    if todo:
+        results = Parallel(n_jobs=n_jobs, backend="loky")(
+            delayed(_fit_fold)(models[name][1], X, y, folds[i][0]) for name, i, _ in todo
+        )
+        for (name, i, key), m in zip(todo, results):
+            fitted[(name, i)] = m
+            if cache is not None:
+                cache.put(name, key, m)
+
+    rows = []
+    for name, spec in models.items():
+        kind = spec[0]
+        per_fold = pd.DataFrame([
+            _fold_scores(kind, fitted[(name, i)], X, y, folds[i][1], metrics) for i in range(n_splits)
+        ])
+        row: Dict[str, Any] = {"model": name, "cached_folds": n_splits - sum(t[0] == name for t in todo)}
+        for k in metrics:
+            row[f"{k}_mean"] = per_fold[k].mean()
+            row[f"{k}_std"] = per_fold[k].std(ddof=1)
+        rows.append(row)
+    return pd.DataFrame(rows).set_index("model")
+
+
+# --- Optuna ---
+
+def _code_fingerprint(code, h) -> None:
+    """Байткод, константы (границы suggest_*) и имена функции; вложенные функции - рекурсивно, без адресов."""
+    h.update(code.co_code)
+    h.update(repr(code.co_names).encode("utf-8"))
+    for c in code.co_consts:
+        if hasattr(c, "co_code"):
+            _code_fingerprint(c, h)
+        else:
+            h.update(repr(c).encode("utf-8"))
+
+
+def study_fingerprint(build_model, kind: str, X_train, y_train, X_val, y_val, desired_pos_frac: float) -> str:
+    """
+    Ключ исследования: данные (как data_fingerprint у FoldCache), пространство поиска (код
+    build_model) и постановка задачи. Изменился TSV или границы suggest_* - другой ключ,
+    и старые испытания из хранилища не переиспользуются.
+    """
+    h = hashlib.sha1()
+    h.update(data_fingerprint(X_train, y_train).encode("utf-8"))
+    h.update(data_fingerprint(X_val, y_val).encode("utf-8"))
+    code = getattr(build_model, "__code__", None)
+    if code is not None:
+        _code_fingerprint(code, h)
+    else:
+        h.update(repr(build_model).encode("utf-8"))
+    h.update(f"{kind}-{desired_pos_frac!r}".encode("utf-8"))
+    return h.hexdigest()
+
+
+def _top_frac_f1(model, kind, X_val, y_val, desired_pos_frac: float) -> Tuple[float, float]:
+    s_val = get_scores(model, kind, X_val)
+    thr = compute_threshold_for_top_frac(s_val, desired_pos_frac)
+    y_val_pred = np.where(s_val >= thr, 1, -1)
+    return f1_score(y_val, y_val_pred, pos_label=1), thr
+
+
+def _optuna_worker(study_name: str, storage: str, build_model, kind, X_train, y_train, X_val, y_val,
+                   n_trials: int, desired_pos_frac: float, seed: int) -> None:
+    import optuna
+
+    optuna.logging.set_verbosity(optuna.logging.WARNING)
+    study = optuna.load_study(study_name=study_name, storage=storage,
+                              sampler=optuna.samplers.TPESampler(seed=seed))
+
+    def objective(trial):
+        model = build_model(trial)
+        model.fit(X_train, y_train)
+        score, thr = _top_frac_f1(model, kind, X_val, y_val, desired_pos_frac)
+        trial.set_user_attr("thr", float(thr))
+        return score
+
+    study.optimize(objective, n_trials=n_trials)
+
+
+def tune_with_optuna_parallel(
+    build_model,
+    kind: str,
+    X_train,
+    y_train,
+    X_val,
+    y_val,
+    n_trials: int,
+    desired_pos_frac: float,
+    study_name: str,
+    storage: str,
+    n_jobs: int = -1,
+):
+    """
+    То же, что tune_with_optuna из compare_models.ipynb (F1 на валидации при пороге top-k%),
+    но испытания идут в n_jobs процессах над общим хранилищем Optuna (например
+    "sqlite:///../data/optuna.db"). Исследование хранится под именем
+    "{study_name}-{первые 12 знаков study_fingerprint}": повторный запуск на тех же данных
+    с тем же build_model дозапускает только недостающие до n_trials испытания, а после
+    изменения данных или пространства поиска начинается новое исследование. Лучшая модель
+    переобучается в текущем процессе по best_params. Возвращает (model, thr, study).
+    """
+    import optuna
+    from joblib import effective_n_jobs
+
+    key = study_fingerprint(build_model, kind, X_train, y_train, X_val, y_val, desired_pos_frac)
+    study_name = f"{study_name}-{key[:12]}"
+    study = optuna.create_study(study_name=study_name, storage=storage, direction="maximize", load_if_exists=True)
+    if study.user_attrs.get("fingerprint", key) != key:
+        raise ValueError(f"Optuna study {study_name} was created for other data or search space")
+    study.set_user_attr("fingerprint", key)
+    finished = sum(t.state == optuna.trial.TrialState.COMPLETE for t in study.trials)
+    left = max(0, n_trials - finished)
+    if left:
+        workers = max(1, min(effective_n_jobs(n_jobs), left))
+        chunks = [left // workers + (i < left % workers) for i in range(workers)]
+        Parallel(n_jobs=workers, backend="loky")(
+            delayed(_optuna_worker)(study_name, storage, build_model, kind, X_train, y_train, X_val, y_val,
+                                    n, desired_pos_frac, seed=finished + i)
+            for i, n in enumerate(chunks)
+        )
+
+    study = optuna.load_study(study_name=study_name, storage=storage)
+    best_model = build_model(optuna.trial.FixedTrial(study.best_params))
+    best_model.fit(X_train, y_train)
+    _, best_thr = _top_frac_f1(best_model, kind, X_val, y_val, desired_pos_frac)
+    return best_model, best_thr, study
@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+from typing import Dict, Optional, Sequence, Union
+
+import numpy as np
+
+Taus = Union[float, Sequence[float], np.ndarray]
+
+
+class RidgeSVDPath:
+    """
+    Путь регуляризации ridge по одному SVD обучающей матрицы.
+
+    X = U S Vt считается один раз в конструкторе; после fit(y) хранится U.T @ y, и веса для
+    любого tau - это Vt.T @ (f(S, tau) * U.T y) с фильтром f = S / (S^2 + tau), то есть
+    только поэлементное перемасштабирование k чисел. OLS - тот же фильтр 1 / S
+    (псевдообратная, как ols_svd_fit). Сингулярные числа <= rcond * max(S) отбрасываются,
+    как в ridge_svd_fit / ols_svd_fit из models.ipynb.
+    """
+
+    def __init__(self, X, rcond: float = 1e-12):
+        X = np.asarray(X, dtype=float)
+        self.U, self.S, self.Vt = np.linalg.svd(X, full_matrices=False)
+        tol = (self.S.max() if self.S.size else 0.0) * rcond
+        self.keep = self.S > tol
+        self.Uty: Optional[np.ndarray] = None
+
+    def fit(self, y) -> "RidgeSVDPath":
+        self.Uty = self.U.T @ np.asarray(y, dtype=float)
+        return self
+
+    def _coef(self, filt: np.ndarray) -> np.ndarray:
+        if self.Uty is None:
+            raise RuntimeError("RidgeSVDPath is not fitted, call fit(y)")
+        filt = np.where(self.keep[:, None], filt, 0.0)
+        return self.Vt.T @ (filt * self.Uty[:, None])
+
+    def ols(self) -> np.ndarray:
+        S = np.where(self.keep, self.S, 1.0)
+        return self._coef((1.0 / S)[:, None])[:, 0]
+
+    def thetas(self, taus: Taus) -> np.ndarray:
+        """Веса для каждого tau: матрица d x len(taus)."""
+        taus = np.atleast_1d(np.asarray(taus, dtype=float))
+        S = self.S[:, None]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            filt = S / (S * S + taus[None, :])
+        return self._coef(filt)
+
+    def theta(self, tau: float) -> np.ndarray:
+        return self.thetas([tau])[:, 0]
+
+    def predict(self, X, taus: Taus) -> np.ndarray:
+        """Предсказания n x len(taus) для всех tau одним матричным произведением."""
+        return np.asarray(X, dtype=float) @ self.thetas(taus)
+
+    def val_scores(self, X_val, y_val, taus: Taus) -> Dict[str, np.ndarray]:
+        """MSE и R^2 на валидации вдоль всего пути (те же формулы, что MSE / R_square в models.ipynb)."""
+        y = np.asarray(y_val, dtype=float).ravel()[:, None]
+        resid = y - self.predict(X_val, taus)
+        sse = np.sum(resid ** 2, axis=0)
+        sst = np.sum((y - y.mean()) ** 2)
+        return {"mse": sse / len(y), "r2": 1.0 - sse / sst}
@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+from typing import Any, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+
+def _is_missing(v: Any) -> bool:
+    return v is None or (isinstance(v, float) and np.isnan(v))
+
+
+class SparseOneHotEncoder:
+    """
+    One-hot (или multi-hot для колонок со списками) сразу в scipy.sparse CSR.
+
+    Значения, встретившиеся реже min_count раз, не получают своей колонки и попадают в общую
+    колонку other - как порог min_count в preprocessing.ipynb. Колонки идут в порядке убывания
+    частоты (как value_counts). Незнакомые при fit значения в transform тоже уходят в other.
+
+    multi=False: одно значение в строке, пропуск считается редким значением (other = 1).
+    multi=True: в строке список значений, other = 1, если среди них есть хоть одно редкое.
+    """
+
+    def __init__(
+        self,
+        min_count: int = 1,
+        multi: bool = False,
+        other: Optional[str] = "other",
+        prefix: Optional[str] = None,
+        dtype: Any = np.uint8,
+    ):
+        self.min_count = min_count
+        self.multi = multi
+        self.other = other
+        self.prefix = prefix
+        self.dtype = dtype
+        self.categories_: Optional[pd.Index] = None
+
+    def _tokens(self, values: Iterable[Any]) -> Tuple[int, pd.Series]:
+        """(число строк, серия токенов); индекс серии - номер исходной строки."""
+        s = pd.Series(list(values), dtype=object)
+        n = len(s)
+        s.index = np.arange(n)
+        if self.multi:
+            s = s.map(lambda v: [] if _is_missing(v) else v).explode()
+        return n, s
+
+    def fit(self, values: Iterable[Any]) -> "SparseOneHotEncoder":
+        _, tokens = self._tokens(values)
+        counts = tokens.dropna().value_counts()
+        self.categories_ = counts[counts >= self.min_count].index
+        return self
+
+    @property
+    def feature_names_(self) -> List[str]:
+        if self.categories_ is None:
+            raise RuntimeError("SparseOneHotEncoder is not fitted")
+        names = [str(c) for c in self.categories_]
+        if self.other is not None:
+            names.append(self.other)
+        if self.prefix:
+            names = [f"{self.prefix}_{n}" for n in names]
+        return names
+
+    def transform(self, values: Iterable[Any]) -> sp.csr_matrix:
+        if self.categories_ is None:
+            raise RuntimeError("SparseOneHotEncoder is not fitted")
+        n_rows, tokens = self._tokens(values)
+        k = len(self.categories_)
+        n_cols = k + (self.other is not None)
+
+        codes = self.categories_.get_indexer(tokens.to_numpy())
+        rows = tokens.index.to_numpy()
+        rare = codes < 0
+        if self.multi:
+            rare &= ~tokens.isna().to_numpy()  # пустые списки не делают строку «редкой»
+
+        keep = codes >= 0
+        r = [rows[keep]]
+        c = [codes[keep]]
+        if self.other is not None:
+            rare_rows = np.unique(rows[rare])
+            r.append(rare_rows)
+            c.append(np.full(len(rare_rows), k))
+        r_all = np.concatenate(r)
+        c_all = np.concatenate(c)
+        X = sp.csr_matrix(
+            (np.ones(len(r_all), dtype=self.dtype), (r_all, c_all)),
+            shape=(n_rows, n_cols),
+        )
+        if self.multi:
+            X.sum_duplicates()
+            X.data = np.minimum(X.data, 1).astype(self.dtype)
+        return X
+
+    def fit_transform(self, values: Iterable[Any]) -> sp.csr_matrix:
+        values = list(values)
+        return self.fit(values).transform(values)
+
+
+def sparse_design_matrix(
+    dense: pd.DataFrame,
+    blocks: Sequence[Tuple[Sequence[str], sp.spmatrix]] = (),
+    intercept: bool = True,
+) -> Tuple[sp.csr_matrix, List[str]]:
+    """
+    Числовые колонки + закодированные блоки в одну CSR-матрицу float64 без уплотнения.
+    intercept добавляет первую колонку из единиц, как from_df_to_X_y в models.ipynb.
+    """
+    parts: List[sp.spmatrix] = []
+    names: List[str] = []
+    if intercept:
+        parts.append(sp.csr_matrix(np.ones((len(dense), 1))))
+        names.append("intercept")
+    if dense.shape[1]:
+        parts.append(sp.csr_matrix(dense.to_numpy(dtype=float)))
+        names.extend(map(str, dense.columns))
+    for block_names, X in blocks:
+        parts.append(X)
+        names.extend(block_names)
+    return sp.hstack(parts, format="csr", dtype=np.float64), names
+
+
+def to_sparse_frame(X: sp.spmatrix, names: Sequence[str], index: Optional[pd.Index] = None) -> pd.DataFrame:
+    """DataFrame на pandas SparseDtype поверх матрицы - для join с остальными колонками без уплотнения."""
+    df = pd.DataFrame.sparse.from_spmatrix(X, columns=list(names))
+    if index is not None:
+        df.index = index
+    return df
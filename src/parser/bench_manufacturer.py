@@ -0,0 +1,136 @@
+"""
+Микробенчмарк извлечения производителя на настоящей колонке manufacturer из data.tsv.
+
+Сравнивает прежние реализации (ORG_RE через .apply по строкам, как было в preprocess.py,
+и extract_names_with_logging из preprocessing.ipynb с re.finditer по словам на каждое
+двоеточие) с manufacturer.extract_batch: «холодный» проход - кэш пуст, каждая уникальная
+строка разбирается один раз; «тёплый» - повторный вызов, всё из кэша.
+
+    python bench_manufacturer.py                                  # data/data.tsv
+    python bench_manufacturer.py --tsv ../analysis/data/data.tsv --repeat 20
+"""
+import argparse
+import re
+import statistics
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+import pandas as pd
+
+import manufacturer
+from manufacturer import (
+    COLON,
+    ENDS_OOO_RE,
+    LEGAL_RE,
+    MISSING,
+    ORG_RE,
+    UNKNOWN_NAME,
+    _clean,
+    extract_batch,
+)
+from settings.runtime import CONFIG_PATHS
+
+
+# --- прежняя реализация, только для сравнения ---
+
+def _legacy_org(raw: Any) -> str:
+    if not raw or str(raw).strip() in MISSING:
+        return "unknown"
+    s = str(raw).replace("„", "«").replace("“", "»").replace(":", " ")
+    m = ORG_RE.search(s)
+    if not m:
+        return "unknown"
+    name = (m.group(1) + " " + m.group(2)).strip()
+    name = name.replace('"', "").replace("«", "").replace("»", "")
+    name = re.sub(r"\s{2,}", " ", name)
+    return name if name else "unknown"
+
+
+def _legacy_left_boundary(s: str, from_idx: int) -> int:
+    tokens = list(re.finditer(r"\S+", s[:from_idx]))
+    for t in reversed(tokens):
+        w = t.group()
+        if any(ch.isdigit() for ch in w) or "." in w or ";" in w:
+            return t.end()
+    return 0
+
+
+def _legacy_names(line: Any) -> List[str]:
+    if not isinstance(line, str) or not line:
+        return [UNKNOWN_NAME]
+    out: List[str] = []
+    for m in COLON.finditer(line):
+        ci = m.start()
+        seg = line[:ci]
+        last_legal = None
+        for lm in LEGAL_RE.finditer(seg):
+            last_legal = lm
+        if last_legal:
+            if _clean(seg[last_legal.end():]):
+                start = last_legal.start()
+            elif ENDS_OOO_RE.search(seg[last_legal.start():]):
+                start = _legacy_left_boundary(line, last_legal.start())
+            else:
+                start = 0
+        else:
+            start = _legacy_left_boundary(line, ci)
+        name = _clean(line[start:ci])
+        if name:
+            out.append(name)
+    seen, names = set(), []
+    for n in out:
+        if n.lower() not in seen:
+            seen.add(n.lower()); names.append(n)
+    return names or [UNKNOWN_NAME]
+
+
+# --- замер ---
+
+def _time(fn: Callable[[], List[Any]], repeat: int,
+          before: Callable[[], None] = lambda: None) -> Tuple[List[float], List[Any]]:
+    ms: List[float] = []
+    result: List[Any] = []
+    for _ in range(repeat):
+        before()
+        started = time.perf_counter()
+        result = fn()
+        ms.append((time.perf_counter() - started) * 1000)
+    return ms, result
+
+
+def _summary(ms: List[float]) -> str:
+    return f"median={statistics.median(ms):.2f}ms min={min(ms):.2f}ms"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Manufacturer extraction micro-benchmark")
+    parser.add_argument("--tsv", type=Path, default=CONFIG_PATHS.tsv_path,
+                        help="TSV с колонкой manufacturer (по умолчанию data/data.tsv)")
+    parser.add_argument("--repeat", type=int, default=10, help="Повторов каждого замера")
+    args = parser.parse_args()
+
+    col = pd.read_csv(args.tsv, sep="\t", dtype=str, keep_default_na=False, usecols=["manufacturer"])["manufacturer"]
+    if col.empty:
+        raise SystemExit(f"No rows in {args.tsv}")
+    print(f"rows={len(col)} unique={col.nunique()} repeat={args.repeat}")
+
+    results: Dict[str, Tuple[List[Any], List[Any]]] = {}
+    for rule, legacy in (("org", _legacy_org), ("names", _legacy_names)):
+        old, old_res = _time(lambda: col.apply(legacy).tolist(), args.repeat)
+        cold, new_res = _time(lambda: extract_batch(col, rule), args.repeat, before=manufacturer.cache_clear)
+        warm, _ = _time(lambda: extract_batch(col, rule), args.repeat)
+        results[rule] = (old_res, new_res)
+        print(f"[{rule}] legacy .apply {_summary(old)}")
+        print(f"[{rule}] batch cold    {_summary(cold)}  speedup x{statistics.median(old) / max(statistics.median(cold), 1e-9):.2f}")
+        print(f"[{rule}] batch warm    {_summary(warm)}  speedup x{statistics.median(old) / max(statistics.median(warm), 1e-9):.2f}")
+
+    for rule, (old_res, new_res) in results.items():
+        mismatches = [i for i, (a, b) in enumerate(zip(old_res, new_res)) if a != b]
+        print(f"[{rule}] result mismatches: {len(mismatches)}")
+        for i in mismatches[:10]:
+            print(f"  {col.iloc[i]!r}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Микробенчмарк разбора секции «Информация» и КБЖУ на сохранённых страницах.
+
+Сравнивает прежнюю схему (отдельный обход всех VV23_DetailProdPageInfoDescItem на каждое поле
+и каскад из четырёх XPath-сканов по контейнеру КБЖУ) с однопроходным InfoIndex/_scan_nutrition.
+Считается только CPU-время извлечения: html.fromstring вынесен за замер.
+
+    python bench_nutrition.py                   # страницы из data/archive
+    python bench_nutrition.py --html-dir pages  # или *.html из папки
+"""
+import argparse
+import re
+import statistics
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from lxml import html
+
+from parsers.helpers import as_text
+from parsers.product import (
+    _NUTRIENT_KEYS,
+    InfoIndex,
+    _assign_nutrient,
+    _fallback_energy_container,
+    _merge_pref,
+    _parse_nutrition,
+    _parse_nutrition_from_text,
+)
+from settings.runtime import CONFIG_PATHS
+from storage.archive import PageArchive
+
+INFO_TITLES = (
+    "Вес/объем", "Описание", "Годен", "Условия хранения", "Страна производства",
+    "Изготовитель", "Производитель", "Состав", "Ингредиенты", "Состав продукта",
+)
+
+Result = Tuple[Tuple[Optional[float], ...], Dict[str, Optional[str]]]
+
+
+# --- прежняя реализация, только для сравнения ---
+
+def _legacy_info_elem(doc: html.HtmlElement, title_contains: str) -> Optional[html.HtmlElement]:
+    for item in doc.xpath("//div[contains(@class,'VV23_DetailProdPageInfoDescItem')]"):
+        title_nodes = item.xpath(".//h4")
+        title = as_text(title_nodes[0]) if title_nodes else ""
+        if title_contains.lower() in title.lower():
+            return item
+    return None
+
+
+def _legacy_info_value(doc: html.HtmlElement, title_contains: str) -> Optional[str]:
+    item = _legacy_info_elem(doc, title_contains)
+    if item is None:
+        return None
+    descs = item.xpath(".//div[contains(@class,'VV23_DetailProdPageInfoDescItem__Desc')]")
+    return as_text(descs[0]) if descs else None
+
+
+def _legacy_blocks(container: html.HtmlElement) -> dict:
+    bucket: dict = {}
+    for it in container.xpath(".//div[contains(@class,'EnergyItem')]"):
+        key = it.xpath(".//*[contains(@class,'EnergyDesc')]")
+        val = it.xpath(".//*[contains(@class,'EnergyValue')]")
+        if key and val:
+            _assign_nutrient(bucket, as_text(key[0]), as_text(val[0]))
+    if len(bucket) < 4:
+        values = container.xpath(".//*[contains(@class,'EnergyValue')]")
+        descs = container.xpath(".//*[contains(@class,'EnergyDesc')]")
+        for key_node, val_node in zip(descs, values):
+            _assign_nutrient(bucket, as_text(key_node), as_text(val_node))
+    if len(bucket) < 4:
+        for tr in container.xpath(".//tr"):
+            cells = tr.xpath("./th|./td")
+            if len(cells) >= 2:
+                _assign_nutrient(bucket, as_text(cells[0]), as_text(cells[-1]))
+    if len(bucket) < 4:
+        rows = container.xpath(".//li | .//p | .//div[contains(@class,'Row') or contains(@class,'Item') or contains(@class,'line')]")
+        for n in rows:
+            text = as_text(n)
+            if ":" in text:
+                k, v = text.split(":", 1)
+                _assign_nutrient(bucket, k, v)
+            else:
+                for frag, field in _NUTRIENT_KEYS.items():
+                    if frag in text.lower():
+                        m = re.search(r"([-+]?\d+(?:[.,]\d+)?)", text)
+                        if m:
+                            bucket[field] = float(m.group(1).replace(",", "."))
+                        break
+    return bucket
+
+
+def legacy(doc: html.HtmlElement) -> Result:
+    container = _legacy_info_elem(doc, "Пищевая") or _legacy_info_elem(doc, "Пищевая и энергетическая")
+    if container is None:
+        container = _fallback_energy_container(doc)
+    if container is None:
+        nutrition: Tuple[Optional[float], ...] = (None, None, None, None)
+    else:
+        merged = _merge_pref(_legacy_blocks(container), _parse_nutrition_from_text(container))
+        nutrition = (merged.get("proteins"), merged.get("fats"), merged.get("carbs"), merged.get("kcal"))
+    return nutrition, {t: _legacy_info_value(doc, t) for t in INFO_TITLES}
+
+
+def single_pass(doc: html.HtmlElement) -> Result:
+    info = InfoIndex(doc)
+    return _parse_nutrition(doc, info), {t: info.value(t) for t in INFO_TITLES}
+
+
+# --- замер ---
+
+def _load_docs(html_dir: Optional[Path], limit: Optional[int]) -> List[Tuple[str, html.HtmlElement]]:
+    docs: List[Tuple[str, html.HtmlElement]] = []
+    if html_dir is not None:
+        for path in sorted(html_dir.glob("*.html"))[:limit]:
+            docs.append((path.name, html.fromstring(path.read_text(encoding="utf-8"))))
+        return docs
+    archive = PageArchive(CONFIG_PATHS.archive_dir)
+    for entry, page_html in archive.iter_pages(archive.entries()[:limit]):
+        docs.append((entry.url, html.fromstring(page_html)))
+    return docs
+
+
+def _time_per_page(fn: Callable[[html.HtmlElement], Result], docs, repeat: int) -> List[float]:
+    per_page: List[float] = []
+    for _, doc in docs:
+        started = time.process_time()
+        for _ in range(repeat):
+            fn(doc)
+        per_page.append((time.process_time() - started) / repeat * 1000)
+    return per_page
+
+
+def _summary(ms: List[float]) -> str:
+    p95 = sorted(ms)[max(0, int(len(ms) * 0.95) - 1)]
+    return f"mean={statistics.mean(ms):.3f}ms median={statistics.median(ms):.3f}ms p95={p95:.3f}ms"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Nutrition/info extraction micro-benchmark")
+    parser.add_argument("--html-dir", type=Path, default=None,
+                        help="Папка с *.html (по умолчанию - страницы из data/archive)")
+    parser.add_argument("--limit", type=int, default=None, help="Сколько страниц взять")
+    parser.add_argument("--repeat", type=int, default=5, help="Повторов на страницу")
+    args = parser.parse_args()
+
+    docs = _load_docs(args.html_dir, args.limit)
+    if not docs:
+        raise SystemExit("No pages to benchmark: run main.py --archive first or pass --html-dir")
+
+    mismatches = [name for name, doc in docs if legacy(doc) != single_pass(doc)]
+
+    old = _time_per_page(legacy, docs, args.repeat)
+    new = _time_per_page(single_pass, docs, args.repeat)
+    print(f"pages={len(docs)} repeat={args.repeat}")
+    print(f"legacy      {_summary(old)}")
+    print(f"single-pass {_summary(new)}")
+    print(f"speedup x{sum(old) / max(sum(new), 1e-9):.2f}")
+    print(f"result mismatches: {len(mismatches)}")
+    for name in mismatches[:10]:
+        print(f"  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,26 +1,34 @@
 import argparse
 import csv
+import math
+import os
+import shutil
+from collections import deque
+from contextlib import ExitStack
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
 from dataclasses import asdict
-from typing import Any, Dict, List, Set
+from functools import partial
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
 
-from parsers.links import collect_product_links
-from parsers.product import parse_product
+from parsers.images import IMAGE_WORKERS, IMAGES
+from parsers.helpers import slug_from_page_url
+from parsers.links import iter_product_links
+from parsers.product import local_image_path, parse_product, parse_product_html
+from parsers.profiling import FIELD_PROFILER
 from settings.constants import COLUMNS
 from settings.logging_setup import configure_root_logger, get_logger
-from settings.runtime import CONFIG_PATHS
+from settings.proxy import CLIENT
+from settings.runtime import CONFIG_PATHS, RUN_TS
+from storage.archive import ArchiveEntry, PageArchive
+from storage.history import ProductHistory
+from storage.http_cache import HTTP_CACHE, CacheMiss
+from storage.tsv_sink import FSYNC_POLICIES, TsvSink, format_row
+from storage.work_queue import WorkQueue
 
+log = get_logger(__name__)
 
-def _format_row(row: Dict[str, Any]) -> Dict[str, str]:
-    out: Dict[str, str] = {}
-    for k in COLUMNS:
-        v = row.get(k)
-        if v is None:
-            out[k] = ""
-        elif isinstance(v, float):
-            out[k] = f"{v:.10g}"
-        else:
-            out[k] = str(v)
-    return out
+REPARSE_CHUNK = 64  # страниц архива на одну задачу процесса
+QUEUE_CLAIM_BATCH = 64  # сколько url забирать из очереди за раз
 
 
 def _load_existing_urls() -> Set[str]:
@@ -36,57 +44,395 @@ def _load_existing_urls() -> Set[str]:
     return urls
 
 
+def _load_existing_rows() -> Dict[str, Dict[str, Any]]:
+    if not CONFIG_PATHS.tsv_path.exists():
+        return {}
+    with CONFIG_PATHS.tsv_path.open("r", encoding="utf-8") as f:
+        return {r["url"]: r for r in csv.DictReader(f, delimiter="\t") if r.get("url")}
+
+
 def write_tsv(rows: List[Dict[str, Any]]) -> None:
     with CONFIG_PATHS.tsv_path.open("w", encoding="utf-8", newline="") as f:
-        w = csv.DictWriter(f, fieldnames=COLUMNS, delimiter="\t")
+        w = csv.DictWriter(f, fieldnames=COLUMNS, delimiter="\t", lineterminator="\n")
         w.writeheader()
         for r in rows:
-            w.writerow(_format_row(r))
+            w.writerow(format_row(r, COLUMNS))
+
+
+def _parse_row(
+    url: str, need_image: bool, archive: Optional[PageArchive]
+) -> Tuple[Optional[Dict[str, Any]], Optional[Exception]]:
+    """(строка, None) или (None, исключение) - текст ошибки нужен очереди (last_error)."""
+    try:
+        return asdict(parse_product(url, need_image=need_image, archive=archive)), None
+    except CacheMiss as e:
+        log.warning(f"Skipped (offline, not cached): {url}")
+        return None, e
+    except Exception as e:
+        log.exception(f"Failed to parse: {url}")
+        return None, e
+
+
+def _parse_stream(
+    links: Iterable[str],
+    need_image: bool,
+    workers: int,
+    archive: Optional[PageArchive] = None,
+) -> Iterator[Tuple[str, Optional[Dict[str, Any]], Optional[Exception]]]:
+    """
+    Отдаёт (url, row, error) по мере готовности. При workers > 1 страницы парсятся в пуле потоков,
+    в полёте держим не больше workers * 2 задач, чтобы не набирать очередь на весь список.
+    """
+    if workers <= 1:
+        for url in links:
+            yield (url, *_parse_row(url, need_image, archive))
+        return
+
+    max_in_flight = workers * 2
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="product") as pool:
+        pending: Dict[Future, str] = {}
+        for url in links:
+            pending[pool.submit(_parse_row, url, need_image, archive)] = url
+            if len(pending) < max_in_flight:
+                continue
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                yield (pending.pop(fut), *fut.result())
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                yield (pending.pop(fut), *fut.result())
+
+
+def _queued_links(queue: WorkQueue, discover: Optional[Iterable[str]]) -> Iterator[str]:
+    """
+    Сначала то, что осталось в очереди от прошлых запусков, затем новые ссылки из обхода
+    категории (каждая сперва записывается в очередь), в конце - повторы failed, чья пауза истекла.
+    """
+    def drain() -> Iterator[str]:
+        while True:
+            batch = queue.claim(QUEUE_CLAIM_BATCH)
+            if not batch:
+                return
+            yield from batch
+
+    yield from drain()
+    if discover is not None:
+        for url in discover:
+            if queue.add([url], claimed=True):
+                yield url
+        queue.mark_listing_done()
+    yield from drain()
+
+
+class _DurableAcks:
+    """
+    Строки, отданные приёмникам (TsvSink, ParquetSink, FeatureSink), но ещё не сброшенные ими
+    на диск: все три копят строки и пишут пачками. Строка считается записанной, когда счётчик
+    written каждого приёмника, которому её отдали, дошёл до её номера; только тогда url
+    можно помечать done - иначе после падения он числился бы собранным, не попав в файлы.
+    """
+
+    def __init__(self, sinks: Sequence[Any]):
+        self.sinks = list(sinks)
+        self._sent = [0] * len(self.sinks)
+        self._pending: Deque[Tuple[str, Dict[str, Any], Tuple[int, ...]]] = deque()
+
+    def write(self, url: str, row: Dict[str, Any], skip: Sequence[Any] = ()) -> None:
+        for i, s in enumerate(self.sinks):
+            if s not in skip:
+                s.write(row)
+                self._sent[i] += 1
+        self._pending.append((url, row, tuple(self._sent)))
+
+    def durable(self) -> List[Tuple[str, Dict[str, Any]]]:
+        """(url, row) в порядке записи, которые уже на диске у всех приёмников."""
+        out: List[Tuple[str, Dict[str, Any]]] = []
+        while self._pending and all(s.written >= n for s, n in zip(self.sinks, self._pending[0][2])):
+            url, row, _ = self._pending.popleft()
+            out.append((url, row))
+        return out
+
+
+def _reparse_chunk(
+    entries: List[ArchiveEntry],
+    profile: bool = False,
+) -> Tuple[List[Dict[str, Any]], Dict[str, Tuple[int, float]]]:
+    # процессы-воркеры не видят флаг родителя, передаём его явно и возвращаем замеры
+    FIELD_PROFILER.enabled = profile
+    FIELD_PROFILER.reset()
+    archive = PageArchive(CONFIG_PATHS.archive_dir)
+    rows: List[Dict[str, Any]] = []
+    for entry, page_html in archive.iter_pages(entries):
+        try:
+            rows.append(asdict(parse_product_html(page_html, entry.url)))
+        except Exception:
+            log.exception(f"Failed to reparse: {entry.url}")
+    return rows, FIELD_PROFILER.snapshot()
+
+
+def reparse(processes: Optional[int], profile: bool = False) -> None:
+    """
+    Пересобирает data.tsv из архива страниц без сети. Страницы разбираются пулом процессов,
+    строки с URL из архива заменяются, остальные строки data.tsv остаются как были.
+    """
+    archive = PageArchive(CONFIG_PATHS.archive_dir)
+    entries = archive.entries()
+    if not entries:
+        log.warning(f"Archive is empty: {archive.index_path}")
+        return
+
+    processes = processes or os.cpu_count() or 1
+    size = max(1, min(REPARSE_CHUNK, math.ceil(len(entries) / (processes * 4))))
+    chunks = [entries[i:i + size] for i in range(0, len(entries), size)]
+    log.info(f"Reparsing {len(entries)} archived page(s) in {len(chunks)} chunk(s) with {processes} process(es)…")
+
+    parsed: List[Dict[str, Any]] = []
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        for rows, timings in pool.map(partial(_reparse_chunk, profile=profile), chunks):
+            parsed.extend(rows)
+            FIELD_PROFILER.merge(timings)
+
+    rows = _load_existing_rows()
+    for row in parsed:
+        rows[row["url"]] = row
+    write_tsv(list(rows.values()))
+    log.info(f"Reparsed {len(parsed)}/{len(entries)} page(s). TSV rows={len(rows)} -> {CONFIG_PATHS.tsv_path}")
+    if profile:
+        FIELD_PROFILER.log_report(log)
+
+
+def _parquet_sink():
+    # pyarrow нужен только с --parquet
+    from storage.parquet_store import SEED_TS, ParquetSink, is_seeded
+
+    if not is_seeded(CONFIG_PATHS.dataset_dir):
+        # --parquet пишет только строки текущего запуска; без посева датасет потерял бы всё,
+        # что уже есть в data.tsv, а preprocess.py читал бы только его
+        shutil.rmtree(CONFIG_PATHS.dataset_dir / f"crawl_ts={SEED_TS}", ignore_errors=True)
+        tsv_to_parquet(SEED_TS)
+    return ParquetSink(CONFIG_PATHS.dataset_dir, RUN_TS)
+
+
+def _feature_sink():
+    # pandas/scipy нужны только с --features
+    from preprocess import ProductPreprocessor
+    from storage.feature_store import FeatureSink
+
+    return FeatureSink(CONFIG_PATHS.features_dir, ProductPreprocessor.load(CONFIG_PATHS.preprocess_path))
+
+
+def tsv_to_parquet(crawl_ts: str = RUN_TS) -> None:
+    from storage.parquet_store import ParquetSink, mark_seeded
+
+    rows = _load_existing_rows()
+    with ParquetSink(CONFIG_PATHS.dataset_dir, crawl_ts) as sink:
+        for row in rows.values():
+            sink.write(row)
+    mark_seeded(CONFIG_PATHS.dataset_dir, CONFIG_PATHS.tsv_path, len(rows), crawl_ts)
+    log.info(f"Converted {len(rows)} TSV row(s) -> {sink.dir}")
+
+
+def _open_history() -> ProductHistory:
+    history = ProductHistory(CONFIG_PATHS.history_path, COLUMNS)
+    if not len(history):
+        rows = _load_existing_rows()
+        if rows:
+            log.info(f"Seeding product history from TSV: {history.seed(rows.values(), RUN_TS)} row(s)")
+    return history
+
+
+def refresh(args: argparse.Namespace, history: ProductHistory) -> None:
+    """
+    Перепроверка уже известных товаров: берутся url, не проверявшиеся дольше --max-age-hours.
+    Кэш ответов здесь только перепроверяется (ETag/Last-Modified), в историю попадают лишь
+    изменившиеся строки.
+    """
+    HTTP_CACHE.max_ttl = 0.0
+    urls = history.due(args.max_age_hours * 3600, limit=args.limit)
+    workers = max(1, args.workers)
+    log.info(f"Refreshing {len(urls)} known product(s) with {workers} worker(s)…")
+
+    changed = failed = 0
+    with ExitStack() as stack:
+        parquet = stack.enter_context(_parquet_sink()) if args.parquet else None
+        for i, (url, row, _) in enumerate(_parse_stream(urls, need_image=False, workers=workers), start=1):
+            if row is None:
+                failed += 1
+                history.touch_failed(url)
+                continue
+            if row.get("image_path") is None:
+                row["image_path"] = local_image_path(url)
+            if history.record(row, RUN_TS):
+                changed += 1
+                log.info(f"Changed {i}/{len(urls)}: {url}")
+                if parquet is not None:
+                    parquet.write(row)
+
+    log.info(f"Refresh done: checked={len(urls)} changed={changed} failed={failed} -> {history.path}")
+    if args.export_tsv:
+        rows = list(history.snapshot())
+        write_tsv(rows)
+        log.info(f"Exported current snapshot: {len(rows)} row(s) -> {CONFIG_PATHS.tsv_path}")
 
-def _append_tsv_row(row: Dict[str, Any]) -> None:
-    tsv_path = CONFIG_PATHS.tsv_path
-    file_exists = tsv_path.exists()
-    with tsv_path.open("a", encoding="utf-8", newline="") as f:
-        writer = csv.DictWriter(f, fieldnames=COLUMNS, delimiter="\t", lineterminator="\n")
-        if not file_exists:
-            writer.writeheader()
-        writer.writerow({k: row.get(k, "") for k in COLUMNS})
 
 def main() -> None:
     parser = argparse.ArgumentParser(description="VkusVill dataset builder")
     parser.add_argument("--target-links", type=int, default=None)
     parser.add_argument("--download-images", action="store_true")
+    parser.add_argument("--image-workers", type=int, default=IMAGE_WORKERS,
+                        help=f"Сколько картинок качать параллельно (по умолчанию {IMAGE_WORKERS})")
+    parser.add_argument("--thumbnails", type=int, default=None, metavar="PX",
+                        help="Делать превью PX x PX в data/pics/thumbs (нужен Pillow)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Сколько страниц товаров парсить параллельно (по умолчанию 1)")
+    parser.add_argument("--offline", action="store_true",
+                        help="Не ходить в сеть: страницы и картинки берутся только из data/http_cache")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Не читать и не пополнять data/http_cache")
+    parser.add_argument("--archive", action="store_true",
+                        help="Сохранять страницы товаров в data/archive для последующего reparse")
+    parser.add_argument("--profile-fields", action="store_true",
+                        help="В конце вывести время по каждому экстрактору полей товара")
+    parser.add_argument("--parquet", action="store_true",
+                        help="Дополнительно писать строки в типизированный датасет data/dataset/crawl_ts=<запуск>")
+    parser.add_argument("--features", action="store_true",
+                        help="Сразу прогонять строки через обученный preprocess.json и дописывать в матрицу data/features")
+    parser.add_argument("--fsync", choices=FSYNC_POLICIES, default="close",
+                        help="Когда делать fsync data.tsv: none, после каждой пачки (batch) или при закрытии (close)")
+    sub = parser.add_subparsers(dest="command")
+    rp = sub.add_parser("reparse", help="Пересобрать data.tsv из data/archive без сети")
+    rp.add_argument("--processes", type=int, default=None,
+                    help="Число процессов (по умолчанию - все ядра)")
+    sub.add_parser("to-parquet", help="Сложить текущий data.tsv в data/dataset отдельной партицией")
+    rf = sub.add_parser("refresh", help="Перепроверить известные товары и записать изменения в историю")
+    rf.add_argument("--max-age-hours", type=float, default=24.0,
+                    help="Обновлять товары, не проверявшиеся дольше стольких часов (по умолчанию 24)")
+    rf.add_argument("--limit", type=int, default=None, help="Не больше стольких товаров за запуск")
+    rf.add_argument("--export-tsv", action="store_true",
+                    help="После обновления переписать data.tsv текущим снимком из истории")
     args = parser.parse_args()
 
     configure_root_logger()
-    log = get_logger(__name__)
+    if args.command == "reparse":
+        reparse(args.processes, profile=args.profile_fields)
+        return
+    if args.command == "to-parquet":
+        tsv_to_parquet()
+        return
+
+    FIELD_PROFILER.enabled = args.profile_fields
+    HTTP_CACHE.enabled = not args.no_cache
+    HTTP_CACHE.offline = args.offline
+    if args.offline and args.no_cache:
+        parser.error("--offline needs the cache, drop --no-cache")
+    if args.features and not CONFIG_PATHS.preprocess_path.exists():
+        parser.error(f"--features needs fitted {CONFIG_PATHS.preprocess_path}, run preprocess.py --features first")
+    history = _open_history()
+    if args.command == "refresh":
+        refresh(args, history)
+        CLIENT.log_stats()
+        if args.profile_fields:
+            FIELD_PROFILER.log_report(log)
+        return
+
     existing = _load_existing_urls()
     if existing:
         log.info(f"Existing URLs detected: {len(existing)} (will be skipped)")
 
-    links = collect_product_links(
-        target_count=args.target_links,
-        existing_urls=existing,
-        max_pages=None,
-    )
+    queue = WorkQueue(CONFIG_PATHS.queue_path)
+    if queue.listing_done and not queue.remaining():
+        queue.reset()  # прошлый сбор завершён, начинаем новый
+    recovered = queue.recover()
+    known = queue.known_urls()
+    if known:
+        log.info(f"Resuming crawl queue: {queue.counts()} (recovered in_progress={recovered})")
 
-    total = len(links)
-    log.info(f"Parsing {total} product page(s)…")
+    workers = max(1, args.workers)
+    discover = None
+    if not queue.listing_done:
+        # Страницы категории качаются тем же числом потоков, ссылки сразу уходят в парсинг товаров.
+        # Цель - на весь сбор, поэтому уже стоящие в очереди url из неё вычитаются.
+        target = max(0, args.target_links - len(known)) if args.target_links else None
+        if target != 0:
+            log.info(f"Parsing product pages with {workers} worker(s) while the listing is being scanned…")
+            discover = iter_product_links(
+                target_count=target,
+                existing_urls=existing | known,
+                max_pages=None,
+                workers=workers,
+            )
+        else:
+            queue.mark_listing_done()
+    links = _queued_links(queue, discover)
 
-    written = 0
-    for i, url in enumerate(links, start=1):
-        log.info(f"Product {i}/{total}: {url}")
-        try:
-            p = parse_product(url, need_image=args.download_images)
-            row = asdict(p)
-            _append_tsv_row(row)
-            written += 1
+    # Строки отдаёт главный поток, на диск их пачками пишет фоновый поток TsvSink.
+    archive = PageArchive(CONFIG_PATHS.archive_dir) if args.archive else None
+    # Картинки качает отдельная стадия IMAGES, парсинг товара их не ждёт.
+    IMAGES.workers = max(1, args.image_workers)
+    IMAGES.thumb_size = args.thumbnails
+    stream = _parse_stream(links, need_image=args.download_images, workers=workers, archive=archive)
+
+    def acknowledge(rows: List[Tuple[str, Dict[str, Any]]]) -> None:
+        # строка уже на диске во всех приёмниках - теперь и в истории, и url закрыт в очереди
+        for url, row in rows:
+            history.record(row, RUN_TS)
+            queue.done(url)
             existing.add(row.get("url", url))
-            log.info(f"Wrote row #{written} -> {CONFIG_PATHS.tsv_path}")
-        except Exception:
-            log.exception(f"Failed to parse: {url}")
+
+    acks: Optional[_DurableAcks] = None
+    try:
+        with ExitStack() as stack:
+            stack.callback(IMAGES.close)
+            sink = stack.enter_context(TsvSink(CONFIG_PATHS.tsv_path, COLUMNS, fsync=args.fsync))
+            parquet = stack.enter_context(_parquet_sink()) if args.parquet else None
+            features = stack.enter_context(_feature_sink()) if args.features else None
+            acks = _DurableAcks([s for s in (sink, parquet, features) if s is not None])
+            waiting: List[Tuple[str, Dict[str, Any]]] = []  # строки, чья картинка ещё качается
+
+            def write(url: str, row: Dict[str, Any]) -> None:
+                # url из прошлого запуска, упавшего между записью в data.tsv и done: второй строки не пишем
+                acks.write(url, row, skip=(sink,) if url in existing else ())
+
+            def write_ready(block: bool) -> None:
+                # строка уходит в приёмники, когда её картинка скачана или не скачалась:
+                # в image_path попадает путь только к реально сохранённому файлу
+                still = []
+                for url, row in waiting:
+                    slug = slug_from_page_url(url)
+                    if block or IMAGES.ready(slug):
+                        row["image_path"] = IMAGES.result(slug)
+                        write(url, row)
+                    else:
+                        still.append((url, row))
+                waiting[:] = still
+
+            for i, (url, row, error) in enumerate(stream, start=1):
+                log.info(f"Product {i}: {url}")
+                if isinstance(error, CacheMiss):
+                    queue.release(url, repr(error))
+                    continue
+                if row is None:
+                    queue.fail(url, repr(error))
+                    continue
+                if row.get("image_path") is not None:
+                    waiting.append((url, row))
+                else:
+                    write(url, row)
+                write_ready(block=False)
+                acknowledge(acks.durable())
+            write_ready(block=True)  # сбор закончен, ждать больше нечего - дожидаемся картинок
+    finally:
+        # приёмники закрыты (всё сброшено) - подтверждаем остаток; чего они не записали, останется in_progress
+        if acks is not None:
+            acknowledge(acks.durable())
+    written = sink.written
+    log.info(f"Crawl queue: {queue.counts()}")
 
     log.info(f"Finished. Total new rows written: {written}. TSV -> {CONFIG_PATHS.tsv_path}")
+    CLIENT.log_stats()
+    if args.profile_fields:
+        FIELD_PROFILER.log_report(log)
 
 if __name__ == "__main__":
     main()
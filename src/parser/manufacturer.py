@@ -0,0 +1,159 @@
+"""
+Имя производителя из сырой строки «Изготовитель» - оба набора правил в одном месте:
+
+- "org": одно ORG_RE (ООО/АО/ПАО/ЗАО/ОАО/ИП + название) - manufacturer_name в preprocess.py;
+- "names": все названия перед двоеточиями с логом сработавшего случая - names_list
+  в preprocessing.ipynb.
+
+Строки «Изготовитель» у разных товаров повторяются (один производитель - десятки товаров),
+поэтому результат кэшируется по сырой строке, а extract_batch разбирает колонку целиком:
+каждое уникальное значение - один раз, кэш общий для всех вызовов процесса.
+"""
+from __future__ import annotations
+
+import re
+from functools import lru_cache
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Tuple
+
+MANUFACTURER_CACHE_SIZE: int = 1 << 16    # уникальных сырых строк в кэше каждого правила
+
+# --- "org": preprocess.py ---
+
+ORG_RE = re.compile(r"\b(ООО|АО|ПАО|ЗАО|ОАО|ИП)\b\s*[«\"]?\s*([A-Za-zА-Яа-я0-9\s\-\._]+)", re.I | re.U)
+MISSING = {"", "None", "nan"}
+UNKNOWN_ORG = "unknown"
+
+
+@lru_cache(maxsize=MANUFACTURER_CACHE_SIZE)
+def extract_manufacturer_name(raw: str | None) -> str:
+    if not raw or str(raw).strip() in MISSING:
+        return UNKNOWN_ORG
+    s = str(raw).replace("„", "«").replace("“", "»").replace(":", " ")
+    m = ORG_RE.search(s)
+    if not m:
+        return UNKNOWN_ORG
+    name = (m.group(1) + " " + m.group(2)).strip()
+    name = name.replace('"', "").replace("«", "").replace("»", "")
+    name = re.sub(r"\s{2,}", " ", name)
+    return name if name else UNKNOWN_ORG
+
+
+# --- "names": preprocessing.ipynb ---
+
+LEGAL = ("ООО", "ИП", "АО", "ПАО", "ОАО", "ЗАО", "НАО", "МПК", "ТПК", "НПО", "НПФ", "ПК", "ТД", "ТС", "МП")
+COLON = re.compile(r":")
+LEGAL_RE = re.compile(r"\b(?:" + "|".join(map(re.escape, LEGAL)) + r")\b", re.I)
+ENDS_OOO_RE = re.compile(r"(?:[\"«»„“”]\s*)*\bООО\s*$", re.I)
+TRIM = ' \t\r\n,.;:«»"„“”'
+STOP_WORD_RE = re.compile(r"(?s).*[\d.;]\S*")
+UNKNOWN_NAME = "Unknowing_manufacturer"
+
+Log = Dict[str, Any]
+
+
+def _clean(x: str) -> str:
+    return " ".join(x.split()).strip(TRIM)
+
+
+def _left_boundary_words_until_digit(s: str, from_idx: int) -> int:
+    """
+    Конец ближайшего слева от from_idx слова с цифрой, точкой или «;» (0, если такого нет).
+    Одно сопоставление STOP_WORD_RE до from_idx вместо списка всех слов через re.finditer:
+    жадное .* доходит до последнего стоп-символа, \\S* - до конца его слова. Цифра - \\d,
+    то есть без надстрочных вроде «²», которые str.isdigit тоже считал цифрами.
+    """
+    m = STOP_WORD_RE.match(s, 0, from_idx)
+    return m.end() if m else 0
+
+
+def _fallback() -> Log:
+    return {"case": "fallback_unknown", "colon_pos": None, "start": None, "raw": "", "name": UNKNOWN_NAME}
+
+
+@lru_cache(maxsize=MANUFACTURER_CACHE_SIZE)
+def _names_with_logging(line: str) -> Tuple[Tuple[str, ...], Tuple[Log, ...]]:
+    out, logs = [], []
+    for m in COLON.finditer(line):
+        ci = m.start()
+        seg = line[:ci]
+        last_legal = None
+        for lm in LEGAL_RE.finditer(seg):
+            last_legal = lm
+
+        if last_legal:
+            tail = _clean(seg[last_legal.end():])
+            if tail:
+                start = last_legal.start()
+                case = "case_1_legal_tail_anchor_legal"
+            elif ENDS_OOO_RE.search(seg[last_legal.start():]):
+                start = _left_boundary_words_until_digit(line, last_legal.start())
+                case = "case_2_ends_with_OOO_digit_stop"
+            else:
+                start = 0
+                case = "case_1_legal_no_tail"
+        else:
+            start = _left_boundary_words_until_digit(line, ci)
+            case = "case_3_no_legal_digit_stop"
+
+        raw = line[start:ci]
+        name = _clean(raw)
+        logs.append({"case": case, "colon_pos": ci, "start": start, "raw": raw, "name": name})
+        if name:
+            out.append(name)
+
+    seen, names, kept_logs = set(), [], []
+    for n, lg in zip(out, logs):
+        k = n.lower()
+        if k not in seen:
+            seen.add(k); names.append(n); kept_logs.append(lg)
+
+    if not names:
+        names = [UNKNOWN_NAME]
+        kept_logs.append(_fallback())
+    return tuple(names), tuple(kept_logs)
+
+
+def extract_names_with_logging(line: Any) -> Tuple[List[str], List[Log]]:
+    """Как в preprocessing.ipynb: (названия без повторов, лог случая для каждого). Копии - кэш не портится."""
+    if not isinstance(line, str) or not line:
+        return [UNKNOWN_NAME], [_fallback()]
+    names, logs = _names_with_logging(line)
+    return list(names), [dict(lg) for lg in logs]
+
+
+def extract_names(line: Any) -> List[str]:
+    if not isinstance(line, str) or not line:
+        return [UNKNOWN_NAME]
+    return list(_names_with_logging(line)[0])
+
+
+# --- вся колонка сразу ---
+
+RULES: Dict[str, Callable[[Any], Any]] = {
+    "org": extract_manufacturer_name,
+    "names": extract_names,
+}
+
+
+def _key(v: Any) -> Hashable:
+    # NaN != NaN: все пропуски-числа сводим к одному ключу, результат для них одинаковый
+    return None if isinstance(v, float) and v != v else v
+
+
+def extract_batch(values: Iterable[Any], rule: str = "org") -> List[Any]:
+    """
+    Правило rule ("org" или "names") для всей колонки: значения дедуплицируются, каждое
+    уникальное разбирается один раз (и попадает в общий кэш), результат - список по строкам.
+    Для "names" у каждой строки свой список, как после .apply.
+    """
+    fn = RULES[rule]
+    keys = [_key(v) for v in values]
+    parsed = {k: fn(k) for k in dict.fromkeys(keys)}
+    if rule == "names":
+        return [list(parsed[k]) for k in keys]
+    return [parsed[k] for k in keys]
+
+
+def cache_clear() -> None:
+    extract_manufacturer_name.cache_clear()
+    _names_with_logging.cache_clear()
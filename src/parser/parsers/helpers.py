@@ -1,39 +1,71 @@
+import asyncio
 import logging
 import os
-import re
 from pathlib import Path
-from typing import Any, Optional, Tuple
+from typing import Any, Optional, Tuple, Union
 from urllib.parse import urlparse
 
-import requests
 from lxml import etree, html
 
+from parsers.selectors import RX_GRAMS, RX_IMAGE_EXT, RX_NUMBER, RX_PIECES, RX_WS, XP_TEXT
+from settings.constants import BASE_CATEGORY_URL
 from settings.proxy import CLIENT
 from settings.runtime import CONFIG_PATHS
+from storage.http_cache import (
+    HTTP_CACHE,
+    IMAGE_TTL_SEC,
+    LISTING_TTL_SEC,
+    PAGE_TTL_SEC,
+    CachedResponse,
+)
 
 log = logging.getLogger(__name__)
 
-def get_response(url: str) -> requests.Response:
-    r = CLIENT.http_get(url=url)
-    return r
+def _cache_ttl(url: str) -> float:
+    if url.startswith(BASE_CATEGORY_URL):
+        return LISTING_TTL_SEC
+    if RX_IMAGE_EXT.search(urlparse(url).path):
+        return IMAGE_TTL_SEC
+    return PAGE_TTL_SEC
+
+def get_response(url: str) -> CachedResponse:
+    hit, cond = HTTP_CACHE.lookup(url, _cache_ttl(url))
+    if hit is not None:
+        return hit
+    r = CLIENT.http_get(url=url, extra_headers=cond)
+    return HTTP_CACHE.store(url, r.status_code, r.headers, r.content)
     
 def fetch_html(url: str) -> html.HtmlElement:
     r = get_response(url)
     return html.fromstring(r.text)
 
 
-_WS_RE = re.compile(r"\s+")
+async def aget_response(url: str) -> CachedResponse:
+    """Вызывать внутри `async with ASYNC_CLIENT:`; кэш на диске (SQLite) читается и пишется в потоке, не в event loop."""
+    # aiohttp подтягиваем только при асинхронном использовании
+    from settings.async_proxy import ASYNC_CLIENT
+
+    hit, cond = await asyncio.to_thread(HTTP_CACHE.lookup, url, _cache_ttl(url))
+    if hit is not None:
+        return hit
+    r = await ASYNC_CLIENT.http_get(url=url, extra_headers=cond)
+    return await asyncio.to_thread(HTTP_CACHE.store, url, r.status_code, r.headers, r.content)
+
+async def afetch_html(url: str) -> html.HtmlElement:
+    r = await aget_response(url)
+    return html.fromstring(r.text)
+
 
 def _clean_ws(s: Optional[str]) -> Optional[str]:
     if s is None:
         return None
-    return _WS_RE.sub(" ", s).replace("\u00a0", " ").strip()
+    return RX_WS.sub(" ", s).replace("\u00a0", " ").strip()
 
 def as_text(node: Any) -> str:
     if node is None:
         return ""
     if isinstance(node, html.HtmlElement) or isinstance(node, etree._Element):
-        txt = " ".join(node.xpath(".//text()"))
+        txt = " ".join(XP_TEXT(node))
         return _clean_ws(txt) or ""
     if isinstance(node, (etree._ElementUnicodeResult, str)):
         return _clean_ws(str(node)) or ""
@@ -41,8 +73,8 @@ def as_text(node: Any) -> str:
         return _clean_ws(node.decode("utf-8", errors="ignore")) or ""
     return _clean_ws(str(node)) or ""
 
-def first_text(doc: html.HtmlElement, xp: str) -> Optional[str]:
-    got = doc.xpath(xp)
+def first_text(doc: html.HtmlElement, xp: Union[str, etree.XPath]) -> Optional[str]:
+    got = xp(doc) if isinstance(xp, etree.XPath) else doc.xpath(xp)
     if not got:
         return None
     return as_text(got[0])
@@ -58,7 +90,7 @@ def rel_repo_path(p: Path) -> str:
 def num(s: Optional[str]) -> Optional[float]:
     if not s:
         return None
-    m = re.search(r"[-+]?\d+(?:[.,]\d+)?", str(s).replace("\u00a0", " "))
+    m = RX_NUMBER.search(str(s).replace("\u00a0", " "))
     return float(m.group(0).replace(",", ".")) if m else None
 
 UNIT_TO_GRAMS = {
@@ -83,14 +115,14 @@ def grams(s: Optional[str]) -> Optional[float]:
     if not s:
         return None
     s_norm = s.lower().replace(",", ".")
-    m = re.search(r"(\d+(?:\.\d+)?)\s*(кг|г|гр|мл|л)\b", s_norm)
+    m = RX_GRAMS.search(s_norm)
     if m:
         value = float(m.group(1))
         unit = m.group(2)
         return value * UNIT_TO_GRAMS.get(unit, 1.0)
 
     # если встретились шт, то возвращаем None
-    if re.search(r"\bшт\.?\b", s_norm):
+    if RX_PIECES.search(s_norm):
         return None
 
     x = num(s_norm)
@@ -112,7 +144,7 @@ def shelf_days(s: Optional[str]) -> Optional[float]:
 def temps(s: Optional[str]) -> Tuple[Optional[float], Optional[float]]:
     if not s:
         return None, None
-    vals = [float(x.replace(",", ".")) for x in re.findall(r"[-+]?\d+(?:[.,]\d+)?", s)]
+    vals = [float(x.replace(",", ".")) for x in RX_NUMBER.findall(s)]
     if len(vals) >= 2:
         return vals[0], vals[1]
     if len(vals) == 1:
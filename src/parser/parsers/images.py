@@ -0,0 +1,221 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import queue
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
+from urllib.parse import urlparse
+
+from parsers.helpers import get_response, rel_repo_path
+from parsers.selectors import RX_IMAGE_EXT
+from settings.runtime import CONFIG_PATHS
+
+log = logging.getLogger(__name__)
+
+IMAGE_WORKERS: int = 4            # параллельных загрузок картинок
+THUMB_DIR_NAME = "thumbs"         # превью лежат в pics/thumbs/<slug>.jpg
+INDEX_NAME = "index.tsv"          # pics/index.tsv: sha1 -> файл, для дедупликации по содержимому
+
+IMAGE_EXTS = (".jpg", ".png", ".webp", ".gif", ".avif")
+DEFAULT_EXT = ".jpg"              # url без расширения; Content-Type тут не помогает - путь нужен до загрузки
+
+_STOP = object()
+
+
+def ext_from_url(url: str) -> Optional[str]:
+    m = RX_IMAGE_EXT.search(urlparse(url).path)
+    if not m:
+        return None
+    ext = m.group(0).lower()
+    return ".jpg" if ext == ".jpeg" else ext
+
+
+class ImagePipeline:
+    """
+    Отдельная стадия загрузки картинок: парсер товара только кладёт (slug, url) в очередь
+    и сразу получает будущий путь к файлу, а качают фоновые потоки. Уже лежащие на диске
+    картинки не запрашиваются; скачанная картинка с тем же содержимым (sha1), что и уже
+    сохранённая, не пишется второй раз, а становится жёсткой ссылкой на неё. Расширение
+    берётся из url (без него - .jpg): путь из submit и файл на диске всегда совпадают.
+    Строку товара с путём пишут, когда ready(slug) - тогда result(slug) не ждёт и для
+    неудавшейся загрузки отдаёт None.
+    thumb_size - сторона превью в пикселях (нужен Pillow), None - без превью.
+    """
+
+    def __init__(self, pics_dir: Path, workers: int = IMAGE_WORKERS, thumb_size: Optional[int] = None):
+        self.pics_dir = pics_dir
+        self.workers = workers
+        self.thumb_size = thumb_size
+        self.stats: Dict[str, int] = {"downloaded": 0, "skipped": 0, "deduplicated": 0, "thumbs": 0, "failed": 0}
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+        self._seen: Set[str] = set()
+        self._done: Dict[str, threading.Event] = {}
+        self._index: Optional[Dict[str, str]] = None
+
+    # --- пути ---
+
+    def find_local(self, slug: str) -> Optional[Path]:
+        for ext in IMAGE_EXTS:
+            path = self.pics_dir / f"{slug}{ext}"
+            if path.exists():
+                return path
+        return None
+
+    def target_path(self, slug: str, url: str) -> Path:
+        return self.pics_dir / f"{slug}{ext_from_url(url) or DEFAULT_EXT}"
+
+    def thumb_path(self, slug: str) -> Path:
+        return self.pics_dir / THUMB_DIR_NAME / f"{slug}.jpg"
+
+    # --- очередь ---
+
+    def submit(self, slug: str, url: str) -> Optional[str]:
+        """Ставит картинку в очередь и возвращает путь, под которым она будет лежать."""
+        existing = self.find_local(slug)
+        path = existing or self.target_path(slug, url)
+        with self._lock:
+            if slug in self._seen:
+                return rel_repo_path(path)
+            self._seen.add(slug)
+            if existing is not None and (self.thumb_size is None or self.thumb_path(slug).exists()):
+                self.stats["skipped"] += 1
+                return rel_repo_path(path)
+            if not self._threads:
+                self._start()
+            self._done[slug] = threading.Event()
+        self._queue.put((slug, url))
+        return rel_repo_path(path)
+
+    def ready(self, slug: str) -> bool:
+        """Загрузка slug закончилась (или и не ставилась) - не блокирует."""
+        with self._lock:
+            done = self._done.get(slug)
+        return done is None or done.is_set()
+
+    def result(self, slug: str, timeout: Optional[float] = None) -> Optional[str]:
+        """Ждёт загрузку картинки slug (если она в очереди); путь к файлу или None, если его нет."""
+        with self._lock:
+            done = self._done.get(slug)
+        if done is not None:
+            done.wait(timeout)
+        path = self.find_local(slug)
+        return rel_repo_path(path) if path is not None else None
+
+    def _start(self) -> None:
+        for i in range(max(1, self.workers)):
+            t = threading.Thread(target=self._run, name=f"images-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def close(self) -> None:
+        """Дожидается всех поставленных загрузок."""
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for _ in threads:
+            self._queue.put(_STOP)
+        for t in threads:
+            t.join()
+        if self._seen:
+            log.info(f"[images] {self.stats} -> {self.pics_dir}")
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            slug, url = item
+            try:
+                self._process(slug, url)
+            except Exception as e:
+                with self._lock:
+                    self.stats["failed"] += 1
+                log.warning(f"[images] failed {slug}: {e}")
+            finally:
+                with self._lock:
+                    done = self._done.pop(slug, None)
+                if done is not None:
+                    done.set()
+
+    # --- загрузка ---
+
+    def _load_index(self) -> Dict[str, str]:
+        # вызывается под self._lock
+        if self._index is None:
+            self._index = {}
+            index_path = self.pics_dir / INDEX_NAME
+            if index_path.exists():
+                for line in index_path.read_text(encoding="utf-8").splitlines():
+                    digest, _, fname = line.partition("\t")
+                    if fname and (self.pics_dir / fname).exists():
+                        self._index[digest] = fname
+        return self._index
+
+    def _process(self, slug: str, url: str) -> None:
+        path = self.find_local(slug)
+        if path is None:
+            path = self._download(slug, url)
+        else:
+            with self._lock:
+                self.stats["skipped"] += 1
+        if self.thumb_size is not None:
+            self._thumbnail(slug, path)
+
+    def _download(self, slug: str, url: str) -> Path:
+        r = get_response(url)
+        if r.status_code != 200 or not r.content:
+            raise RuntimeError(f"HTTP {r.status_code} for {url}")
+        path = self.target_path(slug, url)
+        digest = hashlib.sha1(r.content).hexdigest()
+
+        with self._lock:
+            index = self._load_index()
+            same = index.get(digest)
+        if same is not None:
+            try:
+                os.link(self.pics_dir / same, path)
+                with self._lock:
+                    self.stats["deduplicated"] += 1
+                log.debug(f"[images] {slug}: same content as {same}, linked")
+                return path
+            except OSError:
+                pass  # ФС без жёстких ссылок - просто пишем файл
+
+        tmp = path.with_name(f".{path.name}.tmp")
+        tmp.write_bytes(r.content)
+        os.replace(tmp, path)
+        with self._lock:
+            self._load_index()[digest] = path.name
+            with (self.pics_dir / INDEX_NAME).open("a", encoding="utf-8") as f:
+                f.write(f"{digest}\t{path.name}\n")
+            self.stats["downloaded"] += 1
+        log.debug(f"Saved image -> {path}")
+        return path
+
+    def _thumbnail(self, slug: str, src: Path) -> None:
+        out = self.thumb_path(slug)
+        if out.exists():
+            return
+        try:
+            from PIL import Image
+        except ImportError:
+            log.warning("[images] Pillow is not installed, thumbnails disabled")
+            self.thumb_size = None
+            return
+        out.parent.mkdir(parents=True, exist_ok=True)
+        with Image.open(src) as im:
+            im = im.convert("RGB")
+            im.thumbnail((self.thumb_size, self.thumb_size))
+            tmp = out.with_name(f".{out.name}.tmp")
+            im.save(tmp, format="JPEG", quality=85)
+        os.replace(tmp, out)
+        with self._lock:
+            self.stats["thumbs"] += 1
+
+
+IMAGES = ImagePipeline(CONFIG_PATHS.pics_dir)
+
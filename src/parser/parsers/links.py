@@ -1,64 +1,117 @@
 import logging
-import re
 import urllib.parse as up
-from typing import List, Optional, Set
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Iterator, List, Optional, Set, Tuple
 
 from lxml import html
 
 from parsers.helpers import fetch_html
+from parsers.selectors import RX_PAGEN, RX_PRODUCT_HREF, XP_HREFS, XP_LINKS
 from settings.constants import BASE_CATEGORY_URL, MAX_PAGES
 
 log = logging.getLogger(__name__)
 
-_PRODUCT_RX = re.compile(r"/goods/[^/]+-\d+\.html$")
-
-
 def _extract_links(doc: html.HtmlElement) -> List[str]:
     out: Set[str] = set()
-    for a in doc.xpath("//a[@href]"):
+    for a in XP_LINKS(doc):
         href = a.get("href", "")
-        if _PRODUCT_RX.search(href):
+        if RX_PRODUCT_HREF.search(href):
             out.add(up.urljoin(BASE_CATEGORY_URL, href))
     return sorted(out)
 
 
-def collect_product_links(
+def _page_url(page: int) -> str:
+    return BASE_CATEGORY_URL if page == 1 else f"{BASE_CATEGORY_URL}?PAGEN_1={page}"
+
+
+def _last_page(doc: html.HtmlElement) -> Optional[int]:
+    """Номер последней страницы по ссылкам пагинации (?PAGEN_1=N), если они есть."""
+    pages = [int(m.group(1)) for href in XP_HREFS(doc) for m in [RX_PAGEN.search(href)] if m]
+    return max(pages) if pages else None
+
+
+def _fetch_page(page: int) -> Tuple[int, html.HtmlElement]:
+    return page, fetch_html(_page_url(page))
+
+
+def iter_product_links(
     target_count: Optional[int] = None,
     existing_urls: Optional[Set[str]] = None,
     max_pages: Optional[int] = None,
-) -> List[str]:
+    workers: int = 1,
+) -> Iterator[str]:
+    """
+    Отдаёт новые ссылки на товары по мере загрузки страниц категории, чтобы парсинг товаров
+    шёл параллельно с обходом. Первая страница нужна, чтобы узнать номер последней по
+    пагинации; остальные качаются пулом из workers потоков. Пустая страница тоже считается
+    концом каталога: страницы после неё не запрашиваются.
+    """
     limit_pages = max_pages or MAX_PAGES
     want = target_count if (target_count and target_count > 0) else None
     seen: Set[str] = set()
     skip: Set[str] = existing_urls or set()
-    links: List[str] = []
-    page = 1
+    collected = 0
     pages_scanned = 0
 
-    while page <= limit_pages:
-        url = BASE_CATEGORY_URL if page == 1 else f"{BASE_CATEGORY_URL}?PAGEN_1={page}"
-        doc = fetch_html(url)
+    def take(page: int, doc: html.HtmlElement) -> List[str]:
+        nonlocal collected, pages_scanned
         found = _extract_links(doc)
         new = [u for u in found if u not in seen and u not in skip]
-
-        for u in new:
-            seen.add(u)
-            links.append(u)
-
+        if want is not None:
+            new = new[:want - collected]
+        seen.update(new)
+        collected += len(new)
         pages_scanned += 1
-        log.info(f"Page {page}: found={len(found)} new={len(new)} total_new={len(links)}")
+        log.info(f"Page {page}: found={len(found)} new={len(new)} total_new={collected}")
+        return new
 
-        if want is not None and len(links) >= want:
-            log.info(f"Target reached: collected {len(links)} new links (target={want}) on page {page}")
-            break
+    _, first = _fetch_page(1)
+    last = _last_page(first)
+    if last is not None and last < limit_pages:
+        log.info(f"Pagination says the last page is {last} (limit_pages={limit_pages})")
+        limit_pages = last
+    yield from take(1, first)
 
-        page += 1
+    stop_at = limit_pages  # последняя страница, которую ещё имеет смысл запрашивать
+    next_page = 2
+    in_flight = max(1, workers)
+    pool = ThreadPoolExecutor(max_workers=in_flight, thread_name_prefix="listing")
+    pending: Set[Future] = set()
+    try:
+        while want is None or collected < want:
+            while next_page <= stop_at and len(pending) < in_flight:
+                pending.add(pool.submit(_fetch_page, next_page))
+                next_page += 1
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                page, doc = fut.result()
+                if page > stop_at:
+                    continue
+                if not _extract_links(doc):
+                    log.info(f"Page {page} is empty - treating it as the end of the catalog")
+                    stop_at = page - 1
+                    continue
+                yield from take(page, doc)
+                if want is not None and collected >= want:
+                    log.info(f"Target reached: collected {collected} new links (target={want}) on page {page}")
+                    break
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
 
-    if want is not None and len(links) < want:
+    if want is not None and collected < want:
         log.warning(
-            f"Collected {len(links)} new links < target {want} after scanning {pages_scanned} page(s) "
+            f"Collected {collected} new links < target {want} after scanning {pages_scanned} page(s) "
             f"(limit_pages={limit_pages})."
         )
+    log.info(f"Total product links collected: {collected}")
 
-    log.info(f"Total product links collected: {len(links)}")
-    return links[:want] if want is not None else links
+
+def collect_product_links(
+    target_count: Optional[int] = None,
+    existing_urls: Optional[Set[str]] = None,
+    max_pages: Optional[int] = None,
+    workers: int = 1,
+) -> List[str]:
+    return list(iter_product_links(target_count, existing_urls, max_pages, workers))
@@ -1,13 +1,12 @@
 import logging
-import re
-from dataclasses import dataclass
-from typing import Optional, Tuple
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
 
 from lxml import html
 
+from parsers import selectors as sel
 from parsers.helpers import (
     as_text,
-    fetch_html,
     first_text,
     get_response,
     grams,
@@ -17,7 +16,11 @@ from parsers.helpers import (
     slug_from_page_url,
     temps,
 )
-from settings.runtime import CONFIG_PATHS
+from parsers.images import IMAGES
+from parsers.profiling import FIELD_PROFILER
+
+if TYPE_CHECKING:
+    from storage.archive import PageArchive
 
 log = logging.getLogger(__name__)
 
@@ -47,67 +50,84 @@ class Product:
     image_path: Optional[str] = None
 
 
-def _info_elem(doc: html.HtmlElement, title_contains: str) -> Optional[html.HtmlElement]:
-    xp = "//div[contains(@class,'VV23_DetailProdPageInfoDescItem')]"
-    candidates = doc.xpath(xp)
-    for item in candidates:
-        title_nodes = item.xpath(".//h4")
-        title = as_text(title_nodes[0]) if title_nodes else ""
-        if title_contains.lower() in title.lower():
-            log.debug(f"[nutrition] container by title '{title_contains}' found: {title}")
-            return item
-    return None
+class InfoIndex:
+    """
+    Блоки секции «Информация» (VV23_DetailProdPageInfoDescItem) с их заголовками h4.
+    Собирается один раз на страницу, дальше поиск по подстроке заголовка идёт по списку,
+    а не новым обходом документа; найденные значения запоминаются.
+    """
 
-def _info_value(doc: html.HtmlElement, title_contains: str) -> Optional[str]:
-    item = _info_elem(doc, title_contains)
-    if item is None:
+    def __init__(self, doc: html.HtmlElement):
+        self.items: List[Tuple[str, html.HtmlElement]] = []
+        for item in sel.XP_INFO_ITEMS(doc):
+            h4 = next(item.iterdescendants("h4"), None)
+            self.items.append((as_text(h4).lower() if h4 is not None else "", item))
+        self._values: Dict[str, Optional[str]] = {}
+
+    @property
+    def titles(self) -> List[str]:
+        return [t for t, _ in self.items if t]
+
+    def elem(self, title_contains: str) -> Optional[html.HtmlElement]:
+        needle = title_contains.lower()
+        for title, item in self.items:
+            if needle in title:
+                log.debug(f"[info] container by title '{title_contains}' found: {title}")
+                return item
         return None
-    descs = item.xpath(".//div[contains(@class,'VV23_DetailProdPageInfoDescItem__Desc')]")
-    return as_text(descs[0]) if descs else None
+
+    def value(self, title_contains: str) -> Optional[str]:
+        if title_contains in self._values:
+            return self._values[title_contains]
+        item = self.elem(title_contains)
+        v = None
+        if item is not None:
+            for d in item.iterdescendants("div"):
+                if sel.INFO_DESC_CLASS in (d.get("class") or ""):
+                    v = as_text(d)
+                    break
+        self._values[title_contains] = v
+        return v
 
 def _fallback_energy_container(doc: html.HtmlElement) -> Optional[html.HtmlElement]:
-    nodes = doc.xpath("//*[contains(@class,'EnergyDesc') or contains(@class,'EnergyValue') or contains(@class,'EnergyItem')]")
+    nodes = sel.XP_ENERGY_NODES(doc)
     if not nodes:
         return None
-    anc = nodes[0].xpath("ancestor::div[contains(@class,'VV23_DetailProdPageInfoDescItem')][1]")
+    anc = sel.XP_INFO_ITEM_ANCESTOR(nodes[0])
     if anc:
         log.debug("[nutrition] container fallback via Energy* classes")
         return anc[0]
-    anc = nodes[0].xpath("ancestor::div[contains(@class,'DetailProdPageAccordion')][1]")
+    anc = sel.XP_ACCORDION_ANCESTOR(nodes[0])
     if anc:
         log.debug("[nutrition] container fallback via Accordion ancestor")
         return anc[0]
     return None
 
 def _parse_price(doc: html.HtmlElement) -> Optional[float]:
-    p = first_text(doc, "//*[@itemprop='price']/@content")
+    p = first_text(doc, sel.XP_PRICE_META)
     if p:
         return num(p)
-    p2 = first_text(doc, "//*[contains(@class,'js-datalayer-catalog-list-price') and contains(@class,'hidden')]")
+    p2 = first_text(doc, sel.XP_PRICE_HIDDEN)
     return num(p2)
 
-def _parse_weight(doc: html.HtmlElement) -> Optional[float]:
+def _parse_weight(doc: html.HtmlElement, info: InfoIndex) -> Optional[float]:
     w = (
-        first_text(doc, "//*[contains(@class,'ProductCard_weight') or contains(@class,'ProductCard__weight')]")
-        or _info_value(doc, "Вес/объем")
+        first_text(doc, sel.XP_WEIGHT)
+        or info.value("Вес/объем")
     )
     g = grams(w)
     if g is not None:
         return g
 
-    per_kg = doc.xpath(
-        "boolean(//*[contains(@class,'Currency') or contains(@class,'Price') or contains(@class,'Product_price')]"
-        "[contains(., '/кг') or contains(., '/ кг')])"
-    )
-    if per_kg:
+    if sel.XP_PRICE_PER_KG(doc):
         return 1000.0
 
     return None
 
 
-def _parse_description(doc: html.HtmlElement) -> Optional[str]:
-    d = first_text(doc, "//*[@itemprop='description']/@content") or first_text(doc, "//*[@itemprop='description']")
-    return d or _info_value(doc, "Описание")
+def _parse_description(doc: html.HtmlElement, info: InfoIndex) -> Optional[str]:
+    d = first_text(doc, sel.XP_DESCRIPTION_META) or first_text(doc, sel.XP_DESCRIPTION)
+    return d or info.value("Описание")
 
 
 
@@ -121,11 +141,11 @@ _NUTRIENT_KEYS = {
 
 def _assign_nutrient(bucket: dict, key_text: str, val_text: str) -> None:
     lt = key_text.lower()
-    for frag, field in _NUTRIENT_KEYS.items():
+    for frag, nutrient in _NUTRIENT_KEYS.items():
         if frag in lt:
             v = num(val_text)
             if v is not None:
-                bucket[field] = v
+                bucket[nutrient] = v
             return
 
 
@@ -133,8 +153,8 @@ def _num_near(blob: str, key_frag: str) -> Optional[float]:
     """
     Ищет число рядом с ключом как в варианте 'жиры ... 6', так и '6 ... жиры'.
     """
-    m = (re.search(fr"{key_frag}\w*\D*([\d.,]+)", blob, re.I) or
-         re.search(fr"([\d.,]+)\D*{key_frag}\w*", blob, re.I))
+    after, before = sel.num_near_patterns(key_frag)
+    m = after.search(blob) or before.search(blob)
     return num(m.group(1)) if m else None
 
 def _parse_nutrition_from_text(container: html.HtmlElement) -> dict:
@@ -154,8 +174,7 @@ def _parse_nutrition_from_text(container: html.HtmlElement) -> dict:
         bucket["carbs"] = v
 
     # ккал чаще идёт как "<число> ккал", оставим как было
-    m_kcal = (re.search(r"([\d.,]+)\s*ккал", blob, re.I) or
-              re.search(r"энергетичес\w*.*?([\d.,]+)\s*ккал", blob, re.I))
+    m_kcal = sel.RX_KCAL.search(blob) or sel.RX_KCAL_ENERGY.search(blob)
     if m_kcal:
         bucket["kcal"] = num(m_kcal.group(1))
 
@@ -163,77 +182,118 @@ def _parse_nutrition_from_text(container: html.HtmlElement) -> dict:
     return bucket
 
 
-def _parse_nutrition_from_blocks(container: html.HtmlElement) -> dict:
+@dataclass
+class _NutritionNodes:
+    """Узлы контейнера КБЖУ, разложенные по видам за один обход поддерева."""
+    pairs: List[Tuple[Optional[html.HtmlElement], Optional[html.HtmlElement]]] = field(default_factory=list)
+    descs: List[html.HtmlElement] = field(default_factory=list)
+    values: List[html.HtmlElement] = field(default_factory=list)
+    trs: List[html.HtmlElement] = field(default_factory=list)
+    rows: List[html.HtmlElement] = field(default_factory=list)
+
+
+def _scan_nutrition(container: html.HtmlElement) -> _NutritionNodes:
+    """
+    Один проход по потомкам контейнера вместо четырёх XPath-сканов. Порядок внутри каждого
+    списка документный, как у прежних './/...' запросов. Для каждого EnergyItem берутся
+    первые вложенные EnergyDesc и EnergyValue.
+    """
+    nodes = _NutritionNodes()
+    items: Dict[html.HtmlElement, List[Optional[html.HtmlElement]]] = {}
+    for el in container.iterdescendants():
+        tag = el.tag
+        if not isinstance(tag, str):  # комментарии и processing instructions
+            continue
+        cls = el.get("class") or ""
+        is_desc = "EnergyDesc" in cls
+        is_value = "EnergyValue" in cls
+        if tag == "div" and "EnergyItem" in cls:
+            items[el] = [None, None]
+        if is_desc:
+            nodes.descs.append(el)
+        if is_value:
+            nodes.values.append(el)
+        if (is_desc or is_value) and items:
+            slot = 0 if is_desc else 1
+            for anc in el.iterancestors():
+                if anc is container:
+                    break
+                pair = items.get(anc)
+                if pair is not None and pair[slot] is None:
+                    pair[slot] = el
+        if tag == "tr":
+            nodes.trs.append(el)
+        elif tag in ("li", "p") or (tag == "div" and ("Row" in cls or "Item" in cls or "line" in cls)):
+            nodes.rows.append(el)
+    nodes.pairs = [(k, v) for k, v in items.values()]
+    return nodes
+
+
+def _parse_nutrition_from_blocks(nodes: _NutritionNodes) -> dict:
     bucket: dict = {}
 
-    items = container.xpath(".//div[contains(@class,'EnergyItem')]")
-    log.debug(f"[nutrition][blocks] EnergyItem count={len(items)}")
-    for it in items:
-        key = it.xpath(".//*[contains(@class,'EnergyDesc')]")
-        val = it.xpath(".//*[contains(@class,'EnergyValue')]")
-        if key and val:
-            ks, vs = as_text(key[0]), as_text(val[0])
+    log.debug(f"[nutrition][blocks] EnergyItem count={len(nodes.pairs)}")
+    for key, val in nodes.pairs:
+        if key is not None and val is not None:
+            ks, vs = as_text(key), as_text(val)
             _assign_nutrient(bucket, ks, vs)
             log.debug(f"[nutrition][blocks] pair '{ks}' = '{vs}'")
 
     if len(bucket) < 4:
-        values = container.xpath(".//*[contains(@class,'EnergyValue')]")
-        descs  = container.xpath(".//*[contains(@class,'EnergyDesc')]")
-        log.debug(f"[nutrition][blocks] EnergyDesc={len(descs)} EnergyValue={len(values)} (loose)")
-        for key_node, val_node in zip(descs, values):
-            ks, vs = as_text(key_node), as_text(val_node)
-            _assign_nutrient(bucket, ks, vs)
+        log.debug(f"[nutrition][blocks] EnergyDesc={len(nodes.descs)} EnergyValue={len(nodes.values)} (loose)")
+        for key_node, val_node in zip(nodes.descs, nodes.values):
+            _assign_nutrient(bucket, as_text(key_node), as_text(val_node))
 
     if len(bucket) < 4:
-        trs = container.xpath(".//tr")
-        log.debug(f"[nutrition][blocks] table rows={len(trs)}")
-        for tr in trs:
-            cells = tr.xpath("./th|./td")
+        log.debug(f"[nutrition][blocks] table rows={len(nodes.trs)}")
+        for tr in nodes.trs:
+            cells = [c for c in tr if c.tag in ("th", "td")]
             if len(cells) >= 2:
                 _assign_nutrient(bucket, as_text(cells[0]), as_text(cells[-1]))
 
     if len(bucket) < 4:
-        rows = container.xpath(".//li | .//p | .//div[contains(@class,'Row') or contains(@class,'Item') or contains(@class,'line')]")
-        log.debug(f"[nutrition][blocks] rows={len(rows)}")
-        for n in rows:
+        log.debug(f"[nutrition][blocks] rows={len(nodes.rows)}")
+        for n in nodes.rows:
             text = as_text(n)
             if ":" in text:
                 k, v = text.split(":", 1)
                 _assign_nutrient(bucket, k, v)
             else:
-                for frag, field in _NUTRIENT_KEYS.items():
+                for frag, nutrient in _NUTRIENT_KEYS.items():
                     if frag in text.lower():
-                        m = re.search(r"([-+]?\d+(?:[.,]\d+)?)", text)
+                        m = sel.RX_NUMBER_GROUP.search(text)
                         if m:
-                            bucket[field] = float(m.group(1).replace(",", "."))
+                            bucket[nutrient] = float(m.group(1).replace(",", "."))
                         break
 
     log.debug(f"[nutrition][blocks] parsed={bucket}")
     return bucket
 
+_NUTRIENT_FIELDS = ("proteins", "fats", "carbs", "kcal")
+
 def _merge_pref(primary: dict, fallback: dict) -> dict:
     """
     primary имеет приоритет над fallback.
     """
-    keys = ("proteins", "fats", "carbs", "kcal")
-    merged = {k: (primary.get(k) if primary.get(k) is not None else fallback.get(k)) for k in keys}
+    merged = {k: (primary.get(k) if primary.get(k) is not None else fallback.get(k)) for k in _NUTRIENT_FIELDS}
     log.debug(f"[nutrition] merged={merged} (primary={primary}, fallback={fallback})")
     return merged
 
 
-def _parse_nutrition(doc: html.HtmlElement) -> Tuple[Optional[float], Optional[float], Optional[float], Optional[float]]:
-    container = _info_elem(doc, "Пищевая") or _info_elem(doc, "Пищевая и энергетическая")
+def _parse_nutrition(doc: html.HtmlElement, info: InfoIndex) -> Tuple[Optional[float], Optional[float], Optional[float], Optional[float]]:
+    container = info.elem("Пищевая")
     if container is None:
         container = _fallback_energy_container(doc)
     if container is None:
-        titles = [as_text(h) for h in doc.xpath("//div[contains(@class,'VV23_DetailProdPageInfoDescItem')]//h4")]
-        log.debug(f"[nutrition] container NOT found; titles={titles[:6]}")
+        log.debug(f"[nutrition] container NOT found; titles={info.titles[:6]}")
         return None, None, None, None
 
-    from_blocks = _parse_nutrition_from_blocks(container)
-    from_text = _parse_nutrition_from_text(container)
-
-    merged = _merge_pref(from_blocks, from_text)
+    from_blocks = _parse_nutrition_from_blocks(_scan_nutrition(container))
+    if all(from_blocks.get(k) is not None for k in _NUTRIENT_FIELDS):
+        # текстовый разбор ничего не добавит: в слиянии блоки всё равно приоритетнее
+        merged = from_blocks
+    else:
+        merged = _merge_pref(from_blocks, _parse_nutrition_from_text(container))
 
     return (
         merged.get("proteins"),
@@ -244,15 +304,15 @@ def _parse_nutrition(doc: html.HtmlElement) -> Tuple[Optional[float], Optional[f
 
 
 
-def _parse_shelf_and_storage(doc: html.HtmlElement) -> Tuple[Optional[float], Optional[float], Optional[float]]:
-    days = shelf_days(_info_value(doc, "Годен"))
-    tmin, tmax = temps(_info_value(doc, "Условия хранения"))
+def _parse_shelf_and_storage(info: InfoIndex) -> Tuple[Optional[float], Optional[float], Optional[float]]:
+    days = shelf_days(info.value("Годен"))
+    tmin, tmax = temps(info.value("Условия хранения"))
     return days, tmin, tmax
 
 
 def _parse_categories(doc: html.HtmlElement) -> Tuple[Optional[str], Optional[str]]:
-    cat_main = first_text(doc, "//*[@id='log_section_name']/@value")
-    path_raw = first_text(doc, "//*[contains(@class,'js-datalayer-catalog-list-category') and contains(@class,'hidden')]")
+    cat_main = first_text(doc, sel.XP_SECTION_NAME)
+    path_raw = first_text(doc, sel.XP_CATEGORY_PATH)
     if path_raw:
         path = " / ".join([p.strip() for p in path_raw.split("//") if p.strip()])
     else:
@@ -260,72 +320,97 @@ def _parse_categories(doc: html.HtmlElement) -> Tuple[Optional[str], Optional[st
     return (cat_main.strip() if cat_main else None, path.strip() if path else None)
 
 
-def _parse_brand_country_manufacturer(doc: html.HtmlElement) -> Tuple[Optional[str], Optional[str], Optional[str]]:
-    brand = first_text(doc, "//*[@itemprop='brand']//*[@itemprop='name']/text()")
-    country = _info_value(doc, "Страна производства")
-    manuf = _info_value(doc, "Изготовитель") or _info_value(doc, "Производитель")
+def _parse_brand_country_manufacturer(doc: html.HtmlElement, info: InfoIndex) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+    brand = first_text(doc, sel.XP_BRAND)
+    country = info.value("Страна производства")
+    manuf = info.value("Изготовитель") or info.value("Производитель")
     return brand, country, manuf
 
-def _parse_ingredients(doc: html.HtmlElement) -> Optional[str]:
+def _parse_ingredients(info: InfoIndex) -> Optional[str]:
     for title in ("Состав", "Ингредиенты", "Состав продукта"):
-        v = _info_value(doc, title)
+        v = info.value(title)
         if v:
             return v
     return None
 
 
 def _parse_rating(doc: html.HtmlElement) -> Tuple[Optional[float], Optional[int]]:
-    r = first_text(doc, "//*[@itemprop='aggregateRating']//*[@itemprop='ratingValue']/@content")
-    c = first_text(doc, "//*[@itemprop='aggregateRating']//*[@itemprop='reviewCount']/@content")
+    r = first_text(doc, sel.XP_RATING_VALUE)
+    c = first_text(doc, sel.XP_RATING_COUNT)
     return num(r), int(num(c)) if c and num(c) is not None else None
 
 
 def _first_image_url(doc: html.HtmlElement) -> Optional[str]:
-    for xp in [
-        "//img[contains(@src,'img.vkusvill.ru')][contains(@src,'.webp')]/@src",
-        "//img[contains(@src,'img.vkusvill.ru')]/@src",
-    ]:
+    for xp in sel.XP_IMAGES:
         u = first_text(doc, xp)
         if u:
             return u
     return None
 
 
-def _download_image(doc: html.HtmlElement, page_url: str) -> Optional[str]:
+def _enqueue_image(doc: html.HtmlElement, page_url: str) -> Optional[str]:
+    """Картинку качает фоновая стадия IMAGES, здесь только ставим её в очередь."""
     img_url = _first_image_url(doc)
     if not img_url:
         return None
-    r = get_response(img_url)
+    return IMAGES.submit(slug_from_page_url(page_url), img_url)
+
+
+def local_image_path(page_url: str) -> Optional[str]:
+    """Путь к уже скачанной картинке товара, если она есть на диске."""
+    path = IMAGES.find_local(slug_from_page_url(page_url))
+    return rel_repo_path(path) if path is not None else None
 
-    slug = slug_from_page_url(page_url)
-    fname = f"{slug}.jpg"
-    path = CONFIG_PATHS.pics_dir / fname
 
-    path.write_bytes(r.content)
-    log.debug(f"Saved image -> {path}")
+def parse_product(url: str, need_image: bool = True, archive: Optional["PageArchive"] = None) -> Product:
+    r = get_response(url)
+    if archive is not None:
+        archive.append(url, r.text)
+    with FIELD_PROFILER.timed("html_parse"):
+        doc = html.fromstring(r.text)
+    return parse_product_doc(doc, url, need_image=need_image)
 
-    return rel_repo_path(path)
 
+def parse_product_html(page_html: str, url: str) -> Product:
+    """Разбор сохранённой страницы без сети: картинка не качается, берётся уже лежащая на диске."""
+    with FIELD_PROFILER.timed("html_parse"):
+        doc = html.fromstring(page_html)
+    p = parse_product_doc(doc, url, need_image=False)
+    p.image_path = local_image_path(url)
+    return p
 
 
-def parse_product(url: str, need_image: bool = True) -> Product:
-    doc = fetch_html(url)
+def parse_product_doc(doc: html.HtmlElement, url: str, need_image: bool = True) -> Product:
+    prof = FIELD_PROFILER
+    with prof.timed("name"):
+        name = first_text(doc, sel.XP_NAME)
 
-    name = first_text(doc, "//h1[contains(@class,'Product__title')]")
+    with prof.timed("info_index"):
+        info = InfoIndex(doc)
 
-    price = _parse_price(doc)
-    weight = _parse_weight(doc)
-    prot, fat, carb, kcal = _parse_nutrition(doc)
+    with prof.timed("price"):
+        price = _parse_price(doc)
+    with prof.timed("weight"):
+        weight = _parse_weight(doc, info)
+    with prof.timed("nutrition"):
+        prot, fat, carb, kcal = _parse_nutrition(doc, info)
     if not any([prot, fat, carb, kcal]):
         log.debug(f"[nutrition] EMPTY for {url} -> will remain None in dataset")
 
-    shelf, tmin, tmax = _parse_shelf_and_storage(doc)
-    cat_main, cat_path = _parse_categories(doc)
-    brand, country, manuf = _parse_brand_country_manufacturer(doc)
-    rating, rating_cnt = _parse_rating(doc)
-    ingredients = _parse_ingredients(doc)
-    desc = _parse_description(doc)
-    image_path = _download_image(doc, url) if need_image else None
+    with prof.timed("shelf_storage"):
+        shelf, tmin, tmax = _parse_shelf_and_storage(info)
+    with prof.timed("categories"):
+        cat_main, cat_path = _parse_categories(doc)
+    with prof.timed("brand_country"):
+        brand, country, manuf = _parse_brand_country_manufacturer(doc, info)
+    with prof.timed("rating"):
+        rating, rating_cnt = _parse_rating(doc)
+    with prof.timed("ingredients"):
+        ingredients = _parse_ingredients(info)
+    with prof.timed("description"):
+        desc = _parse_description(doc, info)
+    with prof.timed("image"):
+        image_path = _enqueue_image(doc, url) if need_image else None
 
     return Product(
         url=url,
@@ -0,0 +1,67 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Tuple
+
+log = logging.getLogger(__name__)
+
+
+class FieldProfiler:
+    """
+    Суммарное время и число вызовов по экстракторам полей товара (--profile-fields).
+    Выключен по умолчанию, тогда timed() почти ничего не стоит. Время - perf_counter внутри
+    потока: при нескольких воркерах в него попадает и ожидание GIL.
+    """
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self._calls: Dict[str, int] = {}
+        self._total: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def timed(self, name: str) -> Iterator[None]:
+        if not self.enabled:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, 1, time.perf_counter() - started)
+
+    def add(self, name: str, calls: int, seconds: float) -> None:
+        with self._lock:
+            self._calls[name] = self._calls.get(name, 0) + calls
+            self._total[name] = self._total.get(name, 0.0) + seconds
+
+    def snapshot(self) -> Dict[str, Tuple[int, float]]:
+        with self._lock:
+            return {k: (self._calls[k], self._total[k]) for k in self._calls}
+
+    def merge(self, snapshot: Dict[str, Tuple[int, float]]) -> None:
+        """Добавить замеры, собранные в другом процессе (reparse)."""
+        for name, (calls, seconds) in snapshot.items():
+            self.add(name, calls, seconds)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._calls.clear()
+            self._total.clear()
+
+    def log_report(self, logger: Optional[logging.Logger] = None) -> None:
+        lg = logger or log
+        snap = self.snapshot()
+        if not snap:
+            return
+        grand = sum(total for _, total in snap.values()) or 1e-9
+        lg.info("Field extractor timings (sorted by total time):")
+        for name, (calls, total) in sorted(snap.items(), key=lambda kv: kv[1][1], reverse=True):
+            lg.info(
+                "field=%-16s calls=%6d total=%8.3fs mean=%7.3fms share=%5.1f%%",
+                name, calls, total, total / calls * 1000, total / grand * 100,
+            )
+
+
+FIELD_PROFILER = FieldProfiler()
@@ -0,0 +1,81 @@
+"""
+Все XPath и регулярные выражения парсера в одном месте.
+
+XPath компилируются в etree.XPath один раз при импорте, а не разбираются заново на каждой
+странице через doc.xpath(str). Регулярки - re.compile. Новые селекторы добавляем сюда.
+"""
+import re
+from typing import Dict, Pattern, Tuple
+
+from lxml import etree
+
+INFO_ITEM_CLASS = "VV23_DetailProdPageInfoDescItem"
+INFO_DESC_CLASS = "VV23_DetailProdPageInfoDescItem__Desc"
+
+# --- общие ---
+XP_TEXT = etree.XPath(".//text()")
+
+# --- ссылки на странице категории ---
+XP_LINKS = etree.XPath("//a[@href]")
+XP_HREFS = etree.XPath("//a/@href")
+
+# --- страница товара ---
+XP_NAME = etree.XPath("//h1[contains(@class,'Product__title')]")
+XP_PRICE_META = etree.XPath("//*[@itemprop='price']/@content")
+XP_PRICE_HIDDEN = etree.XPath(
+    "//*[contains(@class,'js-datalayer-catalog-list-price') and contains(@class,'hidden')]"
+)
+XP_WEIGHT = etree.XPath("//*[contains(@class,'ProductCard_weight') or contains(@class,'ProductCard__weight')]")
+XP_PRICE_PER_KG = etree.XPath(
+    "boolean(//*[contains(@class,'Currency') or contains(@class,'Price') or contains(@class,'Product_price')]"
+    "[contains(., '/кг') or contains(., '/ кг')])"
+)
+XP_DESCRIPTION_META = etree.XPath("//*[@itemprop='description']/@content")
+XP_DESCRIPTION = etree.XPath("//*[@itemprop='description']")
+XP_INFO_ITEMS = etree.XPath(f"//div[contains(@class,'{INFO_ITEM_CLASS}')]")
+XP_ENERGY_NODES = etree.XPath(
+    "//*[contains(@class,'EnergyDesc') or contains(@class,'EnergyValue') or contains(@class,'EnergyItem')]"
+)
+XP_INFO_ITEM_ANCESTOR = etree.XPath(f"ancestor::div[contains(@class,'{INFO_ITEM_CLASS}')][1]")
+XP_ACCORDION_ANCESTOR = etree.XPath("ancestor::div[contains(@class,'DetailProdPageAccordion')][1]")
+XP_SECTION_NAME = etree.XPath("//*[@id='log_section_name']/@value")
+XP_CATEGORY_PATH = etree.XPath(
+    "//*[contains(@class,'js-datalayer-catalog-list-category') and contains(@class,'hidden')]"
+)
+XP_BRAND = etree.XPath("//*[@itemprop='brand']//*[@itemprop='name']/text()")
+XP_RATING_VALUE = etree.XPath("//*[@itemprop='aggregateRating']//*[@itemprop='ratingValue']/@content")
+XP_RATING_COUNT = etree.XPath("//*[@itemprop='aggregateRating']//*[@itemprop='reviewCount']/@content")
+XP_IMAGES = (
+    etree.XPath("//img[contains(@src,'img.vkusvill.ru')][contains(@src,'.webp')]/@src"),
+    etree.XPath("//img[contains(@src,'img.vkusvill.ru')]/@src"),
+)
+
+# --- регулярки ---
+RX_WS = re.compile(r"\s+")
+RX_NUMBER = re.compile(r"[-+]?\d+(?:[.,]\d+)?")
+RX_NUMBER_GROUP = re.compile(r"([-+]?\d+(?:[.,]\d+)?)")
+RX_GRAMS = re.compile(r"(\d+(?:\.\d+)?)\s*(кг|г|гр|мл|л)\b")
+RX_PIECES = re.compile(r"\bшт\.?\b")
+RX_IMAGE_EXT = re.compile(r"\.(?:jpe?g|png|webp|gif|avif)$", re.I)
+RX_PRODUCT_HREF = re.compile(r"/goods/[^/]+-\d+\.html$")
+RX_PAGEN = re.compile(r"[?&]PAGEN_1=(\d+)")
+RX_KCAL = re.compile(r"([\d.,]+)\s*ккал", re.I)
+RX_KCAL_ENERGY = re.compile(r"энергетичес\w*.*?([\d.,]+)\s*ккал", re.I)
+
+
+def _near(key_frag: str) -> Tuple[Pattern, Pattern]:
+    """Число после ключа ('жиры ... 6') и число перед ключом ('6 ... жиры')."""
+    return (
+        re.compile(fr"{key_frag}\w*\D*([\d.,]+)", re.I),
+        re.compile(fr"([\d.,]+)\D*{key_frag}\w*", re.I),
+    )
+
+
+RX_NUM_NEAR: Dict[str, Tuple[Pattern, Pattern]] = {k: _near(k) for k in ("белк", "жир", "углевод")}
+
+
+def num_near_patterns(key_frag: str) -> Tuple[Pattern, Pattern]:
+    pats = RX_NUM_NEAR.get(key_frag)
+    if pats is None:
+        pats = RX_NUM_NEAR[key_frag] = _near(key_frag)
+    return pats
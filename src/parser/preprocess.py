@@ -1,10 +1,14 @@
 from __future__ import annotations
 
-import re
-from typing import List
+import argparse
+import json
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, List, Tuple
 
 import numpy as np
 import pandas as pd
+from manufacturer import extract_batch
 from settings.constants import CATEGORICAL_COLUMNS, NUMERIC_COLUMNS
 from settings.runtime import CONFIG_PATHS
 from settings.logging_setup import configure_root_logger, get_logger
@@ -18,20 +22,13 @@ DROP: List[str] = [
     "image_path",
 ]
 
-ORG_RE = re.compile(r"\b(ООО|АО|ПАО|ЗАО|ОАО|ИП)\b\s*[«\"]?\s*([A-Za-zА-Яа-я0-9\s\-\._]+)", re.I | re.U)
+MISSING = {"", "None", "nan"}
+OHE_COLUMNS: List[str] = [c for c in CATEGORICAL_COLUMNS + ["manufacturer_name"] if c != TARGET]
 
 
-def extract_manufacturer_name(raw: str | None) -> str:
-    if not raw or str(raw).strip() in {"", "None", "nan"}:
-        return "unknown"
-    s = str(raw).replace("„", "«").replace("“", "»").replace(":", " ")
-    m = ORG_RE.search(s)
-    if not m:
-        return "unknown"
-    name = (m.group(1) + " " + m.group(2)).strip()
-    name = name.replace('"', "").replace("«", "").replace("»", "")
-    name = re.sub(r"\s{2,}", " ", name)
-    return name if name else "unknown"
+def extract_manufacturer_names(raw: pd.Series) -> pd.Series:
+    """manufacturer.extract_manufacturer_name для целой колонки: каждая уникальная строка разбирается один раз."""
+    return pd.Series(extract_batch(raw, "org"), index=raw.index, dtype=object)
 
 
 def select_model_columns(df: pd.DataFrame) -> pd.DataFrame:
@@ -42,66 +39,204 @@ def select_model_columns(df: pd.DataFrame) -> pd.DataFrame:
     return df[cols]
 
 
-def count_ratings(df: pd.DataFrame) -> None:
-    rc = df.get("ratings_count")
-    if rc is not None:
-        no_reviews = rc.isna() | (rc == 0)
-        df["ratings_count"] = rc.fillna(0.0)
-    else:
-        no_reviews = pd.Series(False, index=df.index)
-
-    if "rating" in df.columns:
-        df.loc[no_reviews, "rating"] = df.loc[no_reviews, "rating"].fillna(0.0)
-        med_rating = df.loc[~no_reviews, "rating"].median(skipna=True)
-        df.loc[~no_reviews, "rating"] = df.loc[~no_reviews, "rating"].fillna(0.0 if np.isnan(med_rating) else med_rating)
-
-def preprocess(df: pd.DataFrame) -> pd.DataFrame:
-    df[TARGET] = df[TARGET].astype(str).replace({"", "None", "nan"}, "unknown")
-    
+def _clean(df: pd.DataFrame) -> pd.DataFrame:
+    """Шаги без обучаемых параметров: типы, пропуски в категориях, имя производителя."""
+    df = df.copy()
+    df[TARGET] = df[TARGET].astype(str).replace(MISSING, "unknown")
     for c in NUMERIC_COLUMNS:
         df[c] = pd.to_numeric(df[c], errors="coerce")
-
-    count_ratings(df)
-
-    for c in [x for x in NUMERIC_COLUMNS if x not in ("rating", "ratings_count")]:
-        med = df[c].median(skipna=True)
-        df[c] = df[c].fillna(0.0 if np.isnan(med) else med)
+    df["ratings_count"] = df["ratings_count"].fillna(0.0)
+    if "manufacturer" in df.columns:
+        df["manufacturer_name"] = extract_manufacturer_names(df["manufacturer"])
+    else:
+        df["manufacturer_name"] = "unknown"
+    for c in OHE_COLUMNS:
+        if c in df.columns:
+            df[c] = df[c].replace(MISSING, "unknown").fillna("unknown")
+    return df
 
 
-    df["manufacturer_name"] = df.get("manufacturer", "").apply(extract_manufacturer_name)
-    df["manufacturer_name"] = df["manufacturer_name"].replace({"", "None", "nan"}, "unknown").fillna("unknown")
+@dataclass
+class ProductPreprocessor:
+    """
+    Предобработка с запоминаемыми параметрами: медианы для пропусков, min/max для нормировки
+    и словари one-hot. fit() считает их на обучающих данных, transform() применяет к любым
+    новым строкам без переобучения; незнакомые категории дают нулевую строку one-hot.
+    Параметры сохраняются в небольшой JSON (save/load).
+    """
+    medians: Dict[str, float] = field(default_factory=dict)
+    rating_median: float = 0.0                    # по товарам с отзывами
+    ranges: Dict[str, Tuple[float, float]] = field(default_factory=dict)
+    vocab: Dict[str, List[str]] = field(default_factory=dict)
+    min_count: int = 1                            # реже встречающиеся значения -> колонка {col}_other
+
+    def fit(self, df: pd.DataFrame) -> "ProductPreprocessor":
+        df = _clean(df)
+        no_reviews = df["ratings_count"] == 0
+        med = df.loc[~no_reviews, "rating"].median(skipna=True)
+        self.rating_median = 0.0 if np.isnan(med) else float(med)
+        self.medians = {}
+        for c in NUMERIC_COLUMNS:
+            if c in ("rating", "ratings_count"):
+                continue
+            med = df[c].median(skipna=True)
+            self.medians[c] = 0.0 if np.isnan(med) else float(med)
+        df = self._impute(df)
+        self.ranges = {c: (float(df[c].min()), float(df[c].max())) for c in NUMERIC_COLUMNS}
+        self.vocab = {}
+        for c in OHE_COLUMNS:
+            if c in df.columns:
+                vc = df[c].value_counts()
+                self.vocab[c] = sorted(vc[vc >= self.min_count].index.tolist())
+        return self
+
+    def _impute(self, df: pd.DataFrame) -> pd.DataFrame:
+        no_reviews = df["ratings_count"] == 0
+        df["rating"] = df["rating"].fillna(pd.Series(np.where(no_reviews, 0.0, self.rating_median), index=df.index))
+        for c, med in self.medians.items():
+            df[c] = df[c].fillna(med)
+        return df
+
+    def _scaled(self, df: pd.DataFrame) -> pd.DataFrame:
+        if not self.ranges:
+            raise RuntimeError("ProductPreprocessor is not fitted")
+        df = self._impute(_clean(df))
+        for c, (vmin, vmax) in self.ranges.items():
+            df[c] = 0.0 if vmax == vmin else (df[c] - vmin) / (vmax - vmin)
+        return df
+
+    def _codes(self, df: pd.DataFrame, c: str) -> np.ndarray:
+        """Номер значения в словаре; -1 - редкое или незнакомое."""
+        return pd.Categorical(df[c], categories=self.vocab[c]).codes
+
+    def ohe_names(self, c: str) -> List[str]:
+        names = [f"{c}_{v}" for v in self.vocab[c]]
+        return names + [f"{c}_other"] if self.min_count > 1 else names
+
+    def feature_names(self) -> List[str]:
+        """Колонки transform_sparse: числовые, затем one-hot по словарям."""
+        names = list(NUMERIC_COLUMNS)
+        for c in self.vocab:
+            names.extend(self.ohe_names(c))
+        return names
+
+    def transform(self, df: pd.DataFrame) -> pd.DataFrame:
+        df = self._scaled(df)
+        dummies = []
+        for c, values in self.vocab.items():
+            d = pd.get_dummies(pd.Categorical(df[c], categories=values), prefix=c).set_axis(df.index)
+            if self.min_count > 1:
+                d[f"{c}_other"] = self._codes(df, c) < 0
+            dummies.append(d)
+        df = df.drop(columns=DROP + list(self.vocab), errors="ignore")
+        df = pd.concat([df, *dummies], axis=1)
+        return select_model_columns(df)
+
+    def transform_sparse(self, df: pd.DataFrame):
+        """
+        То же, что transform, но признаки - scipy.sparse CSR (числовые колонки + one-hot),
+        целевая колонка отдельно. Возвращает (X, имена колонок, y).
+        """
+        import scipy.sparse as sp
+
+        df = self._scaled(df)
+        blocks = [sp.csr_matrix(df[NUMERIC_COLUMNS].to_numpy(dtype=float))]
+        n = len(df)
+        for c in self.vocab:
+            codes = self._codes(df, c)
+            k = len(self.ohe_names(c))
+            if self.min_count > 1:
+                codes = np.where(codes < 0, k - 1, codes)
+            rows = np.flatnonzero(codes >= 0)
+            blocks.append(sp.csr_matrix(
+                (np.ones(len(rows)), (rows, codes[rows])), shape=(n, k)
+            ))
+        return sp.hstack(blocks, format="csr"), self.feature_names(), df[TARGET].to_numpy()
+
+    def fit_transform(self, df: pd.DataFrame) -> pd.DataFrame:
+        return self.fit(df).transform(df)
+
+    def save(self, path: Path) -> None:
+        path.write_text(json.dumps(asdict(self), ensure_ascii=False, indent=1), encoding="utf-8")
+
+    @classmethod
+    def from_dict(cls, d: Dict) -> "ProductPreprocessor":
+        d = dict(d)
+        d["ranges"] = {k: tuple(v) for k, v in d["ranges"].items()}
+        return cls(**d)
+
+    @classmethod
+    def load(cls, path: Path) -> "ProductPreprocessor":
+        return cls.from_dict(json.loads(path.read_text(encoding="utf-8")))
 
-    cat_cols = [c for c in (CATEGORICAL_COLUMNS + ["manufacturer_name"]) if c in df.columns]
-    for c in cat_cols:
-        if c == TARGET:
-            continue
-        df[c] = df[c].replace({"", "None", "nan"}, "unknown").fillna("unknown")
 
-    df = df.drop(columns=DROP, errors="ignore")
+def preprocess(df: pd.DataFrame) -> pd.DataFrame:
+    return ProductPreprocessor().fit_transform(df)
 
-    ohe_cols = [c for c in cat_cols if c != TARGET and c in df.columns]
-    df = pd.get_dummies(df, columns=ohe_cols, dummy_na=False)
 
-    for c in NUMERIC_COLUMNS:
-        if c in df.columns:
-            vmin, vmax = df[c].min(), df[c].max()
-            df[c] = 0.0 if vmax == vmin else (df[c] - vmin) / (vmax - vmin)
+def load_raw() -> pd.DataFrame:
+    """
+    Типизированный Parquet-датасет (main.py --parquet), если в него посеян весь data.tsv
+    (to-parquet или первый --parquet-запуск), иначе data.tsv как строки. Партиции одних
+    --parquet-запусков без посева содержат только их строки - по ним читать нельзя.
+    """
+    # storage.parquet_store.is_seeded без импорта модуля: он тянет pyarrow, а для data.tsv тот не нужен
+    if (CONFIG_PATHS.dataset_dir / "_seeded.json").exists():
+        from storage.parquet_store import read_latest_frame
 
-    df = select_model_columns(df)
-    return df
+        return read_latest_frame(CONFIG_PATHS.dataset_dir)
+    return pd.read_csv(CONFIG_PATHS.tsv_path, sep="\t", dtype=str, keep_default_na=False)
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Preprocess data.tsv for the models")
+    parser.add_argument("--apply", type=Path, default=None,
+                        help="Не обучать заново: применить сохранённые параметры к этому TSV")
+    parser.add_argument("--out", type=Path, default=None, help="Куда писать CSV (по умолчанию data/data.csv)")
+    parser.add_argument("--min-count", type=int, default=1,
+                        help="Значения категорий реже этого порога уходят в общую колонку {col}_other")
+    parser.add_argument("--features", action="store_true",
+                        help="Заново собрать матрицу data/features (X.bin для np.memmap), в которую main.py --features дописывает новые товары")
+    parser.add_argument("--sparse", action="store_true",
+                        help="Вместо CSV сохранить признаки в scipy.sparse .npz (+ .columns.json с именами и целевой)")
+    args = parser.parse_args()
+
     configure_root_logger()
     log = get_logger(__name__)
+    out = args.out or CONFIG_PATHS.csv_path
 
-    df_raw = pd.read_csv(CONFIG_PATHS.tsv_path, sep="\t", dtype=str, keep_default_na=False)
-    n0 = len(df_raw)
-
-    df = preprocess(df_raw)
-    df.to_csv(CONFIG_PATHS.csv_path, index=False, encoding="utf-8")
-
-    log.info(f"Saved {CONFIG_PATHS.csv_path} rows={n0} -> shape={df.shape}")
+    if args.apply is not None:
+        pp = ProductPreprocessor.load(CONFIG_PATHS.preprocess_path)
+        df_raw = pd.read_csv(args.apply, sep="\t", dtype=str, keep_default_na=False)
+    else:
+        df_raw = load_raw()
+        pp = ProductPreprocessor(min_count=args.min_count).fit(df_raw)
+        pp.save(CONFIG_PATHS.preprocess_path)
+        log.info(f"Saved preprocess params -> {CONFIG_PATHS.preprocess_path}")
+
+    if args.features:
+        from storage.feature_store import FeatureSink
+
+        with FeatureSink(CONFIG_PATHS.features_dir, pp, rebuild=True) as sink:
+            for row in df_raw.to_dict("records"):
+                sink.write(row)
+        log.info(f"Built feature matrix {CONFIG_PATHS.features_dir}: {sink.n_rows} x {len(sink.columns)}")
+        return
+
+    if args.sparse:
+        import scipy.sparse as sp
+
+        X, names, y = pp.transform_sparse(df_raw)
+        out = out.with_suffix(".npz")
+        sp.save_npz(out, X)
+        meta = {"columns": names, "target": TARGET, "y": y.tolist()}
+        out.with_suffix(".columns.json").write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+        log.info(f"Saved {out} rows={len(df_raw)} -> shape={X.shape} nnz={X.nnz}")
+        return
+
+    df = pp.transform(df_raw)
+    df.to_csv(out, index=False, encoding="utf-8")
+    log.info(f"Saved {out} rows={len(df_raw)} -> shape={df.shape}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,376 @@
+from __future__ import annotations
+
+import argparse
+import json
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import asdict, dataclass, field, is_dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+from preprocess import ProductPreprocessor
+from settings.constants import COLUMNS
+from settings.runtime import CONFIG_PATHS
+from settings.logging_setup import configure_root_logger, get_logger
+
+log = get_logger(__name__)
+
+INTERCEPT = "intercept"     # колонка из единиц, как from_df_to_X_y(intercept=True) в models.ipynb
+ID_COLUMNS = ("url", "name")
+BATCH_SIZE = 4096
+MAX_BATCH = 512             # HTTP: строк в одной микропачке...
+MAX_WAIT_MS = 10.0          # ...и сколько ждать, пока пачка наберётся
+
+
+@dataclass
+class ScoringModel:
+    """
+    Сохранённая модель «топ 15% по рейтингу»: линейная (theta из best_gd.json / models.ipynb)
+    или sklearn-оценщик (joblib рядом). columns - имена признаков в порядке theta, по ним
+    строки любого источника приводятся к матрице. label = 1, если score >= threshold.
+    preprocess - параметры ProductPreprocessor (asdict), которыми получена обучающая матрица;
+    хранятся в самом файле модели, а не ссылкой на preprocess.json, который могут переобучить.
+    Без них сырые строки (data.tsv, parse_product) оценивать нельзя.
+    """
+    columns: List[str]
+    theta: Optional[List[float]] = None
+    estimator_path: Optional[str] = None
+    kind: str = "clf"                           # для sklearn: "reg" | "clf", как в compare_models.ipynb
+    threshold: float = 0.0
+    preprocess: Optional[Dict[str, Any]] = None
+    meta: Dict[str, Any] = field(default_factory=dict)
+
+    def save(self, path: Path) -> None:
+        path.write_text(json.dumps(asdict(self), ensure_ascii=False, indent=1), encoding="utf-8")
+
+    @classmethod
+    def load(cls, path: Path) -> "ScoringModel":
+        d = json.loads(path.read_text(encoding="utf-8"))
+        if isinstance(d.get("preprocess"), str):
+            raise ValueError(f"{path} refers to preprocess params by path ({d['preprocess']}), export it again")
+        return cls(**d)
+
+    def attach_preprocess(self, pp: ProductPreprocessor) -> None:
+        """
+        Привязать параметры предобработки. Проверяется, что модель учили именно на их выходе:
+        набор признаков модели (без intercept) должен совпасть с pp.feature_names(). Матрица
+        из preprocessing.ipynb (robust scaling, другой one-hot) этой проверки не проходит.
+        """
+        wanted = [c for c in self.columns if c != INTERCEPT]
+        produced = set(pp.feature_names())
+        missing = [c for c in wanted if c not in produced]
+        extra = produced.difference(wanted)
+        if missing or extra:
+            raise ValueError(
+                f"model was not trained on this preprocess output: {len(missing)} of {len(wanted)} model "
+                f"column(s) are not produced ({missing[:5]}), {len(extra)} produced column(s) are unused"
+            )
+        self.preprocess = asdict(pp)
+
+    @classmethod
+    def from_best_gd(cls, path: Path, loss: str, columns_from: Optional[Path] = None) -> "ScoringModel":
+        """
+        Модель из best_gd.json. Если там нет имён колонок (файл от старого прогона), они берутся
+        из заголовка TSV, на котором учили (без score), с intercept первым.
+        """
+        entry = json.loads(path.read_text(encoding="utf-8"))[loss]
+        columns = entry.get("columns")
+        if columns is None:
+            if columns_from is None:
+                raise ValueError(f"{path} has no feature names, pass --columns-from")
+            header = pd.read_csv(columns_from, sep="\t", nrows=0).columns
+            columns = [INTERCEPT] + [c for c in header if c != "score"]
+        if len(columns) != len(entry["theta"]):
+            raise ValueError(f"{len(columns)} columns for {len(entry['theta'])} weights in {path}")
+        return cls(columns=list(columns), theta=entry["theta"], meta={"loss": loss, **entry["best_params"]})
+
+class Scorer:
+    """Векторный скоринг: пачка строк -> матрица признаков -> одно X @ theta (или predict)."""
+
+    def __init__(self, model: ScoringModel, base_dir: Optional[Path] = None):
+        self.model = model
+        base = base_dir or Path(".")
+        self.theta = None if model.theta is None else np.asarray(model.theta, dtype=float)
+        self.estimator = None
+        if model.estimator_path is not None:
+            import joblib
+
+            self.estimator = joblib.load(base / model.estimator_path)
+        self.pp = ProductPreprocessor.from_dict(model.preprocess) if model.preprocess else None
+
+    def features(self, df: pd.DataFrame, raw: bool) -> np.ndarray:
+        """raw=True - строки как в data.tsv, сначала проходят ProductPreprocessor.transform."""
+        if raw:
+            if self.pp is None:
+                raise ValueError("model has no preprocess params, raw rows can't be scored")
+            df = self.pp.transform(df.reindex(columns=COLUMNS))
+        wanted = [c for c in self.model.columns if c != INTERCEPT]
+        missing = [c for c in wanted if c not in df.columns]
+        if missing:
+            # нулями их не заполняем: оценки были бы правдоподобными и неверными
+            raise ValueError(f"{len(missing)} of {len(wanted)} model column(s) absent in input: {missing[:5]}")
+        X = df.reindex(columns=self.model.columns, fill_value=0).to_numpy(dtype=float)
+        if INTERCEPT in self.model.columns:
+            X[:, self.model.columns.index(INTERCEPT)] = 1.0
+        return X
+
+    def scores(self, X: np.ndarray) -> np.ndarray:
+        if self.theta is not None:
+            return X @ self.theta
+        est = self.estimator
+        if self.model.kind == "reg":
+            return est.predict(X)
+        if hasattr(est, "predict_proba"):
+            return est.predict_proba(X)[:, 1]
+        if hasattr(est, "decision_function"):
+            s = est.decision_function(X)
+            return s if s.ndim == 1 else s[:, 1]
+        return np.where(est.predict(X) == 1, 1.0, -1.0)
+
+    def score_frame(self, df: pd.DataFrame, raw: bool) -> pd.DataFrame:
+        s = self.scores(self.features(df, raw))
+        out = df[[c for c in ID_COLUMNS if c in df.columns]].copy()
+        out["score"] = s
+        out["label"] = np.where(s >= self.model.threshold, 1, -1)
+        return out.reset_index(drop=True)
+
+    def score_rows(self, rows: List[Dict[str, Any]], raw: bool = True) -> pd.DataFrame:
+        return self.score_frame(pd.DataFrame(rows), raw)
+
+    def score_stream(self, rows: Iterable[Any], raw: bool = True, batch_size: int = BATCH_SIZE) -> Iterator[pd.DataFrame]:
+        """Поток строк (dict или Product) -> оценённые пачки по batch_size."""
+        batch: List[Dict[str, Any]] = []
+        for r in rows:
+            batch.append(asdict(r) if is_dataclass(r) else r)
+            if len(batch) >= batch_size:
+                yield self.score_rows(batch, raw)
+                batch = []
+        if batch:
+            yield self.score_rows(batch, raw)
+
+
+def score_tsv(scorer: Scorer, path: Path, raw: bool, batch_size: int = BATCH_SIZE) -> Iterator[pd.DataFrame]:
+    read_kwargs: Dict[str, Any] = {"sep": "\t", "chunksize": batch_size}
+    if raw:
+        read_kwargs.update(dtype=str, keep_default_na=False)
+    for chunk in pd.read_csv(path, **read_kwargs):
+        yield scorer.score_frame(chunk, raw)
+
+
+def parsed_products(urls: Iterable[str]) -> Iterator[Any]:
+    from parsers.product import parse_product
+
+    for url in urls:
+        try:
+            yield parse_product(url, need_image=False)
+        except Exception:
+            log.exception(f"Failed to parse: {url}")
+
+
+# --- HTTP ---
+
+class MicroBatcher:
+    """
+    Запросы из потоков HTTP-сервера складываются в общую очередь; один поток забирает
+    до max_batch строк (ждёт не дольше max_wait_ms после первой) и оценивает их одним
+    вызовом Scorer - тысячи одиночных запросов дают одно умножение на пачку.
+    """
+
+    def __init__(self, scorer: Scorer, max_batch: int = MAX_BATCH, max_wait_ms: float = MAX_WAIT_MS):
+        self.scorer = scorer
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.batches = 0
+        self._queue: "queue.Queue[tuple]" = queue.Queue()
+        threading.Thread(target=self._run, name="scoring-batcher", daemon=True).start()
+
+    def submit(self, rows: List[Dict[str, Any]], raw: bool) -> "Future[pd.DataFrame]":
+        if not isinstance(rows, list):
+            raise TypeError(f"rows must be a list, got {type(rows).__name__}")
+        fut: "Future[pd.DataFrame]" = Future()
+        self._queue.put((rows, raw, fut))
+        return fut
+
+    def _run(self) -> None:
+        while True:
+            pending = [self._queue.get()]
+            try:
+                self._collect(pending)
+                for raw in (True, False):
+                    group = [p for p in pending if p[1] is raw]
+                    if group:
+                        self._score(group, raw)
+            except Exception as e:
+                # поток пачек не должен умирать: ошибка уходит в ещё не выполненные запросы
+                log.exception("[scoring] micro-batch failed")
+                for _, _, fut in pending:
+                    if not fut.done():
+                        fut.set_exception(e)
+
+    def _collect(self, pending: List[tuple]) -> None:
+        n = len(pending[0][0])
+        deadline = time.monotonic() + self.max_wait
+        while n < self.max_batch:
+            try:
+                item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            pending.append(item)
+            n += len(item[0])
+
+    def _score(self, group: List[tuple], raw: bool) -> None:
+        rows = [r for rs, _, _ in group for r in rs]
+        try:
+            scored = self.scorer.score_rows(rows, raw) if rows else pd.DataFrame()
+        except Exception:
+            if len(group) == 1:
+                raise
+            # плохие строки одного клиента не должны ронять чужие запросы: оцениваем по запросу
+            for item in group:
+                self._score_one(item, raw)
+            return
+        self.batches += 1
+        start = 0
+        for rs, _, fut in group:
+            fut.set_result(scored.iloc[start:start + len(rs)])
+            start += len(rs)
+
+    def _score_one(self, item: tuple, raw: bool) -> None:
+        rows, _, fut = item
+        try:
+            fut.set_result(self.scorer.score_rows(rows, raw) if rows else pd.DataFrame())
+        except Exception as e:
+            fut.set_exception(e)
+
+
+def _request_rows(req: Any) -> List[Dict[str, Any]]:
+    """{"rows": [{...}, ...]} или одна строка {...}; иначе ValueError -> 400."""
+    if not isinstance(req, dict):
+        raise ValueError("body must be a JSON object")
+    rows = req["rows"] if "rows" in req else [req]
+    if not isinstance(rows, list) or not all(isinstance(r, dict) for r in rows):
+        raise ValueError("rows must be a list of objects")
+    return rows
+
+
+def make_handler(batcher: MicroBatcher):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, fmt: str, *args: Any) -> None:
+            log.debug(fmt % args)
+
+        def _reply(self, status: int, payload: Any) -> None:
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self) -> None:
+            if self.path != "/score":
+                self._reply(404, {"error": "not found"})
+                return
+            try:
+                req = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                rows = _request_rows(req)
+                raw = req.get("raw", True)
+                if not isinstance(raw, bool):
+                    raise ValueError("raw must be true or false")
+            except Exception as e:
+                self._reply(400, {"error": str(e)})
+                return
+            try:
+                scored = batcher.submit(rows, raw).result(timeout=60)
+            except Exception as e:
+                self._reply(422, {"error": str(e)})
+                return
+            self._reply(200, {"results": json.loads(scored.to_json(orient="records", force_ascii=False))})
+
+    return Handler
+
+
+def serve(scorer: Scorer, host: str, port: int, max_batch: int, max_wait_ms: float) -> None:
+    batcher = MicroBatcher(scorer, max_batch=max_batch, max_wait_ms=max_wait_ms)
+    server = ThreadingHTTPServer((host, port), make_handler(batcher))
+    log.info(f"Scoring on http://{host}:{port}/score (max_batch={max_batch}, max_wait_ms={max_wait_ms})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        log.info(f"Served {batcher.batches} batch(es)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score products with a saved top-15% model")
+    parser.add_argument("--model", type=Path, default=CONFIG_PATHS.data_dir / "scoring_model.json")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    ex = sub.add_parser("export-gd", help="Собрать модель из best_gd.json (models.ipynb)")
+    ex.add_argument("--best-gd", type=Path, required=True)
+    ex.add_argument("--loss", default="logistic")
+    ex.add_argument("--columns-from", type=Path, default=None,
+                    help="TSV, на котором учили (имена колонок), если их нет в best_gd.json")
+    ex.add_argument("--threshold", type=float, default=0.0)
+    ex.add_argument("--preprocess", type=Path, default=None,
+                    help="preprocess.json, на выходе которого учили модель: сохраняется в модель, чтобы оценивать сырые строки")
+
+    sc = sub.add_parser("score", help="Оценить TSV или страницы товаров пачками")
+    src = sc.add_mutually_exclusive_group(required=True)
+    src.add_argument("--input", type=Path, help="Уже предобработанный TSV (например data_zero_rating.tsv)")
+    src.add_argument("--crawl", action="store_true", help="Сырые строки data.tsv (нужен preprocess в модели)")
+    src.add_argument("--urls", type=Path, help="Файл со ссылками: страницы парсятся parse_product и сразу оцениваются")
+    sc.add_argument("--out", type=Path, default=None, help="Куда писать TSV с оценками (по умолчанию stdout)")
+    sc.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+
+    sv = sub.add_parser("serve", help="Локальный HTTP: POST /score {\"rows\": [...], \"raw\": true}")
+    sv.add_argument("--host", default="127.0.0.1")
+    sv.add_argument("--port", type=int, default=8765)
+    sv.add_argument("--max-batch", type=int, default=MAX_BATCH)
+    sv.add_argument("--max-wait-ms", type=float, default=MAX_WAIT_MS)
+    args = parser.parse_args()
+
+    configure_root_logger()
+    if args.command == "export-gd":
+        model = ScoringModel.from_best_gd(args.best_gd, args.loss, args.columns_from)
+        model.threshold = args.threshold
+        if args.preprocess is not None:
+            model.attach_preprocess(ProductPreprocessor.load(args.preprocess))
+        model.save(args.model)
+        log.info(f"Saved {args.loss} model ({len(model.columns)} columns) -> {args.model}")
+        return
+
+    scorer = Scorer(ScoringModel.load(args.model), base_dir=args.model.parent)
+    if args.command == "serve":
+        serve(scorer, args.host, args.port, args.max_batch, args.max_wait_ms)
+        return
+
+    if args.input is not None:
+        batches = score_tsv(scorer, args.input, raw=False, batch_size=args.batch_size)
+    elif args.crawl:
+        batches = score_tsv(scorer, CONFIG_PATHS.tsv_path, raw=True, batch_size=args.batch_size)
+    else:
+        urls = [u.strip() for u in args.urls.read_text(encoding="utf-8").splitlines() if u.strip()]
+        batches = scorer.score_stream(parsed_products(urls), raw=True, batch_size=args.batch_size)
+
+    out = args.out.open("w", encoding="utf-8", newline="") if args.out else None
+    n = 0
+    try:
+        for i, batch in enumerate(batches):
+            batch.to_csv(out or sys.stdout, sep="\t", index=False, header=i == 0)
+            n += len(batch)
+    finally:
+        if out is not None:
+            out.close()
+    log.info(f"Scored {n} row(s)")
+
+
+if __name__ == "__main__":
+    main()
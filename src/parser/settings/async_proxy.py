@@ -0,0 +1,243 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Collection, Dict, List, Mapping, Optional, Set, Tuple
+from urllib.parse import urlparse
+
+import aiohttp
+from aiohttp_socks import ProxyConnector
+
+from settings.proxy import (
+    ALLOW_DIRECT_FALLBACK,
+    FIRST_ATTEMPT_CONNECT_TIMEOUT,
+    MAX_ATTEMPTS,
+    RATE_BURST,
+    RATE_PER_SEC,
+    READ_TIMEOUT,
+    RETRY_CONNECT_TIMEOUT,
+    START_JITTER_MS_RANGE,
+    UA_POOL,
+    _build_headers,
+    _load_proxies_from_config,
+    _mask_proxy_for_logs,
+    _rand_ms,
+    mask_url_for_logs,
+    record_outcome,
+)
+from settings.ratelimit import TokenBucketLimiter
+from settings.scheduler import HealthScheduler
+
+log = logging.getLogger(__name__)
+
+MAX_IN_FLIGHT = 256          # сколько запросов одновременно держим в полёте на весь клиент
+CONN_LIMIT_PER_ENDPOINT = 64 # размер пула соединений одного endpoint
+
+
+@dataclass
+class AsyncResponse:
+    """
+    Минимальный аналог requests.Response: тело читается целиком внутри клиента,
+    чтобы соединение сразу вернулось в пул.
+    """
+    url: str
+    status_code: int
+    headers: Mapping[str, str]  # регистронезависимые, как у requests
+    content: bytes
+    encoding: Optional[str] = None
+
+    @property
+    def text(self) -> str:
+        return self.content.decode(self.encoding or "utf-8", errors="replace")
+
+
+@dataclass
+class AsyncEndpoint:
+    name: str
+    proxy_url: Optional[str]
+    headers: Dict[str, str]
+    session: Optional[aiohttp.ClientSession] = None
+    request_proxy: Optional[str] = field(default=None, repr=False)
+
+
+def _build_connector(proxy_url: Optional[str]) -> Tuple[aiohttp.BaseConnector, Optional[str]]:
+    """
+    SOCKS-прокси работают через коннектор aiohttp_socks, HTTP-прокси передаются в каждый запрос.
+    Возвращает (коннектор, proxy для запроса).
+    """
+    if proxy_url and proxy_url.startswith("socks"):
+        scheme, rest = proxy_url.split("://", 1)
+        rdns = scheme.endswith("h")
+        url = f"{scheme.rstrip('h')}://{rest}"
+        return ProxyConnector.from_url(url, rdns=rdns, limit=CONN_LIMIT_PER_ENDPOINT), None
+    return aiohttp.TCPConnector(limit=CONN_LIMIT_PER_ENDPOINT), proxy_url
+
+
+class AsyncHttpClient:
+    """
+    asyncio-версия MinimalHttpClient с тем же поведением: ротация endpoint, таймауты
+    подключения по попыткам, UA из пула, маскировка в логах и прямой выход как запасной.
+    Семафор и сессии принадлежат одному event loop, поэтому клиент работает только внутри
+    `async with client:` - там они создаются и там же закрываются; следующий asyncio.run
+    открывает клиент заново в своём loop.
+    """
+
+    def __init__(
+        self,
+        proxy_urls: List[str],
+        allow_direct: bool = ALLOW_DIRECT_FALLBACK,
+        rate: float = RATE_PER_SEC,
+        burst: float = RATE_BURST,
+    ):
+        self.endpoints: List[AsyncEndpoint] = []
+        for i, purl in enumerate(proxy_urls):
+            ua = UA_POOL[i % len(UA_POOL)]
+            self.endpoints.append(AsyncEndpoint(
+                name=_mask_proxy_for_logs(purl),
+                proxy_url=purl,
+                headers=_build_headers(ua),
+            ))
+        if allow_direct:
+            ua = UA_POOL[len(self.endpoints) % len(UA_POOL)]
+            self.endpoints.append(AsyncEndpoint(
+                name="DIRECT",
+                proxy_url=None,
+                headers=_build_headers(ua),
+            ))
+
+        self.scheduler = HealthScheduler([e.name for e in self.endpoints])
+        self.limiter = TokenBucketLimiter(rate=rate, burst=burst)
+        self._allow_direct = allow_direct
+        self._in_flight: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        log.info(
+            "AsyncHttpClient: endpoints=%d allow_direct=%s names=%s",
+            len(self.endpoints), self._allow_direct, [e.name for e in self.endpoints]
+        )
+
+    def _pick(self, host: str, tried: Collection[int] = ()) -> Optional[Tuple[int, AsyncEndpoint]]:
+        delays = [self.limiter.peek((ep.name, host)) for ep in self.endpoints]
+        i = self.scheduler.pick(delays=delays, exclude=tried)
+        if i is None:
+            return None
+        return i, self.endpoints[i]
+
+    def stats(self) -> List[Dict[str, Any]]:
+        return self.scheduler.snapshot()
+
+    def log_stats(self) -> None:
+        self.scheduler.log_snapshot(log)
+
+    async def __aenter__(self) -> "AsyncHttpClient":
+        loop = asyncio.get_running_loop()
+        if self._loop is not None:
+            raise RuntimeError("AsyncHttpClient is already open" + (" in another event loop" if self._loop is not loop else ""))
+        self._loop = loop
+        self._in_flight = asyncio.Semaphore(MAX_IN_FLIGHT)
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        await self.aclose()
+
+    def _session(self, ep: AsyncEndpoint) -> aiohttp.ClientSession:
+        if ep.session is None or ep.session.closed:
+            connector, ep.request_proxy = _build_connector(ep.proxy_url)
+            ep.session = aiohttp.ClientSession(connector=connector, headers=ep.headers)
+        return ep.session
+
+    async def http_get(
+        self,
+        url: str,
+        referer: Optional[str] = None,
+        max_attempts: int = MAX_ATTEMPTS,
+        extra_headers: Optional[Mapping[str, str]] = None,
+    ) -> AsyncResponse:
+        if not self.endpoints:
+            raise RuntimeError("Proxy pool is empty (no endpoints).")
+        if self._loop is not asyncio.get_running_loop() or self._in_flight is None:
+            raise RuntimeError("AsyncHttpClient is not open in this event loop, use `async with client:`")
+
+        masked_url = mask_url_for_logs(url)
+        host = urlparse(url).netloc
+        last_exc: Optional[Exception] = None
+        tried: Set[int] = set()
+
+        for attempt in range(1, max_attempts + 1):
+            picked = self._pick(host, tried)
+            if picked is None:
+                break
+            i, ep = picked
+            tried.add(i)
+
+            headers = dict(ep.headers)
+            if referer:
+                headers["Referer"] = referer
+            if extra_headers:
+                headers.update(extra_headers)
+
+            connect_timeout = FIRST_ATTEMPT_CONNECT_TIMEOUT if attempt == 1 else RETRY_CONNECT_TIMEOUT
+            timeout = aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=READ_TIMEOUT)
+
+            prewait = self.limiter.reserve((ep.name, host))
+            jitter = _rand_ms(*START_JITTER_MS_RANGE)
+            await asyncio.sleep(prewait + jitter)
+
+            started = time.monotonic()
+            try:
+                log.debug(
+                    "GET attempt=%d via=%s url=%s timeout=%ss/%ss prewait_ms=%d jitter_ms=%d",
+                    attempt, ep.name, masked_url, connect_timeout, READ_TIMEOUT,
+                    int(prewait * 1000), int(jitter * 1000)
+                )
+                session = self._session(ep)
+                async with self._in_flight:
+                    async with session.get(
+                        url, headers=headers, proxy=ep.request_proxy,
+                        timeout=timeout, allow_redirects=True
+                    ) as resp:
+                        body = await resp.read()
+                        log.info(
+                            "OK attempt=%d via=%s status=%d size=%d url=%s",
+                            attempt, ep.name, resp.status, len(body), masked_url
+                        )
+                        record_outcome(
+                            self.scheduler, self.limiter, i, (ep.name, host),
+                            resp.status, resp.headers, time.monotonic() - started,
+                        )
+                        resp.raise_for_status()
+                        return AsyncResponse(
+                            url=str(resp.url),
+                            status_code=resp.status,
+                            headers=resp.headers.copy(),
+                            content=body,
+                            encoding=resp.charset,
+                        )
+            except Exception as e:
+                last_exc = e
+                if not isinstance(e, aiohttp.ClientResponseError):
+                    self.scheduler.record_failure(i)
+                log.warning(
+                    "FAIL attempt=%d via=%s exc=%s: %s url=%s",
+                    attempt, ep.name, type(e).__name__, str(e), masked_url
+                )
+                continue
+
+        if last_exc:
+            raise last_exc
+        raise RuntimeError("All attempts exhausted and no response returned.")
+
+    async def aclose(self) -> None:
+        try:
+            for ep in self.endpoints:
+                if ep.session is not None and not ep.session.closed:
+                    await ep.session.close()
+        finally:
+            for ep in self.endpoints:
+                ep.session = None
+            self._in_flight = None
+            self._loop = None
+
+
+ASYNC_CLIENT = AsyncHttpClient(_load_proxies_from_config(), allow_direct=ALLOW_DIRECT_FALLBACK)
@@ -8,12 +8,19 @@ class ConfigPaths:
     base_dir: Path
     data_dir: Path
     pics_dir: Path
+    http_cache_dir: Path
+    archive_dir: Path
+    dataset_dir: Path
+    features_dir: Path
     logs_root_dir: Path
     run_log_dir: Path
     tsv_path: Path
+    history_path: Path
+    queue_path: Path
     arff_path: Path
     json_path: Path
     csv_path: Path
+    preprocess_path: Path
     proxies_file: Path
     tsv_path_save_moment: Path
 
@@ -27,12 +34,19 @@ class ConfigPaths:
             base_dir=base,
             data_dir=data,
             pics_dir=data / "pics",
+            http_cache_dir=data / "http_cache",
+            archive_dir=data / "archive",
+            dataset_dir=data / "dataset",
+            features_dir=data / "features",
             logs_root_dir=logs_root,
             run_log_dir=run_log_dir,
             tsv_path=data / "data.tsv",
+            history_path=data / "history.sqlite",
+            queue_path=data / "crawl_queue.sqlite",
             arff_path=data / "data.arff",
             json_path=data / "data.json",
             csv_path=data / "data.csv",
+            preprocess_path=data / "preprocess.json",
             proxies_file=data / "proxies.txt",
             tsv_path_save_moment = data / "data_save_moment.tsv",
         )
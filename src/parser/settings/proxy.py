@@ -7,13 +7,16 @@ import os
 import random
 import time
 from dataclasses import dataclass
-from typing import Dict, List, Optional, Tuple
+from typing import Any, Collection, Dict, List, Mapping, Optional, Set, Tuple
 from urllib.parse import urlparse
 
 import requests
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
+from settings.ratelimit import TokenBucketLimiter, parse_retry_after
+from settings.scheduler import HealthScheduler
+
 log = logging.getLogger(__name__)
 
 FIRST_ATTEMPT_CONNECT_TIMEOUT = 12   # сек на 1-й попытке (длиннее)
@@ -24,7 +27,10 @@ ALLOW_DIRECT_FALLBACK = True         # можно выключить, если 
 
 START_JITTER_MS_RANGE: Tuple[int, int] = (20, 80)  # мс
 
-PRE_REQUEST_SLEEP_RANGE_SEC: Tuple[float, float] = (2, 4) # сек
+# Token bucket на пару (endpoint, host): в среднем тот же темп, что давала прежняя пауза 2-4 с,
+# но простоявший endpoint отправляет сразу, а не ждёт вслепую.
+RATE_PER_SEC: float = 1 / 3.0        # запросов в секунду на (endpoint, host)
+RATE_BURST: float = 2                # сколько запросов подряд можно после простоя
 
 UA_POOL: List[str] = [
     "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36",
@@ -62,6 +68,7 @@ def _build_session() -> requests.Session:
         status_forcelist=[429, 500, 502, 503, 504],
         allowed_methods=frozenset({"GET"}),
         respect_retry_after_header=True,
+        raise_on_status=False,  # последний 429/5xx отдаём наружу, чтобы планировщик видел статус
     )
     adapter = HTTPAdapter(max_retries=retry, pool_connections=40, pool_maxsize=40)
     s.mount("https://", adapter)
@@ -97,8 +104,43 @@ class Endpoint:
     session: requests.Session
     headers: Dict[str, str]
 
+
+def is_endpoint_fault(status: int) -> bool:
+    """429 и 5xx считаем проблемой endpoint (бан/перегрузка), прочие статусы - проблемой URL."""
+    return status == 429 or status >= 500
+
+
+def record_outcome(
+    scheduler: HealthScheduler,
+    limiter: TokenBucketLimiter,
+    i: int,
+    key: Tuple[str, str],
+    status: int,
+    headers: Mapping[str, str],
+    elapsed: float,
+) -> None:
+    """Отдаёт результат попытки планировщику и, если сервер прислал Retry-After, лимитеру."""
+    if not is_endpoint_fault(status):
+        scheduler.record_success(i, elapsed)
+        return
+    cooldown = scheduler.record_failure(i, status)
+    retry_after = parse_retry_after(headers.get("Retry-After"))
+    if retry_after is not None:
+        limiter.block(key, retry_after)
+    log.debug(
+        "Endpoint %s -> cooldown %.1fs (status=%d retry_after=%s)",
+        key[0], cooldown, status, retry_after,
+    )
+
+
 class MinimalHttpClient:
-    def __init__(self, proxy_urls: List[str], allow_direct: bool = ALLOW_DIRECT_FALLBACK):
+    def __init__(
+        self,
+        proxy_urls: List[str],
+        allow_direct: bool = ALLOW_DIRECT_FALLBACK,
+        rate: float = RATE_PER_SEC,
+        burst: float = RATE_BURST,
+    ):
         self.endpoints: List[Endpoint] = []
         for i, purl in enumerate(proxy_urls):
             ua = UA_POOL[i % len(UA_POOL)]
@@ -123,51 +165,70 @@ class MinimalHttpClient:
             direct.session.headers.update(direct.headers)
             self.endpoints.append(direct)
 
-        self._i = 0
+        self.scheduler = HealthScheduler([e.name for e in self.endpoints])
+        self.limiter = TokenBucketLimiter(rate=rate, burst=burst)
         self._allow_direct = allow_direct
         log.info(
             "MinimalHttpClient: endpoints=%d allow_direct=%s names=%s",
             len(self.endpoints), self._allow_direct, [e.name for e in self.endpoints]
         )
 
-    def _pick(self) -> Optional[Endpoint]:
-        if not self.endpoints:
+    def _pick(self, host: str, tried: Collection[int] = ()) -> Optional[Tuple[int, Endpoint]]:
+        delays = [self.limiter.peek((ep.name, host)) for ep in self.endpoints]
+        i = self.scheduler.pick(delays=delays, exclude=tried)
+        if i is None:
             return None
-        ep = self.endpoints[self._i % len(self.endpoints)]
-        self._i += 1
-        return ep
+        return i, self.endpoints[i]
+
+    def _record(self, i: int, host: str, status: int, headers: Mapping[str, str], elapsed: float) -> None:
+        record_outcome(self.scheduler, self.limiter, i, (self.endpoints[i].name, host), status, headers, elapsed)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """Здоровье endpoint: EWMA задержки, доля успехов, счётчики 429/5xx, остаток cooldown."""
+        return self.scheduler.snapshot()
+
+    def log_stats(self) -> None:
+        self.scheduler.log_snapshot(log)
 
     def http_get(
         self,
         url: str,
         referer: Optional[str] = None,
         max_attempts: int = MAX_ATTEMPTS,
+        extra_headers: Optional[Mapping[str, str]] = None,
     ) -> requests.Response:
         if not self.endpoints:
             raise RuntimeError("Proxy pool is empty (no endpoints).")
 
         masked_url = mask_url_for_logs(url)
+        host = urlparse(url).netloc
         last_exc: Optional[Exception] = None
+        tried: Set[int] = set()
 
         for attempt in range(1, max_attempts + 1):
-            ep = self._pick()
-            if ep is None:
+            picked = self._pick(host, tried)
+            if picked is None:
                 break
+            i, ep = picked
+            tried.add(i)
 
             headers = dict(ep.headers)
             if referer:
                 headers["Referer"] = referer
+            if extra_headers:
+                headers.update(extra_headers)
 
             proxies = {"http": ep.proxy_url, "https": ep.proxy_url} if ep.proxy_url else None
             connect_timeout = FIRST_ATTEMPT_CONNECT_TIMEOUT if attempt == 1 else RETRY_CONNECT_TIMEOUT
             timeout: Tuple[int, int] = (connect_timeout, READ_TIMEOUT)
 
-            prewait = random.uniform(*PRE_REQUEST_SLEEP_RANGE_SEC)
+            prewait = self.limiter.reserve((ep.name, host))
             time.sleep(prewait)
 
             jitter = _rand_ms(*START_JITTER_MS_RANGE)
             time.sleep(jitter)
 
+            started = time.monotonic()
             try:
                 log.debug(
                     "GET attempt=%d via=%s url=%s timeout=%ss/%ss prewait_ms=%d jitter_ms=%d",
@@ -183,10 +244,13 @@ class MinimalHttpClient:
                     "OK attempt=%d via=%s status=%d size=%d url=%s",
                     attempt, ep.name, resp.status_code, size, masked_url
                 )
+                self._record(i, host, resp.status_code, resp.headers, time.monotonic() - started)
                 resp.raise_for_status()
                 return resp
             except Exception as e:
                 last_exc = e
+                if not isinstance(e, requests.HTTPError):
+                    self.scheduler.record_failure(i)
                 log.warning(
                     "FAIL attempt=%d via=%s exc=%s: %s url=%s",
                     attempt, ep.name, type(e).__name__, str(e), masked_url
@@ -200,7 +264,7 @@ class MinimalHttpClient:
 
 def _load_proxies_from_config() -> List[str]:
     try:
-        from DS.settings.runtime import CONFIG_PATHS
+        from settings.runtime import CONFIG_PATHS
     except Exception:
         log.warning("CONFIG_PATHS not available; returning empty proxy list")
         return []
@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, Hashable, Optional
+
+
+@dataclass
+class _Bucket:
+    tokens: float
+    updated: float  # monotonic-время последнего пересчёта; при Retry-After может быть в будущем
+
+
+class TokenBucketLimiter:
+    """
+    Token bucket на каждый ключ (например, (endpoint, host)).
+    reserve() сразу списывает токен и возвращает, сколько ждать до отправки, поэтому один
+    и тот же лимитер подходит и для потоков (time.sleep), и для asyncio (asyncio.sleep).
+    Простоявший без дела ключ накапливает до burst токенов и отправляет без ожидания.
+    """
+
+    def __init__(self, rate: float, burst: float):
+        if rate <= 0:
+            raise ValueError(f"rate must be positive, got {rate}")
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self._buckets: Dict[Hashable, _Bucket] = {}
+        self._lock = threading.Lock()
+
+    def _refill(self, key: Hashable, now: float) -> _Bucket:
+        b = self._buckets.get(key)
+        if b is None:
+            b = self._buckets[key] = _Bucket(tokens=self.burst, updated=now)
+        elif now > b.updated:
+            b.tokens = min(self.burst, b.tokens + (now - b.updated) * self.rate)
+            b.updated = now
+        return b
+
+    def _wait(self, b: _Bucket, tokens: float, now: float) -> float:
+        ready_at = b.updated + max(0.0, -tokens) / self.rate
+        return max(0.0, ready_at - now)
+
+    def reserve(self, key: Hashable) -> float:
+        with self._lock:
+            now = time.monotonic()
+            b = self._refill(key, now)
+            b.tokens -= 1.0
+            return self._wait(b, b.tokens, now)
+
+    def peek(self, key: Hashable) -> float:
+        """Сколько пришлось бы ждать, если бы reserve() вызвали сейчас (токен не списывается)."""
+        with self._lock:
+            now = time.monotonic()
+            b = self._refill(key, now)
+            return self._wait(b, b.tokens - 1.0, now)
+
+    def block(self, key: Hashable, seconds: float) -> None:
+        """Retry-After: ключ молчит seconds секунд, после чего снова разгоняется с одного токена."""
+        if seconds <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            b = self._refill(key, now)
+            until = now + seconds
+            if until > b.updated:
+                b.updated = until
+                b.tokens = min(b.tokens, 1.0)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After бывает числом секунд или HTTP-датой."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        dt = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return max(0.0, (dt - datetime.now(timezone.utc)).total_seconds())
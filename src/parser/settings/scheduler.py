@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Collection, Dict, List, Optional, Sequence
+
+log = logging.getLogger(__name__)
+
+EWMA_ALPHA: float = 0.3            # вес нового замера в EWMA задержки
+COOLDOWN_BASE_SEC: float = 5.0     # первая пауза после неудачи
+COOLDOWN_MAX_SEC: float = 300.0    # потолок экспоненциального backoff
+MIN_SUCCESS_RATE: float = 0.05     # чтобы не делить на ноль у совсем плохих endpoint
+
+
+@dataclass
+class EndpointHealth:
+    name: str
+    latency_ewma: Optional[float] = None  # сек
+    successes: int = 0
+    failures: int = 0
+    throttled: int = 0                    # ответы 429
+    server_errors: int = 0                # ответы 5xx
+    consecutive_failures: int = 0
+    cooldown_until: float = 0.0           # monotonic-время
+    in_flight: int = 0
+
+    @property
+    def success_rate(self) -> float:
+        # сглаживание Лапласа: новый endpoint стартует с 0.5, а не с 0 или 1
+        return (self.successes + 1) / (self.successes + self.failures + 2)
+
+    def on_cooldown(self, now: float) -> bool:
+        return self.cooldown_until > now
+
+    def as_dict(self, now: Optional[float] = None) -> Dict[str, Any]:
+        now = time.monotonic() if now is None else now
+        d = asdict(self)
+        d["success_rate"] = round(self.success_rate, 3)
+        d["cooldown_left_sec"] = round(max(0.0, self.cooldown_until - now), 1)
+        del d["cooldown_until"]
+        return d
+
+
+class HealthScheduler:
+    """
+    Выбирает endpoint с наименьшей ожидаемой стоимостью запроса:
+    (EWMA задержки + ожидание своего слота) * (1 + запросы в полёте) / доля успехов.
+    Endpoint после неудачи уходит в cooldown с экспоненциальным backoff.
+    Ещё не опробованные endpoint выбираются первыми.
+    """
+
+    def __init__(self, names: Sequence[str]):
+        self.health: List[EndpointHealth] = [EndpointHealth(name=n) for n in names]
+        self._lock = threading.Lock()
+
+    def _cost(self, h: EndpointHealth, delay: float) -> float:
+        if h.latency_ewma is None:
+            return delay
+        rate = max(h.success_rate, MIN_SUCCESS_RATE)
+        return (h.latency_ewma + delay) * (1 + h.in_flight) / rate
+
+    def pick(
+        self,
+        delays: Optional[Sequence[float]] = None,
+        exclude: Collection[int] = (),
+    ) -> Optional[int]:
+        """
+        delays - сколько каждому endpoint ещё ждать своего слота (сек).
+        exclude - уже опробованные в этом запросе endpoint; игнорируются, если других нет.
+        """
+        if not self.health:
+            return None
+        with self._lock:
+            now = time.monotonic()
+            idx = range(len(self.health))
+            candidates = [i for i in idx if i not in exclude] or list(idx)
+            healthy = [i for i in candidates if not self.health[i].on_cooldown(now)]
+            if healthy:
+                best = min(healthy, key=lambda i: self._cost(self.health[i], delays[i] if delays else 0.0))
+            else:
+                # все в cooldown - берём того, кто освободится раньше, а не стоим
+                best = min(candidates, key=lambda i: self.health[i].cooldown_until)
+            self.health[best].in_flight += 1
+            return best
+
+    def record_success(self, i: int, latency: float) -> None:
+        with self._lock:
+            h = self.health[i]
+            h.in_flight = max(0, h.in_flight - 1)
+            h.successes += 1
+            h.consecutive_failures = 0
+            h.cooldown_until = 0.0
+            h.latency_ewma = latency if h.latency_ewma is None else (
+                EWMA_ALPHA * latency + (1 - EWMA_ALPHA) * h.latency_ewma
+            )
+
+    def record_failure(self, i: int, status: Optional[int] = None) -> float:
+        """Возвращает длительность назначенного cooldown (сек)."""
+        with self._lock:
+            h = self.health[i]
+            h.in_flight = max(0, h.in_flight - 1)
+            h.failures += 1
+            if status == 429:
+                h.throttled += 1
+            elif status is not None and status >= 500:
+                h.server_errors += 1
+            h.consecutive_failures += 1
+            cooldown = min(COOLDOWN_BASE_SEC * 2 ** (h.consecutive_failures - 1), COOLDOWN_MAX_SEC)
+            h.cooldown_until = time.monotonic() + cooldown
+            return cooldown
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            now = time.monotonic()
+            return [h.as_dict(now) for h in self.health]
+
+    def log_snapshot(self, logger: Optional[logging.Logger] = None) -> None:
+        lg = logger or log
+        for d in self.snapshot():
+            ewma = d["latency_ewma"]
+            lg.info(
+                "endpoint=%s ok=%d fail=%d rate=%.2f ewma_ms=%s 429=%d 5xx=%d cooldown_left=%.1fs",
+                d["name"], d["successes"], d["failures"], d["success_rate"],
+                "-" if ewma is None else int(ewma * 1000),
+                d["throttled"], d["server_errors"], d["cooldown_left_sec"],
+            )
@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import gzip
+import logging
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+log = logging.getLogger(__name__)
+
+ARCHIVE_NAME = "pages.warc.gz"
+INDEX_NAME = "pages.idx.tsv"
+
+
+@dataclass
+class ArchiveEntry:
+    url: str
+    offset: int
+    length: int
+    fetched_at: str
+
+
+def _record_bytes(url: str, page_html: str, fetched_at: str) -> bytes:
+    body = page_html.encode("utf-8")
+    head = (
+        "WARC/1.0\r\n"
+        "WARC-Type: response\r\n"
+        f"WARC-Target-URI: {url}\r\n"
+        f"WARC-Date: {fetched_at}\r\n"
+        "Content-Type: text/html; charset=utf-8\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        "\r\n"
+    ).encode("utf-8")
+    return head + body + b"\r\n\r\n"
+
+
+def _parse_record(raw: bytes) -> Tuple[str, str]:
+    head, _, rest = raw.partition(b"\r\n\r\n")
+    url = ""
+    length = len(rest)
+    for line in head.decode("utf-8").split("\r\n")[1:]:
+        k, _, v = line.partition(": ")
+        if k == "WARC-Target-URI":
+            url = v
+        elif k == "Content-Length":
+            length = int(v)
+    return url, rest[:length].decode("utf-8")
+
+
+class PageArchive:
+    """
+    Append-only архив страниц в духе WARC: каждая запись - отдельный gzip-member в pages.warc.gz,
+    так что любую запись можно распаковать по смещению, не читая файл целиком.
+    Рядом лежит индекс pages.idx.tsv: url, offset, length, fetched_at.
+    Повторные записи одного URL не затираются; при чтении берётся последняя.
+    """
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.archive_path = root / ARCHIVE_NAME
+        self.index_path = root / INDEX_NAME
+        self._lock = threading.Lock()
+
+    def append(self, url: str, page_html: str) -> ArchiveEntry:
+        fetched_at = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+        member = gzip.compress(_record_bytes(url, page_html, fetched_at))
+        with self._lock:
+            self.root.mkdir(parents=True, exist_ok=True)
+            with self.archive_path.open("ab") as f:
+                offset = f.tell()
+                f.write(member)
+            entry = ArchiveEntry(url=url, offset=offset, length=len(member), fetched_at=fetched_at)
+            with self.index_path.open("a", encoding="utf-8", newline="") as f:
+                f.write(f"{entry.url}\t{entry.offset}\t{entry.length}\t{entry.fetched_at}\n")
+        return entry
+
+    def entries(self) -> List[ArchiveEntry]:
+        """Последняя запись по каждому URL в порядке первого появления URL в архиве."""
+        if not self.index_path.exists():
+            return []
+        latest: Dict[str, ArchiveEntry] = {}
+        with self.index_path.open("r", encoding="utf-8") as f:
+            for line in f:
+                parts = line.rstrip("\n").split("\t")
+                if len(parts) != 4:
+                    continue
+                url, offset, length, fetched_at = parts
+                latest[url] = ArchiveEntry(url, int(offset), int(length), fetched_at)
+        return list(latest.values())
+
+    def read(self, entry: ArchiveEntry, f: Optional[BinaryIO] = None) -> str:
+        if f is None:
+            with self.archive_path.open("rb") as fh:
+                return self.read(entry, fh)
+        f.seek(entry.offset)
+        url, page_html = _parse_record(gzip.decompress(f.read(entry.length)))
+        if url != entry.url:
+            raise ValueError(f"Archive index mismatch at offset {entry.offset}: {url!r} != {entry.url!r}")
+        return page_html
+
+    def iter_pages(self, entries: List[ArchiveEntry]) -> Iterator[Tuple[ArchiveEntry, str]]:
+        with self.archive_path.open("rb") as f:
+            for e in entries:
+                yield e, self.read(e, f)
@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import csv
+import dataclasses
+import hashlib
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+FEATURE_DTYPE = "float32"
+FEATURE_BATCH: int = 64        # строк на один вызов transform и одну дозапись
+MATRIX_NAME = "X.bin"          # строки признаков подряд, C-порядок, без заголовка
+ROWS_NAME = "rows.tsv"         # url и category_main (целевая preprocess.py) для каждой строки X
+META_NAME = "meta.json"        # имена колонок, dtype, число строк, хэш параметров предобработки
+
+
+def _read_meta(root: Path) -> Optional[Dict[str, Any]]:
+    p = root / META_NAME
+    return json.loads(p.read_text(encoding="utf-8")) if p.exists() else None
+
+
+def params_hash(preprocessor: Any) -> str:
+    payload = json.dumps(dataclasses.asdict(preprocessor), ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def _count_lines(path: Path) -> int:
+    if not path.exists():
+        return 0
+    with path.open("rb") as f:
+        return sum(1 for _ in f)
+
+
+class FeatureSink:
+    """
+    Дописываемая матрица признаков: строки товаров прямо из сбора проходят обученный
+    ProductPreprocessor (пропуски, нормировка, one-hot) и дописываются в data/features/X.bin,
+    который читается как np.memmap (open_features). Пересчитывать data.tsv -> data.csv
+    после сбора не нужно - матрица актуальна, как только сбор закончился.
+
+    Все строки матрицы должны быть получены одними и теми же параметрами: их хэш лежит
+    в meta.json, и если preprocess.json переобучен, дописывать нельзя - нужен rebuild=True.
+    """
+
+    def __init__(self, root: Path, preprocessor: Any, batch_rows: int = FEATURE_BATCH, rebuild: bool = False):
+        self.root = root
+        self.pp = preprocessor
+        self.batch_rows = max(1, batch_rows)
+        self.dtype = np.dtype(FEATURE_DTYPE)
+        self.written = 0
+        self._buf: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._closed = False
+
+        self.columns: List[str] = list(preprocessor.feature_names())
+        self.params = params_hash(preprocessor)
+
+        root.mkdir(parents=True, exist_ok=True)
+        meta = _read_meta(root)
+        if rebuild or meta is None:
+            for name in (MATRIX_NAME, ROWS_NAME):
+                (root / name).unlink(missing_ok=True)
+        elif meta.get("params") != self.params or meta["dtype"] != FEATURE_DTYPE:
+            raise ValueError(f"{root} was built with other preprocess params, rebuild it")
+        self.n_rows = self._recover()
+        self._write_meta()
+        self._x = (root / MATRIX_NAME).open("ab")
+        self._rows = (root / ROWS_NAME).open("a", encoding="utf-8", newline="")
+        self._rows_writer = csv.writer(self._rows, delimiter="\t", lineterminator="\n")
+
+    def _recover(self) -> int:
+        """После обрыва: X.bin и rows.tsv обрезаются до общего числа целых строк."""
+        x_path = self.root / MATRIX_NAME
+        row_bytes = len(self.columns) * self.dtype.itemsize
+        x_rows = x_path.stat().st_size // row_bytes if x_path.exists() and row_bytes else 0
+        n = min(x_rows, _count_lines(self.root / ROWS_NAME))
+        if x_path.exists() and x_path.stat().st_size != n * row_bytes:
+            with x_path.open("r+b") as f:
+                f.truncate(n * row_bytes)
+        rows_path = self.root / ROWS_NAME
+        if _count_lines(rows_path) != n:
+            lines = rows_path.read_text(encoding="utf-8").splitlines(keepends=True)[:n]
+            rows_path.write_text("".join(lines), encoding="utf-8")
+        if n:
+            log.info(f"[features] appending to {self.root}: {n} existing row(s)")
+        return n
+
+    def _write_meta(self) -> None:
+        meta = {"columns": self.columns, "dtype": FEATURE_DTYPE, "n_rows": self.n_rows, "params": self.params}
+        tmp = self.root / f".{META_NAME}.tmp"
+        tmp.write_text(json.dumps(meta, ensure_ascii=False, indent=1), encoding="utf-8")
+        os.replace(tmp, self.root / META_NAME)
+
+    def __enter__(self) -> "FeatureSink":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def write(self, row: Dict[str, Any]) -> None:
+        with self._lock:
+            if self._closed:
+                raise RuntimeError(f"Feature sink is closed: {self.root}")
+            self._buf.append(row)
+            if len(self._buf) >= self.batch_rows:
+                self._flush()
+
+    def _flush(self) -> None:
+        if not self._buf:
+            return
+        import pandas as pd
+
+        df = pd.DataFrame(self._buf)
+        X, _, y = self.pp.transform_sparse(df)
+        self._x.write(np.ascontiguousarray(X.toarray(), dtype=self.dtype).tobytes())
+        self._x.flush()
+        self._rows_writer.writerows(zip(df["url"].astype(str), y))
+        self._rows.flush()
+        self.n_rows += len(self._buf)
+        self.written += len(self._buf)
+        self._write_meta()
+        self._buf.clear()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            try:
+                self._flush()
+            finally:
+                self._x.close()
+                self._rows.close()
+        log.info(f"[features] closed {self.root}: +{self.written} row(s), total={self.n_rows} x {len(self.columns)}")
+
+
+def open_features(root: Path) -> Tuple[np.memmap, List[str], List[Tuple[str, str]]]:
+    """(X как np.memmap только для чтения, имена колонок, [(url, целевая)] по строкам)."""
+    meta = _read_meta(root)
+    if meta is None:
+        raise FileNotFoundError(f"No feature matrix in {root}")
+    n, d = meta["n_rows"], len(meta["columns"])
+    X = np.memmap(root / MATRIX_NAME, dtype=meta["dtype"], mode="r", shape=(n, d)) if n else np.empty((0, d))
+    with (root / ROWS_NAME).open("r", encoding="utf-8", newline="") as f:
+        rows = [(u, t) for u, t in csv.reader(f, delimiter="\t")][:n]
+    return X, meta["columns"], rows
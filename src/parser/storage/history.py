@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+
+from settings.constants import NUMERIC_COLUMNS
+from storage.tsv_sink import format_row
+
+log = logging.getLogger(__name__)
+
+HASH_EXCLUDE = ("image_path",)  # путь к картинке зависит от --download-images, а не от товара
+HASH_VERSION = 1                # PRAGMA user_version; 0 - хэши считались без нормализации чисел
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS history (
+    url         TEXT NOT NULL,
+    crawl_ts    TEXT NOT NULL,
+    fields_hash TEXT NOT NULL,
+    row_json    TEXT NOT NULL,
+    PRIMARY KEY (url, crawl_ts)
+);
+CREATE TABLE IF NOT EXISTS current (
+    url         TEXT PRIMARY KEY,
+    crawl_ts    TEXT NOT NULL,
+    fields_hash TEXT NOT NULL,
+    row_json    TEXT NOT NULL,
+    checked_at  REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS current_checked ON current(checked_at);
+"""
+
+
+def _number_key(v: str) -> str:
+    """
+    Числа из data.tsv ("278.0") и из свежего разбора (278.0 -> "278") сравниваются как числа:
+    иначе посеянная из TSV строка при первом refresh выглядела бы изменённой.
+    """
+    if v == "":
+        return ""
+    try:
+        return format(float(v), ".10g")
+    except ValueError:
+        return v
+
+
+class ProductHistory:
+    """
+    История товаров в SQLite. history - только изменившиеся версии, ключ (url, crawl_ts);
+    current - последняя версия каждого url и время последней проверки, это и есть быстрый
+    «текущий снимок». Изменение определяется по sha1 от отформатированных полей.
+    """
+
+    def __init__(self, path: Path, columns: Sequence[str]):
+        self.path = path
+        self.columns = list(columns)
+        self._hashed = [c for c in self.columns if c not in HASH_EXCLUDE]
+        self._numeric = set(NUMERIC_COLUMNS)
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+
+    def _conn(self) -> sqlite3.Connection:
+        if self._db is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(_SCHEMA)
+            if self._db.execute("PRAGMA user_version").fetchone()[0] < HASH_VERSION:
+                self._rehash(self._db)
+        return self._db
+
+    def _rehash(self, db: sqlite3.Connection) -> None:
+        """Пересчёт хэшей current по текущим правилам, чтобы старая база не дала ложных изменений."""
+        rows = db.execute("SELECT url, row_json FROM current").fetchall()
+        db.execute("BEGIN")
+        try:
+            db.executemany(
+                "UPDATE current SET fields_hash = ? WHERE url = ?",
+                [(self.fields_hash(json.loads(payload)), url) for url, payload in rows],
+            )
+            db.execute(f"PRAGMA user_version = {HASH_VERSION}")
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        if rows:
+            log.info(f"[history] rehashed {len(rows)} current row(s) to hash version {HASH_VERSION}")
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def fields_hash(self, formatted: Dict[str, str]) -> str:
+        payload = "\t".join(
+            _number_key(formatted.get(c, "")) if c in self._numeric else formatted.get(c, "") for c in self._hashed
+        )
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn().execute("SELECT COUNT(*) FROM current").fetchone()[0]
+
+    def record(self, row: Dict[str, Any], crawl_ts: str, checked_at: Optional[float] = None) -> bool:
+        """Сохраняет строку, если она изменилась; возвращает True для новой или изменённой."""
+        formatted = format_row(row, self.columns)
+        url = formatted["url"]
+        h = self.fields_hash(formatted)
+        now = time.time() if checked_at is None else checked_at
+        with self._lock:
+            db = self._conn()
+            prev = db.execute("SELECT fields_hash FROM current WHERE url = ?", (url,)).fetchone()
+            if prev is not None and prev[0] == h:
+                db.execute("UPDATE current SET checked_at = ? WHERE url = ?", (now, url))
+                return False
+            payload = json.dumps(formatted, ensure_ascii=False)
+            db.execute("BEGIN")
+            try:
+                db.execute(
+                    "INSERT OR REPLACE INTO history (url, crawl_ts, fields_hash, row_json) VALUES (?, ?, ?, ?)",
+                    (url, crawl_ts, h, payload),
+                )
+                db.execute(
+                    "INSERT OR REPLACE INTO current (url, crawl_ts, fields_hash, row_json, checked_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (url, crawl_ts, h, payload, now),
+                )
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            return True
+
+    def seed(self, rows: Iterable[Dict[str, Any]], crawl_ts: str) -> int:
+        """Первичное наполнение (например, из data.tsv). checked_at=0, так что все строки сразу к обновлению."""
+        return sum(self.record(r, crawl_ts, checked_at=0.0) for r in rows)
+
+    def touch_failed(self, url: str) -> None:
+        """Не удалось обновить - всё равно сдвигаем проверку, чтобы битый url не стоял первым каждый раз."""
+        with self._lock:
+            self._conn().execute("UPDATE current SET checked_at = ? WHERE url = ?", (time.time(), url))
+
+    def due(self, max_age_sec: float, limit: Optional[int] = None) -> List[str]:
+        """url, которые не проверялись дольше max_age_sec, самые давние первыми."""
+        sql = "SELECT url FROM current WHERE checked_at < ? ORDER BY checked_at"
+        params: List[Any] = [time.time() - max_age_sec]
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            return [u for (u,) in self._conn().execute(sql, params)]
+
+    def snapshot(self) -> Iterator[Dict[str, str]]:
+        with self._lock:
+            rows = self._conn().execute("SELECT row_json FROM current ORDER BY rowid").fetchall()
+        for (payload,) in rows:
+            yield json.loads(payload)
+
+    def versions(self, url: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn().execute(
+                "SELECT crawl_ts, row_json FROM history WHERE url = ? ORDER BY crawl_ts", (url,)
+            ).fetchall()
+        return [{"crawl_ts": ts, **json.loads(payload)} for ts, payload in rows]
@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Mapping, Optional, Tuple
+
+from settings.runtime import CONFIG_PATHS
+
+log = logging.getLogger(__name__)
+
+LISTING_TTL_SEC: float = 6 * 3600        # страницы категории меняются чаще всего
+PAGE_TTL_SEC: float = 24 * 3600          # страницы товаров
+IMAGE_TTL_SEC: float = 30 * 24 * 3600    # картинки почти не меняются
+CACHE_MAX_BYTES: int = 2 * 1024 ** 3     # после превышения выселяем давно не читанное (LRU)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    url           TEXT PRIMARY KEY,
+    digest        TEXT NOT NULL,
+    size          INTEGER NOT NULL,
+    content_type  TEXT,
+    etag          TEXT,
+    last_modified TEXT,
+    fetched_at    REAL NOT NULL,
+    last_access   REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_lru ON entries(last_access);
+CREATE INDEX IF NOT EXISTS entries_digest ON entries(digest);
+"""
+
+
+class CacheMiss(RuntimeError):
+    """В режиме offline запрошенного URL нет в кэше."""
+
+
+@dataclass
+class CachedResponse:
+    """То, что нужно парсерам от requests.Response: content, text, status_code, headers."""
+    url: str
+    content: bytes
+    status_code: int = 200
+    headers: Mapping[str, str] = field(default_factory=dict)
+    from_cache: bool = False
+
+    @property
+    def encoding(self) -> str:
+        ctype = self.headers.get("Content-Type", "")
+        for part in ctype.split(";")[1:]:
+            k, _, v = part.strip().partition("=")
+            if k.lower() == "charset" and v:
+                return v.strip("\"'")
+        return "utf-8"
+
+    @property
+    def text(self) -> str:
+        return self.content.decode(self.encoding, errors="replace")
+
+
+@dataclass
+class _Entry:
+    digest: str
+    size: int
+    content_type: Optional[str]
+    etag: Optional[str]
+    last_modified: Optional[str]
+    fetched_at: float
+
+
+class HttpCache:
+    """
+    Кэш сырых ответов на диске. Тела лежат по sha256 содержимого (objects/ab/abcd...),
+    поэтому одинаковые картинки под разными URL хранятся один раз. Индекс url -> digest,
+    ETag/Last-Modified и время доступа - в SQLite.
+
+    lookup() отдаёт свежую запись или заголовки для условного запроса; store() сохраняет
+    ответ сети, а на 304 продлевает имеющуюся запись.
+    """
+
+    def __init__(self, root: Path, max_bytes: int = CACHE_MAX_BYTES):
+        self.root = root
+        self.objects_dir = root / "objects"
+        self.max_bytes = max_bytes
+        self.enabled = True
+        self.offline = False
+        self.max_ttl: Optional[float] = None  # потолок TTL; 0 - всегда условный запрос (refresh)
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._total: int = 0
+
+    def _conn(self) -> sqlite3.Connection:
+        if self._db is None:
+            self.objects_dir.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(self.root / "index.sqlite", isolation_level=None, check_same_thread=False)
+            self._db.executescript(_SCHEMA)
+            row = self._db.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM (SELECT MAX(size) AS size FROM entries GROUP BY digest)"
+            ).fetchone()
+            self._total = int(row[0])
+        return self._db
+
+    def _blob_path(self, digest: str) -> Path:
+        return self.objects_dir / digest[:2] / digest
+
+    def _entry(self, url: str) -> Optional[_Entry]:
+        row = self._conn().execute(
+            "SELECT digest, size, content_type, etag, last_modified, fetched_at FROM entries WHERE url = ?",
+            (url,),
+        ).fetchone()
+        return _Entry(*row) if row else None
+
+    def _read(self, url: str, e: _Entry) -> Optional[CachedResponse]:
+        try:
+            body = self._blob_path(e.digest).read_bytes()
+        except FileNotFoundError:
+            self._conn().execute("DELETE FROM entries WHERE url = ?", (url,))
+            return None
+        self._conn().execute("UPDATE entries SET last_access = ? WHERE url = ?", (time.time(), url))
+        headers = {"Content-Type": e.content_type} if e.content_type else {}
+        return CachedResponse(url=url, content=body, headers=headers, from_cache=True)
+
+    def lookup(self, url: str, ttl: float) -> Tuple[Optional[CachedResponse], Dict[str, str]]:
+        """
+        (ответ, {}) - запись свежая (или режим offline), в сеть не идём;
+        (None, заголовки) - идём в сеть, заголовки делают запрос условным, если запись есть.
+        """
+        if not self.enabled:
+            return None, {}
+        if self.max_ttl is not None:
+            ttl = min(ttl, self.max_ttl)
+        with self._lock:
+            e = self._entry(url)
+            if e is not None and (self.offline or time.time() - e.fetched_at < ttl):
+                hit = self._read(url, e)
+                if hit is not None:
+                    log.debug(f"[cache] hit {url}")
+                    return hit, {}
+                e = None
+            if self.offline:
+                raise CacheMiss(f"Not in cache (offline mode): {url}")
+            cond: Dict[str, str] = {}
+            if e is not None:
+                if e.etag:
+                    cond["If-None-Match"] = e.etag
+                if e.last_modified:
+                    cond["If-Modified-Since"] = e.last_modified
+            return None, cond
+
+    def store(self, url: str, status: int, headers: Mapping[str, str], content: bytes) -> CachedResponse:
+        if not self.enabled:
+            return CachedResponse(url=url, content=content, status_code=status, headers=headers)
+        now = time.time()
+        with self._lock:
+            db = self._conn()
+            if status == 304:
+                e = self._entry(url)
+                if e is None:
+                    raise CacheMiss(f"304 for an entry that is no longer cached: {url}")
+                db.execute(
+                    "UPDATE entries SET fetched_at = ?, etag = COALESCE(?, etag), "
+                    "last_modified = COALESCE(?, last_modified) WHERE url = ?",
+                    (now, headers.get("ETag"), headers.get("Last-Modified"), url),
+                )
+                hit = self._read(url, e)
+                if hit is None:
+                    raise CacheMiss(f"304 for an entry whose body is gone: {url}")
+                log.debug(f"[cache] revalidated {url}")
+                return hit
+
+            digest = hashlib.sha256(content).hexdigest()
+            path = self._blob_path(digest)
+            if not path.exists():
+                path.parent.mkdir(parents=True, exist_ok=True)
+                tmp = path.with_suffix(f".tmp{threading.get_ident()}")
+                tmp.write_bytes(content)
+                os.replace(tmp, path)
+                self._total += len(content)
+
+            prev = self._entry(url)
+            db.execute(
+                "INSERT OR REPLACE INTO entries "
+                "(url, digest, size, content_type, etag, last_modified, fetched_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, digest, len(content), headers.get("Content-Type"), headers.get("ETag"),
+                 headers.get("Last-Modified"), now, now),
+            )
+            if prev is not None and prev.digest != digest:
+                self._drop_blob_if_orphan(prev.digest, prev.size)
+            self._evict()
+
+        return CachedResponse(url=url, content=content, status_code=status, headers=headers)
+
+    def _drop_blob_if_orphan(self, digest: str, size: int) -> None:
+        still_used = self._conn().execute("SELECT 1 FROM entries WHERE digest = ? LIMIT 1", (digest,)).fetchone()
+        if still_used:
+            return
+        try:
+            self._blob_path(digest).unlink()
+            self._total -= size
+        except FileNotFoundError:
+            pass
+
+    def _evict(self) -> None:
+        db = self._conn()
+        while self._total > self.max_bytes:
+            row = db.execute("SELECT url, digest, size FROM entries ORDER BY last_access LIMIT 1").fetchone()
+            if row is None:
+                break
+            url, digest, size = row
+            db.execute("DELETE FROM entries WHERE url = ?", (url,))
+            self._drop_blob_if_orphan(digest, size)
+            log.debug(f"[cache] evicted {url}")
+
+
+HTTP_CACHE = HttpCache(CONFIG_PATHS.http_cache_dir)
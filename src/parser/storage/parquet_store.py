@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import dataclasses
+import json
+import logging
+import os
+import threading
+import typing
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from settings.constants import CATEGORICAL_COLUMNS, COLUMNS
+
+log = logging.getLogger(__name__)
+
+PARTITION_KEY = "crawl_ts"
+ROWS_PER_PART: int = 5000   # строк в одном part-файле; файл пишется целиком, так что обрыв не портит партицию
+COMPRESSION = "zstd"
+SEED_TS = "00000000_000000"      # партиция со строками data.tsv, собранными до первого --parquet; старше любого запуска
+SEED_MARKER = "_seeded.json"     # файлы с "_" и "." pyarrow.dataset не читает как данные
+
+_ARROW_TYPES = {float: pa.float64(), int: pa.int64(), str: pa.string()}
+
+
+def product_schema() -> pa.Schema:
+    """
+    Схема из аннотаций dataclass Product в порядке COLUMNS: Optional[float] -> float64,
+    Optional[int] -> int64, Optional[str] -> string; CATEGORICAL_COLUMNS - словарные строки.
+    """
+    from parsers.product import Product  # тянет HTTP-клиент, нужен только пишущей стороне
+
+    hints = typing.get_type_hints(Product)
+    names = {f.name for f in dataclasses.fields(Product)}
+    fields = []
+    for c in COLUMNS:
+        if c not in names:
+            raise KeyError(f"Column {c!r} from COLUMNS is missing in Product")
+        base = next(a for a in typing.get_args(hints[c]) or (hints[c],) if a is not type(None))
+        t = _ARROW_TYPES[base]
+        if c in CATEGORICAL_COLUMNS:
+            t = pa.dictionary(pa.int32(), pa.string())
+        fields.append(pa.field(c, t, nullable=(c != "url")))
+    return pa.schema(fields)
+
+
+def _coerce(v: Any, t: pa.DataType) -> Any:
+    """Строки из data.tsv приводятся к типу колонки; пустые -> null."""
+    if v is None or v == "":
+        return None
+    if pa.types.is_floating(t):
+        try:
+            return float(v)
+        except (TypeError, ValueError):
+            return None
+    if pa.types.is_integer(t):
+        try:
+            return int(float(v))
+        except (TypeError, ValueError):
+            return None
+    return str(v)
+
+
+class ParquetSink:
+    """
+    Пишет строки товаров в data/dataset/crawl_ts=<ts>/part-NNNNN.parquet.
+    Каждый запуск - своя партиция, part-файл пишется во временный файл и переименовывается,
+    поэтому читатель никогда не видит недописанный файл.
+    """
+
+    def __init__(self, root: Path, crawl_ts: str, rows_per_part: int = ROWS_PER_PART):
+        self.schema = product_schema()
+        self.dir = root / f"{PARTITION_KEY}={crawl_ts}"
+        self.rows_per_part = max(1, rows_per_part)
+        self.written = 0
+        self._buf: Dict[str, List[Any]] = {f.name: [] for f in self.schema}
+        self._types = {f.name: (f.type.value_type if pa.types.is_dictionary(f.type) else f.type) for f in self.schema}
+        self._parts = 0
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> "ParquetSink":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def write(self, row: Dict[str, Any]) -> None:
+        with self._lock:
+            for name, col in self._buf.items():
+                col.append(_coerce(row.get(name), self._types[name]))
+            if len(self._buf["url"]) >= self.rows_per_part:
+                self._flush()
+
+    def close(self) -> None:
+        with self._lock:
+            self._flush()
+        if self._parts:
+            log.info(f"[parquet] {self.dir}: rows={self.written} parts={self._parts}")
+
+    def _flush(self) -> None:
+        n = len(self._buf["url"])
+        if not n:
+            return
+        table = pa.Table.from_pydict(self._buf, schema=self.schema)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        path = self.dir / f"part-{self._parts:05d}.parquet"
+        tmp = path.with_name(f".{path.name}.tmp")  # файлы с точкой pyarrow.dataset пропускает
+        pq.write_table(table, tmp, compression=COMPRESSION)
+        os.replace(tmp, path)
+        self._parts += 1
+        self.written += n
+        for col in self._buf.values():
+            col.clear()
+
+
+def is_seeded(root: Path) -> bool:
+    """Датасет содержит весь data.tsv (to-parquet или автоматический посев), а не только строки --parquet-запусков."""
+    return (root / SEED_MARKER).exists()
+
+
+def mark_seeded(root: Path, source: Path, rows: int, crawl_ts: str) -> None:
+    root.mkdir(parents=True, exist_ok=True)
+    meta = {"source": str(source), "rows": rows, PARTITION_KEY: crawl_ts}
+    tmp = root / f".{SEED_MARKER}.tmp"
+    tmp.write_text(json.dumps(meta, ensure_ascii=False, indent=1), encoding="utf-8")
+    os.replace(tmp, root / SEED_MARKER)
+
+
+def dataset(root: Path) -> ds.Dataset:
+    return ds.dataset(root, format="parquet", partitioning="hive")
+
+
+def partitions(root: Path) -> List[str]:
+    """Метки crawl_ts в порядке возрастания."""
+    if not root.exists():
+        return []
+    prefix = f"{PARTITION_KEY}="
+    return sorted(p.name[len(prefix):] for p in root.iterdir() if p.is_dir() and p.name.startswith(prefix))
+
+
+def read_table(
+    root: Path,
+    columns: Optional[Sequence[str]] = None,
+    crawl_ts: Optional[Sequence[str]] = None,
+) -> pa.Table:
+    """
+    Читает только нужные колонки (проекция уходит в Parquet-ридер) и, если задано,
+    только нужные партиции. Колонка crawl_ts добавляется из пути партиции.
+    """
+    filt = ds.field(PARTITION_KEY).isin(list(crawl_ts)) if crawl_ts else None
+    return dataset(root).to_table(columns=list(columns) if columns else None, filter=filt)
+
+
+def read_frame(
+    root: Path,
+    columns: Optional[Sequence[str]] = None,
+    crawl_ts: Optional[Sequence[str]] = None,
+):
+    """pandas.DataFrame из read_table; self_destruct освобождает Arrow-буферы по ходу конвертации."""
+    return read_table(root, columns, crawl_ts).to_pandas(split_blocks=True, self_destruct=True)
+
+
+def read_latest_frame(root: Path, columns: Optional[Sequence[str]] = None):
+    """
+    Все партиции, по каждому url - строка из самого свежего crawl_ts.
+    Словарные колонки отдаются как object, чтобы с ними работал обычный строковый код.
+    """
+    cols = list(columns) if columns else None
+    read_cols = None if cols is None else list(dict.fromkeys(cols + ["url", PARTITION_KEY]))
+    df = read_frame(root, read_cols)
+    df = df.sort_values(PARTITION_KEY, kind="stable").drop_duplicates("url", keep="last")
+    for c in df.columns:
+        if str(df[c].dtype) == "category":
+            df[c] = df[c].astype(object)
+    keep = cols if cols is not None else [c for c in df.columns if c != PARTITION_KEY]
+    return df[keep].reset_index(drop=True)
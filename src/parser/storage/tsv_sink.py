@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import csv
+import logging
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+log = logging.getLogger(__name__)
+
+FLUSH_EVERY_ROWS: int = 64         # сбрасываем буфер на диск каждые N строк...
+FLUSH_EVERY_SEC: float = 5.0       # ...или раз в T секунд, если строки идут медленно
+FSYNC_POLICIES = ("none", "batch", "close")
+
+_STOP = object()
+
+
+def format_row(row: Dict[str, Any], columns: Sequence[str]) -> Dict[str, str]:
+    out: Dict[str, str] = {}
+    for k in columns:
+        v = row.get(k)
+        if v is None:
+            out[k] = ""
+        elif isinstance(v, float):
+            out[k] = f"{v:.10g}"
+        else:
+            out[k] = str(v)
+    return out
+
+
+class TsvSink:
+    """
+    Долгоживущий писатель data.tsv: файл открыт один раз, строки копятся в очереди и
+    пишутся фоновым потоком пачками. write() не трогает диск и может вызываться из
+    любых потоков, поэтому медленный диск не тормозит парсинг.
+
+    fsync: "none" - только flush в ОС, "batch" - fsync после каждой пачки,
+    "close" - один fsync при закрытии.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        columns: Sequence[str],
+        flush_rows: int = FLUSH_EVERY_ROWS,
+        flush_sec: float = FLUSH_EVERY_SEC,
+        fsync: str = "close",
+    ):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"fsync must be one of {FSYNC_POLICIES}, got {fsync!r}")
+        self.path = path
+        self.columns = list(columns)
+        self.flush_rows = max(1, flush_rows)
+        self.flush_sec = flush_sec
+        self.fsync = fsync
+        self.written = 0
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+        self._error: Optional[BaseException] = None
+        self._closed = False
+
+        need_header = not path.exists() or path.stat().st_size == 0
+        self._f = path.open("a", encoding="utf-8", newline="")
+        self._writer = csv.DictWriter(self._f, fieldnames=self.columns, delimiter="\t", lineterminator="\n")
+        if need_header:
+            self._writer.writeheader()
+            self._f.flush()
+        self._thread = threading.Thread(target=self._run, name="tsv-sink", daemon=True)
+        self._thread.start()
+
+    def __enter__(self) -> "TsvSink":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def write(self, row: Dict[str, Any]) -> None:
+        if self._error is not None:
+            raise RuntimeError(f"TSV sink failed: {self.path}") from self._error
+        if self._closed:
+            raise RuntimeError(f"TSV sink is closed: {self.path}")
+        self._queue.put(format_row(row, self.columns))
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join()
+        try:
+            if self.fsync != "none" and self._error is None:
+                os.fsync(self._f.fileno())
+        finally:
+            self._f.close()
+        log.info(f"[tsv] closed {self.path}: rows={self.written}")
+        if self._error is not None:
+            raise RuntimeError(f"TSV sink failed: {self.path}") from self._error
+
+    def _flush(self, batch: List[Dict[str, str]]) -> None:
+        if not batch:
+            return
+        self._writer.writerows(batch)
+        self._f.flush()
+        if self.fsync == "batch":
+            os.fsync(self._f.fileno())
+        self.written += len(batch)
+        log.debug(f"[tsv] flushed {len(batch)} row(s), total={self.written}")
+        batch.clear()
+
+    def _run(self) -> None:
+        batch: List[Dict[str, str]] = []
+        deadline = time.monotonic() + self.flush_sec
+        stop = False
+        while not stop:
+            try:
+                item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                item = None
+            if item is _STOP:
+                stop = True
+            elif item is not None:
+                batch.append(item)
+            if stop or len(batch) >= self.flush_rows or time.monotonic() >= deadline:
+                try:
+                    self._flush(batch)
+                except BaseException as e:  # отдадим ошибку вызывающему в write()/close()
+                    log.exception(f"[tsv] write failed: {self.path}")
+                    self._error = e
+                    return
+                deadline = time.monotonic() + self.flush_sec
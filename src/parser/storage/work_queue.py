@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set
+
+log = logging.getLogger(__name__)
+
+MAX_ATTEMPTS: int = 5            # после стольких неудач url остаётся в failed насовсем
+RETRY_BASE_SEC: float = 60.0     # пауза перед первым повтором, дальше удваивается
+RETRY_MAX_SEC: float = 6 * 3600
+
+PENDING, IN_PROGRESS, DONE, FAILED = "pending", "in_progress", "done", "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS queue (
+    url             TEXT PRIMARY KEY,
+    state           TEXT NOT NULL,
+    attempts        INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL DEFAULT 0,
+    last_error      TEXT,
+    updated_at      REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS queue_ready ON queue(state, next_attempt_at);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+def retry_delay(attempts: int) -> float:
+    return min(RETRY_BASE_SEC * 2 ** max(0, attempts - 1), RETRY_MAX_SEC)
+
+
+class WorkQueue:
+    """
+    Очередь url сбора в SQLite: pending -> in_progress -> done | failed.
+    Переживает падение процесса: при старте recover() возвращает незавершённые in_progress
+    в pending, а флаг listing_done говорит, что страницы категории уже пройдены и повторно
+    их сканировать не нужно. failed повторяются с экспоненциальной паузой до MAX_ATTEMPTS.
+    """
+
+    def __init__(self, path: Path, max_attempts: int = MAX_ATTEMPTS):
+        self.path = path
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+
+    def _conn(self) -> sqlite3.Connection:
+        if self._db is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(_SCHEMA)
+        return self._db
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    # --- сессия ---
+
+    @property
+    def listing_done(self) -> bool:
+        with self._lock:
+            row = self._conn().execute("SELECT value FROM meta WHERE key = 'listing_done'").fetchone()
+        return bool(row and row[0] == "1")
+
+    def mark_listing_done(self) -> None:
+        with self._lock:
+            self._conn().execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('listing_done', '1')")
+
+    def recover(self) -> int:
+        """in_progress от упавшего запуска снова становятся pending."""
+        with self._lock:
+            cur = self._conn().execute(
+                "UPDATE queue SET state = ?, updated_at = ? WHERE state = ?", (PENDING, time.time(), IN_PROGRESS)
+            )
+            return cur.rowcount
+
+    def remaining(self) -> int:
+        """Сколько url ещё может быть обработано (pending и failed с запасом попыток)."""
+        with self._lock:
+            return self._conn().execute(
+                "SELECT COUNT(*) FROM queue WHERE state IN (?, ?) OR (state = ? AND attempts < ?)",
+                (PENDING, IN_PROGRESS, FAILED, self.max_attempts),
+            ).fetchone()[0]
+
+    def reset(self) -> None:
+        """Начать новую сессию: прошлая закончена, её url уже в data.tsv или окончательно failed."""
+        with self._lock:
+            db = self._conn()
+            db.execute("DELETE FROM queue")
+            db.execute("DELETE FROM meta")
+
+    # --- url ---
+
+    def known_urls(self) -> Set[str]:
+        with self._lock:
+            return {u for (u,) in self._conn().execute("SELECT url FROM queue")}
+
+    def add(self, urls: Iterable[str], claimed: bool = False) -> int:
+        """Новые url (уже известные пропускаются). claimed=True - сразу в работу, минуя pending."""
+        now = time.time()
+        state = IN_PROGRESS if claimed else PENDING
+        with self._lock:
+            db = self._conn()
+            before = db.total_changes
+            db.executemany(
+                "INSERT OR IGNORE INTO queue (url, state, updated_at) VALUES (?, ?, ?)",
+                [(u, state, now) for u in urls],
+            )
+            return db.total_changes - before
+
+    def claim(self, limit: int = 1) -> List[str]:
+        """Забирает готовые к работе url (pending и failed, чья пауза истекла) и помечает их in_progress."""
+        now = time.time()
+        with self._lock:
+            db = self._conn()
+            urls = [u for (u,) in db.execute(
+                "SELECT url FROM queue WHERE (state = ? OR (state = ? AND attempts < ?)) AND next_attempt_at <= ? "
+                "ORDER BY next_attempt_at, rowid LIMIT ?",
+                (PENDING, FAILED, self.max_attempts, now, limit),
+            )]
+            db.executemany(
+                "UPDATE queue SET state = ?, updated_at = ? WHERE url = ?",
+                [(IN_PROGRESS, now, u) for u in urls],
+            )
+            return urls
+
+    def done(self, url: str) -> None:
+        with self._lock:
+            self._conn().execute(
+                "UPDATE queue SET state = ?, last_error = NULL, updated_at = ? WHERE url = ?",
+                (DONE, time.time(), url),
+            )
+
+    def fail(self, url: str, error: str = "") -> float:
+        """Возвращает паузу до следующей попытки (сек)."""
+        now = time.time()
+        with self._lock:
+            db = self._conn()
+            row = db.execute("SELECT attempts FROM queue WHERE url = ?", (url,)).fetchone()
+            attempts = (row[0] if row else 0) + 1
+            delay = retry_delay(attempts)
+            db.execute(
+                "UPDATE queue SET state = ?, attempts = ?, next_attempt_at = ?, last_error = ?, updated_at = ? "
+                "WHERE url = ?",
+                (FAILED, attempts, now + delay, error[:500], now, url),
+            )
+        if attempts >= self.max_attempts:
+            log.warning(f"[queue] giving up on {url} after {attempts} attempt(s): {error}")
+        return delay
+
+    def release(self, url: str, error: str = "", delay: float = RETRY_BASE_SEC) -> None:
+        """
+        Вернуть url в pending без траты попытки (например, страницы нет в кэше при --offline):
+        это не ошибка страницы, но в этом же проходе раньше чем через delay её не берём.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn().execute(
+                "UPDATE queue SET state = ?, next_attempt_at = ?, last_error = ?, updated_at = ? WHERE url = ?",
+                (PENDING, now + delay, error[:500], now, url),
+            )
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._conn().execute("SELECT state, COUNT(*) FROM queue GROUP BY state").fetchall())
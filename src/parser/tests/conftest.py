@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# модули парсера импортируются как скрипты (from storage.x import ...), как при python main.py
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+
+aiohttp = pytest.importorskip("aiohttp")
+pytest.importorskip("aiohttp_socks")
+pytest.importorskip("requests")
+from aiohttp import web
+
+from settings.async_proxy import AsyncHttpClient
+
+
+async def _serve(body: bytes):
+    async def handler(request: web.Request) -> web.Response:
+        return web.Response(body=body, content_type="text/html")
+
+    app = web.Application()
+    app.router.add_get("/p", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}/p"
+
+
+def _client() -> AsyncHttpClient:
+    return AsyncHttpClient([], allow_direct=True, rate=100.0, burst=100.0)
+
+
+def test_client_survives_several_event_loops():
+    client = _client()
+
+    async def fetch() -> bytes:
+        runner, url = await _serve(b"ok")
+        try:
+            async with client:
+                return (await client.http_get(url)).content
+        finally:
+            await runner.cleanup()
+
+    # второй asyncio.run в том же процессе - новый loop, семафор и сессии создаются заново
+    assert asyncio.run(fetch()) == b"ok"
+    assert asyncio.run(fetch()) == b"ok"
+
+
+def test_client_requires_async_with():
+    async def fetch() -> None:
+        await _client().http_get("http://127.0.0.1:9/")
+
+    with pytest.raises(RuntimeError, match="async with"):
+        asyncio.run(fetch())
+
+
+def test_aget_response_goes_through_cache(tmp_path, monkeypatch):
+    pytest.importorskip("lxml")
+    import settings.async_proxy as async_proxy
+    from parsers import helpers
+    from storage.http_cache import HttpCache
+
+    client = _client()
+    monkeypatch.setattr(async_proxy, "ASYNC_CLIENT", client)
+    monkeypatch.setattr(helpers, "HTTP_CACHE", HttpCache(tmp_path / "cache"))
+
+    async def fetch_twice():
+        runner, url = await _serve(b"<html><body>ok</body></html>")
+        try:
+            async with client:
+                first = await helpers.aget_response(url)
+            second = await helpers.aget_response(url)   # свежая запись кэша, клиент не нужен
+            return first, second
+        finally:
+            await runner.cleanup()
+
+    first, second = asyncio.run(fetch_twice())
+    assert first.content == second.content == b"<html><body>ok</body></html>"
+    assert second.from_cache
@@ -0,0 +1,65 @@
+import sqlite3
+
+import pytest
+
+from settings.constants import COLUMNS
+from storage.history import HASH_VERSION, ProductHistory
+
+URL = "https://example.test/p-1.html"
+
+
+@pytest.fixture
+def tsv_row():
+    # так строка выглядит в data.tsv: все значения - строки, числа с ".0"
+    row = {c: "" for c in COLUMNS}
+    row.update({"url": URL, "name": "Товар", "price_rub": "278.0", "weight_g": "200.0",
+                "rating": "4.9", "ratings_count": "2820.0"})
+    return row
+
+
+@pytest.fixture
+def parsed(tsv_row):
+    # тот же товар из свежего разбора: числа - float/int
+    return dict(tsv_row, price_rub=278.0, weight_g=200.0, rating=4.9, ratings_count=2820)
+
+
+@pytest.fixture
+def history(tmp_path):
+    h = ProductHistory(tmp_path / "history.sqlite", COLUMNS)
+    yield h
+    h.close()
+
+
+def test_numeric_fields_hash_by_value(history, tsv_row, parsed):
+    assert history.fields_hash(tsv_row) == history.fields_hash({**tsv_row, "price_rub": "278"})
+    assert history.fields_hash(tsv_row) != history.fields_hash({**tsv_row, "price_rub": "279"})
+
+    assert history.seed([tsv_row], "seed") == 1
+    assert not history.record(parsed, "refresh")
+
+
+def test_unchanged_rows_are_not_reversioned(history, tsv_row, parsed):
+    history.seed([tsv_row], "20260101_000000")
+    assert not history.record(parsed, "20260102_000000")
+    assert history.record(dict(parsed, price_rub=279.0), "20260103_000000")
+    assert not history.record(dict(parsed, price_rub=279.0), "20260104_000000")
+    assert [v["crawl_ts"] for v in history.versions(URL)] == ["20260101_000000", "20260103_000000"]
+
+
+def test_old_hashes_are_rebuilt_on_open(tmp_path, tsv_row, parsed):
+    path = tmp_path / "history.sqlite"
+    h = ProductHistory(path, COLUMNS)
+    h.seed([tsv_row], "seed")
+    h.close()
+    # база до нормализации чисел: user_version 0 и хэш по сырым строкам
+    with sqlite3.connect(path) as db:
+        db.execute("UPDATE current SET fields_hash = 'stale'")
+        db.execute("PRAGMA user_version = 0")
+    db.close()
+
+    h = ProductHistory(path, COLUMNS)
+    try:
+        assert not h.record(parsed, "refresh")
+        assert h._conn().execute("PRAGMA user_version").fetchone()[0] == HASH_VERSION
+    finally:
+        h.close()
@@ -1,5 +1,8 @@
+import argparse
 import csv
 import json
+from pathlib import Path
+from typing import Dict, Iterator, List, Set, TextIO
 
 from settings.constants import CATEGORICAL_COLUMNS, NUMERIC_COLUMNS, COLUMNS, STRING_COLUMNS
 from settings.runtime import CONFIG_PATHS
@@ -14,69 +17,131 @@ def arff_escape(v: str) -> str:
     return v
 
 
-def load_rows():
-    with CONFIG_PATHS.tsv_path.open("r", encoding="utf-8") as f:
-        return list(csv.DictReader(f, delimiter="\t"))
-
-
-def write_arff(rows):
-    with CONFIG_PATHS.arff_path.open("w", encoding="utf-8", newline="") as f:
-        f.write("@RELATION vkusvill_ready_meals\n\n")
-        for c in COLUMNS:
-            if c in NUMERIC_COLUMNS:
-                f.write(f"@ATTRIBUTE {c} NUMERIC\n")
-            elif c in STRING_COLUMNS:
-                f.write(f"@ATTRIBUTE {c} STRING\n")
-            elif c in CATEGORICAL_COLUMNS:
-                values = sorted({r[c] for r in rows if r.get(c)})
-                nominal = ",".join(arff_escape(v) for v in values)
-                f.write(f"@ATTRIBUTE {c} {{{nominal}}}\n")
-        f.write("\n@DATA\n")
-        for r in rows:
-            line = []
-            for c in COLUMNS:
-                v = r.get(c, "")
-                line.append(arff_escape(v))
-            f.write(",".join(line) + "\n")
-
-
-def write_json(rows):
+def iter_rows(path: Path = CONFIG_PATHS.tsv_path) -> Iterator[Dict[str, str]]:
+    """Строки TSV по одной: в памяти никогда не лежит весь файл."""
+    with path.open("r", encoding="utf-8", newline="") as f:
+        yield from csv.DictReader(f, delimiter="\t")
+
+
+def collect_vocab(rows: Iterator[Dict[str, str]]) -> Dict[str, Set[str]]:
+    """Первый проход: значения категориальных колонок (память - только на словари)."""
+    vocab: Dict[str, Set[str]] = {c: set() for c in CATEGORICAL_COLUMNS}
+    for r in rows:
+        for c, values in vocab.items():
+            v = r.get(c)
+            if v:
+                values.add(v)
+    return vocab
+
+
+def arff_header(vocab: Dict[str, Set[str]]) -> str:
+    lines = ["@RELATION vkusvill_ready_meals", ""]
+    for c in COLUMNS:
+        if c in NUMERIC_COLUMNS:
+            lines.append(f"@ATTRIBUTE {c} NUMERIC")
+        elif c in STRING_COLUMNS:
+            lines.append(f"@ATTRIBUTE {c} STRING")
+        elif c in CATEGORICAL_COLUMNS:
+            nominal = ",".join(arff_escape(v) for v in sorted(vocab[c]))
+            lines.append(f"@ATTRIBUTE {c} {{{nominal}}}")
+    lines += ["", "@DATA", ""]
+    return "\n".join(lines)
+
+
+def arff_line(r: Dict[str, str]) -> str:
+    return ",".join(arff_escape(r.get(c, "")) for c in COLUMNS) + "\n"
+
+
+def json_header(vocab: Dict[str, Set[str]]) -> List[Dict]:
     header = []
     for c in COLUMNS:
         if c in NUMERIC_COLUMNS:
             header.append({"feature_name": c, "type": "numeric"})
         elif c in CATEGORICAL_COLUMNS:
-            values = sorted({str(r[c]).strip()
-                             for r in rows if r.get(c) not in (None, "")})
+            values = sorted({v.strip() for v in vocab[c]} - {""})
             header.append({"feature_name": c, "type": "category", "values": values})
         else:
             header.append({"feature_name": c, "type": "text"})
+    return header
 
-    def cast_value(v, col):
-        if v in ("", None):
-            return None
-        if col in NUMERIC_COLUMNS:
-            try:
-                return float(v)
-            except Exception:
-                return None
-        return v
 
-    data = [{c: cast_value(r.get(c, None), c) for c in COLUMNS} for r in rows]
+def cast_value(v, col):
+    if v in ("", None):
+        return None
+    if col in NUMERIC_COLUMNS:
+        try:
+            return float(v)
+        except Exception:
+            return None
+    return v
 
-    with CONFIG_PATHS.json_path.open("w", encoding="utf-8") as f:
-        json.dump({"header": header, "data": data}, f, ensure_ascii=False, indent=2)
 
+def json_record(r: Dict[str, str]) -> str:
+    return json.dumps({c: cast_value(r.get(c, None), c) for c in COLUMNS}, ensure_ascii=False)
+
+
+class _JsonArrayWriter:
+    """{"header": [...], "data": [ ... ]} - строки data дописываются по одной."""
+
+    def __init__(self, f: TextIO, header: List[Dict]):
+        self.f = f
+        self.first = True
+        f.write('{"header": ')
+        f.write(json.dumps(header, ensure_ascii=False, indent=2))
+        f.write(',\n"data": [\n')
+
+    def write(self, record: str) -> None:
+        if not self.first:
+            self.f.write(",\n")
+        self.f.write(record)
+        self.first = False
+
+    def close(self) -> None:
+        self.f.write("\n]}\n")
+
+
+def export(src: Path, arff_path: Path, json_path: Path, jsonl: bool = False) -> int:
+    """
+    Два прохода по TSV: первый собирает словари категорий для заголовков, второй пишет
+    ARFF и JSON одновременно, строка за строкой. Память не зависит от размера файла.
+    jsonl=True - JSON Lines: первая строка {"header": ...}, дальше по объекту на строку.
+    """
+    vocab = collect_vocab(iter_rows(src))
+    header = json_header(vocab)
+    n = 0
+    with arff_path.open("w", encoding="utf-8", newline="") as fa, \
+            json_path.open("w", encoding="utf-8", newline="\n") as fj:
+        fa.write(arff_header(vocab))
+        if jsonl:
+            fj.write(json.dumps({"header": header}, ensure_ascii=False) + "\n")
+            writer = None
+        else:
+            writer = _JsonArrayWriter(fj, header)
+        for r in iter_rows(src):
+            fa.write(arff_line(r))
+            record = json_record(r)
+            if writer is None:
+                fj.write(record + "\n")
+            else:
+                writer.write(record)
+            n += 1
+        if writer is not None:
+            writer.close()
+    return n
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Export data.tsv to ARFF and JSON")
+    parser.add_argument("--jsonl", action="store_true",
+                        help="Писать JSON Lines (data.jsonl) вместо одного JSON-документа")
+    args = parser.parse_args()
+
     configure_root_logger()
     log = get_logger(__name__)
-    rows = load_rows()
-    log.info(f"Loaded {len(rows)} rows")
-    write_arff(rows)
-    write_json(rows)
-    log.info(f"Wrote: {CONFIG_PATHS.arff_path}, {CONFIG_PATHS.json_path}")
+    json_path = CONFIG_PATHS.json_path.with_suffix(".jsonl") if args.jsonl else CONFIG_PATHS.json_path
+    n = export(CONFIG_PATHS.tsv_path, CONFIG_PATHS.arff_path, json_path, jsonl=args.jsonl)
+    log.info(f"Exported {n} rows")
+    log.info(f"Wrote: {CONFIG_PATHS.arff_path}, {json_path}")
 
 
 if __name__ == "__main__":